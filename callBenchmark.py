@@ -0,0 +1,133 @@
+"""
+Script to benchmark the inference latency and throughput of neural closures (full closure call_scaled_64 on realizable
+moments) for a sweep of architectures, precisions, batch sizes and tensorflow thread settings
+(see src/networks/benchmark.py). Selects the best batch size and thread setting per architecture for this host and
+flags throughput regressions against a stored baseline.
+The thread settings of tensorflow are fixed after the first operation, hence each thread setting is run in its own
+worker process.
+Author: Steffen Schotthoefer
+Version: 0.0
+Date 19.10.2026
+"""
+
+import os
+import subprocess
+import sys
+from optparse import OptionParser
+
+
+def parse_list(value: str, dtype=int) -> list:
+    return [dtype(v) for v in value.split(",") if v]
+
+
+def main():
+    print("---------- Start Closure Benchmark ------------")
+    print("Parsing options")
+    # --- parse options ---
+    parser = OptionParser()
+    parser.add_option("--models", dest="models", default="11,13,15",
+                      help="comma separated list of network MKs", metavar="MODELS")
+    parser.add_option("--widths", dest="widths", default="10,30", help="comma separated list of network widths",
+                      metavar="WIDTHS")
+    parser.add_option("--depths", dest="depths", default="3,5", help="comma separated list of network depths",
+                      metavar="DEPTHS")
+    parser.add_option("--degrees", dest="degrees", default="1,2",
+                      help="comma separated list of moment degrees", metavar="DEGREES")
+    parser.add_option("--dims", dest="dims", default="1", help="comma separated list of spatial dimensions",
+                      metavar="DIMS")
+    parser.add_option("--bases", dest="bases", default="monomial",
+                      help="comma separated list of moment bases (monomial, spherical_harmonics)", metavar="BASES")
+    parser.add_option("--batch_sizes", dest="batch_sizes", default="1,100,1000,10000,100000",
+                      help="comma separated list of batch sizes (cells per call)", metavar="BATCHSIZES")
+    parser.add_option("--precisions", dest="precisions", default="float32",
+                      help="comma separated list of precision policies of the core network (float32, mixed_bfloat16, "
+                           "mixed_float16). The reconstruction is always float64",
+                      metavar="PRECISIONS")
+    parser.add_option("--threads", dest="threads", default="0:0",
+                      help="comma separated list of intra:inter op thread counts (0 = tensorflow default)",
+                      metavar="THREADS")
+    parser.add_option("--n_repeats", dest="n_repeats", default=20,
+                      help="minimal number of timed calls per batch size", metavar="NREPEATS")
+    parser.add_option("-o", "--output", dest="output", default="benchmark/closure_benchmark",
+                      help="output file name (without extension) of the results", metavar="OUTPUT")
+    parser.add_option("-b", "--baseline", dest="baseline", default="",
+                      help="results file name (without extension) of the baseline", metavar="BASELINE")
+    parser.add_option("--threshold", dest="threshold", default=0.1,
+                      help="relative throughput loss against the baseline that is flagged as regression",
+                      metavar="THRESHOLD")
+    parser.add_option("--worker", dest="worker", default="",
+                      help="internal: run the sweep for one intra:inter thread setting and write the records to "
+                           "<output>_<worker>", metavar="WORKER")
+
+    (options, args) = parser.parse_args()
+    options.n_repeats = int(options.n_repeats)
+    options.threshold = float(options.threshold)
+    # --- End Option Parsing ---
+
+    if options.worker:
+        run_worker(options)
+        return True
+
+    from src.networks.basenetwork import BaseNetwork
+    from src.networks.benchmark import read_results, write_results, select_best, compare_baseline
+
+    # validate before the workers start (the workers skip configs that do not build)
+    unsupported = [p for p in parse_list(options.precisions, str) if p not in BaseNetwork.precision_policies]
+    if unsupported:
+        print("Precision policies " + str(unsupported) + " are not supported. Choose from " + str(
+            BaseNetwork.precision_policies))
+        exit(1)
+
+    os.makedirs(os.path.dirname(options.output) or ".", exist_ok=True)
+    records = []
+    for threads in options.threads.split(","):
+        print("Benchmark with intra:inter op threads " + threads)
+        worker_file = options.output + "_" + threads.replace(":", "_")
+        arguments = [a for a in sys.argv[1:] if not a.startswith("--worker")]
+        subprocess.run([sys.executable, sys.argv[0]] + arguments + ["--worker", threads], check=True)
+        records += read_results(worker_file)
+        os.remove(worker_file + ".json")
+        os.remove(worker_file + ".csv")
+    write_results(records, options.output)
+    best = select_best(records)
+    write_results(best, options.output + "_best")
+    print("Best settings for this host:")
+    for record in best:
+        print(str({key: record[key] for key in ("network_mk", "nw_width", "nw_depth", "poly_degree", "spatial_dim",
+                                                 "basis", "precision", "batch_size", "intra_op_threads",
+                                                 "inter_op_threads", "throughput")}))
+    print("Results saved to " + options.output + ".json")
+
+    if options.baseline:
+        regressions = compare_baseline(records, read_results(options.baseline), threshold=options.threshold)
+        if regressions:
+            print("Throughput regressions against " + options.baseline + ":")
+            for regression in regressions:
+                print(str(regression))
+            exit(1)
+        print("No throughput regressions against " + options.baseline)
+    return True
+
+
+def run_worker(options) -> bool:
+    """
+    brief: sets the thread counts of tensorflow (before any operation) and benchmarks all architectures
+    """
+    import tensorflow as tf
+
+    [intra_op, inter_op] = [int(t) for t in options.worker.split(":")]
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+
+    from src.networks.benchmark import benchmark_configs, run_benchmark, write_results
+
+    configs = benchmark_configs(parse_list(options.models), parse_list(options.widths), parse_list(options.depths),
+                                parse_list(options.degrees), parse_list(options.dims),
+                                parse_list(options.bases, str), parse_list(options.precisions, str))
+    records = run_benchmark(configs, parse_list(options.batch_sizes), n_repeats=options.n_repeats)
+    write_results(records, options.output + "_" + options.worker.replace(":", "_"))
+    return True
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Script to start a local closure server, that serves one or more trained neural closures to external solver
+processes via shared memory (see src/server/closureserver.py for the protocol)
+Author: Steffen Schotthoefer
+Version: 0.0
+Date 19.10.2026
+"""
+
+import os
+from optparse import OptionParser
+
+import tensorflow as tf
+
+from src.networks.configmodel import load_neural_closure
+from src.server.closureserver import ClosureServer
+
+
+def main():
+    print("---------- Start Neural Closure Server ------------")
+    print("Parsing options")
+    # --- parse options ---
+    parser = OptionParser()
+    parser.add_option("-f", "--folders", dest="folders", default="",
+                      help="comma separated list of model folders (relative to models/)", metavar="FOLDERS")
+    parser.add_option("-p", "--processingmode", dest="processingmode", default=0,
+                      help="gpu mode (1). cpu mode (0) ", metavar="PROCESSINGMODE")
+    parser.add_option("--socket", dest="socket", default="/tmp/neural_closure.sock",
+                      help="path of the unix socket of the server", metavar="SOCKET")
+    parser.add_option("--max_batch", dest="max_batch", default=0,
+                      help="coalesce concurrent requests up to this number of cells (0 = no batching)",
+                      metavar="MAXBATCH")
+    parser.add_option("--max_latency", dest="max_latency", default=0.002,
+                      help="maximal waiting time (seconds) for further requests of a batch", metavar="MAXLATENCY")
+
+    (options, args) = parser.parse_args()
+    options.processingmode = int(options.processingmode)
+    options.max_batch = int(options.max_batch)
+    options.max_latency = float(options.max_latency)
+    # --- End Option Parsing ---
+
+    if options.processingmode == 0:
+        # Set CPU as available physical device
+        os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+        if tf.test.gpu_device_name():
+            print('GPU found. Using GPU')
+        else:
+            print("Disabled GPU. Using CPU")
+
+    folders = [folder for folder in options.folders.split(",") if folder]
+    if not folders:
+        print("No model folders given (--folders)")
+        exit(1)
+    closures = {folder: load_neural_closure(folder, use_cache=True) for folder in folders}
+
+    server = ClosureServer(options.socket, closures, max_batch_size=options.max_batch,
+                           max_latency=options.max_latency)
+    print("Closure server listens on " + options.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Closure server stopped")
+    finally:
+        server.server_close()
+    return True
+
+
+if __name__ == '__main__':
+    main()
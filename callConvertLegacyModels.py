@@ -0,0 +1,57 @@
+"""
+Script to convert the legacy closure models (tf 2.2 SavedModels in models/_simulation) once to closure artifacts of the
+current MK11 architecture (see src/networks/legacyconversion.py). The solvers then load the artifacts instead of using
+their legacy_mode paths.
+Author: Steffen Schotthoefer
+Version: 0.0
+Date 19.10.2026
+"""
+
+import os
+from optparse import OptionParser
+
+from src.networks.legacyconversion import legacy_models, convert_legacy_model
+
+
+def main():
+    print("---------- Start Legacy Model Conversion ------------")
+    print("Parsing options")
+    # --- parse options ---
+    parser = OptionParser()
+    parser.add_option("-f", "--folders", dest="folders", default="",
+                      help="comma separated list of legacy model folders (relative to models/). Default: all "
+                           "known legacy models", metavar="FOLDERS")
+    parser.add_option("--n_samples", dest="n_samples", default=10000,
+                      help="number of sampled moments of the equivalence check", metavar="NSAMPLES")
+    parser.add_option("--tolerance", dest="tolerance", default=1e-5,
+                      help="maximal relative error of h and alpha of the converted model", metavar="TOLERANCE")
+
+    (options, args) = parser.parse_args()
+    options.n_samples = int(options.n_samples)
+    options.tolerance = float(options.tolerance)
+    # --- End Option Parsing ---
+
+    folders = [folder for folder in options.folders.split(",") if folder]
+    if not folders:
+        folders = [folder for folder in legacy_models if os.path.exists("models/" + folder + "/best_model")]
+    failed = []
+    for folder in folders:
+        if folder not in legacy_models:
+            print("Unknown legacy model " + folder + ". Known models: " + str(list(legacy_models)))
+            failed.append(folder)
+            continue
+        try:
+            convert_legacy_model(folder, n_samples=options.n_samples, tolerance=options.tolerance,
+                                 **legacy_models[folder])
+        except ValueError as error:
+            print(error)
+            failed.append(folder)
+    if failed:
+        print("Conversion failed for: " + str(failed))
+        exit(1)
+    print("Converted " + str(len(folders)) + " legacy models.")
+    return True
+
+
+if __name__ == '__main__':
+    main()
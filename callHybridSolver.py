@@ -24,12 +24,41 @@ def main():
                       help="gpu mode (1). cpu mode (0) ", metavar="PROCESSINGMODE")
     parser.add_option("-s", "--spatialDimension", dest="spatialDimension", default=3,
                       help="spatial dimension of closure", metavar="SPATIALDIM")
+    parser.add_option("--cache_resolution", dest="cache_resolution", default=0.0,
+                      help="relative resolution of the quantized closure caches of the Newton and the neural closure. "
+                           "Changes the Newton reference solution within this resolution (0 = off, close every cell "
+                           "in every step)", metavar="CACHERESOLUTION")
+    parser.add_option("--newton_refinement", dest="newton_refinement", default=0,
+                      help="number of Newton steps that refine the network prediction (hybrid closure, 0 = pure "
+                           "network closure)", metavar="NEWTONREFINEMENT")
+    parser.add_option("--newton_tol", dest="newton_tol", default=1e-10,
+                      help="relative gradient tolerance of the Newton steps of the hybrid and the routed closure",
+                      metavar="NEWTONTOL")
+    parser.add_option("--routing_tol", dest="routing_tol", default=0.0,
+                      help="route cells with relative moment reconstruction residual of the network above this "
+                           "tolerance to the Newton solver and solve with the routed closure only (0 = run the "
+                           "Newton and the neural closure on all cells)", metavar="ROUTINGTOL")
+    parser.add_option("--extrapolation_tol", dest="extrapolation_tol", default=0.0,
+                      help="predict alpha of the neural closure with the inverse Hessian in cells with relative moment "
+                           "drift below this tolerance since their last closure evaluation (0 = evaluate all cells)",
+                      metavar="EXTRAPOLATIONTOL")
+    parser.add_option("--expansion_tol", dest="expansion_tol", default=0.0,
+                      help="close cells, whose error bound of the near-equilibrium expansion closure is below this "
+                           "tolerance, by the expansion instead of the network or Newton closure (0 = off). The "
+                           "Newton closure uses the expansion only with --cache_resolution > 0",
+                      metavar="EXPANSIONTOL")
 
     (options, args) = parser.parse_args()
     options.degree = int(options.degree)
     options.spatial_dimension = int(options.spatialDimension)
     options.model = int(options.model)
     options.processingmode = int(options.processingmode)
+    options.cache_resolution = float(options.cache_resolution)
+    options.newton_refinement = int(options.newton_refinement)
+    options.newton_tol = float(options.newton_tol)
+    options.routing_tol = float(options.routing_tol)
+    options.extrapolation_tol = float(options.extrapolation_tol)
+    options.expansion_tol = float(options.expansion_tol)
 
     # --- End Option Parsing ---
 
@@ -44,11 +73,25 @@ def main():
             print("Disabled GPU. Using CPU")
 
     if options.spatial_dimension == 1:
-        solver = MNSolver1D.MNSolver1D(traditional=False, polyDegree=options.degree, model_mk=options.model)
-        solver.solve(maxIter=20000, t_end=10)
+        solver = MNSolver1D.MNSolver1D(traditional=False, polyDegree=options.degree, model_mk=options.model,
+                                       cache_resolution=options.cache_resolution,
+                                       newton_refinement=options.newton_refinement, newton_tol=options.newton_tol,
+                                       routing_tol=options.routing_tol, extrapolation_tol=options.extrapolation_tol,
+                                       expansion_tol=options.expansion_tol)
+        if options.routing_tol > 0:
+            solver.solve_hybrid(maxIter=20000, t_end=10)
+        else:
+            solver.solve(maxIter=20000, t_end=10)
     if options.spatial_dimension == 2:
-        solver = MNSolver2D.MNSolver2D(traditional=False, model_mk=options.model)
-        solver.solve(maxIter=2000, t_end=1)
+        solver = MNSolver2D.MNSolver2D(traditional=False, model_mk=options.model,
+                                       cache_resolution=options.cache_resolution,
+                                       newton_refinement=options.newton_refinement, newton_tol=options.newton_tol,
+                                       routing_tol=options.routing_tol, extrapolation_tol=options.extrapolation_tol,
+                                       expansion_tol=options.expansion_tol)
+        if options.routing_tol > 0:
+            solver.solve_hybrid(maxIter=2000, t_end=1)
+        else:
+            solver.solve(maxIter=2000, t_end=1)
 
     return True
 
@@ -17,7 +17,14 @@ import numpy as np
 import tensorflow as tf
 
 from src import utils
-from src.networks.configmodel import init_neural_closure
+from src.networks.configmodel import init_neural_closure, load_neural_closure
+from src.networks.distillation import distill_closure, sample_alpha, compute_exact_labels
+from src.networks.pruning import prune_closure, pruning_report
+from src.networks.quantization import export_reduced_precision, export_precisions
+from src.networks.frozenclosure import export_frozen_closure, frozen_report
+from src.networks.numpyclosure import export_numpy_closure, numpy_report
+from src.networks.partitioned import train_partitioned_closure, partition_report
+from src.networks.registry import export_artifact, ModelRegistry
 
 
 def main():
@@ -138,7 +145,7 @@ def main():
         "--training",
         dest="training",
         default=1,
-        help="execution mode (0) training mode (1)  analysis mode (2) re-save mode (3)",
+        help="execution mode (0) training mode (1)  analysis mode (2) re-save mode (3) distillation mode (6) pruning mode (7) reduced precision export (8) frozen export (9) numpy export (10) artifact export (11) partitioned ensemble training (12)",
         metavar="TRAINING",
     )
     parser.add_option(
@@ -190,6 +197,107 @@ def main():
         metavar="ALPHANORM",
     )
 
+    parser.add_option(
+        "--lbfgs",
+        dest="lbfgs",
+        default=0,
+        help="number of full batch L-BFGS iterations before the training with the curriculum (0 = off)",
+        metavar="LBFGS",
+    )
+    parser.add_option(
+        "--lbfgs_batch",
+        dest="lbfgs_batch",
+        default=0,
+        help="number of samples used by L-BFGS (0 = full training set)",
+        metavar="LBFGSBATCH",
+    )
+    parser.add_option(
+        "--precision",
+        dest="precision",
+        default="float32",
+        help="precision policy of the core network: float32, mixed_bfloat16 or mixed_float16",
+        metavar="PRECISION",
+    )
+    parser.add_option(
+        "--recons_precision",
+        dest="recons_precision",
+        default="float64",
+        help="precision of the entropy reconstruction: float64 or float32",
+        metavar="RECONSPRECISION",
+    )
+    parser.add_option(
+        "--coarse_quad",
+        dest="coarse_quad",
+        default=0,
+        help="quadrature order of the reconstruction in training steps (0 = full quadrature)",
+        metavar="COARSEQUAD",
+    )
+    parser.add_option(
+        "--fine_quad_epochs",
+        dest="fine_quad_epochs",
+        default=0,
+        help="number of final training epochs that use the full quadrature",
+        metavar="FINEQUADEPOCHS",
+    )
+    parser.add_option(
+        "--transfer",
+        dest="transfer",
+        default="",
+        help="initialize new weights from the trained model in this folder (lower degree or width, same family)",
+        metavar="TRANSFER",
+    )
+    parser.add_option(
+        "--teacher",
+        dest="teacher",
+        default="",
+        help="trained model (folder) that is distilled into the model of this run (training mode 6)",
+        metavar="TEACHER",
+    )
+    parser.add_option(
+        "--distill_samples",
+        dest="distill_samples",
+        default=200000,
+        help="number of sampled moments for the distillation (training mode 6)",
+        metavar="DISTILLSAMPLES",
+    )
+    parser.add_option(
+        "--prune_ratio",
+        dest="prune_ratio",
+        default=0.5,
+        help="fraction of removed neurons per hidden layer (training mode 7)",
+        metavar="PRUNERATIO",
+    )
+    parser.add_option(
+        "--export_precision",
+        dest="export_precision",
+        default="all",
+        help="weight precision of the exported model: float16, int8 or all (training mode 8)",
+        metavar="EXPORTPRECISION",
+    )
+
+    parser.add_option(
+        "--jit",
+        dest="jit",
+        default=0,
+        help="compile the frozen closure with XLA (training mode 9)",
+        metavar="JIT",
+    )
+    parser.add_option(
+        "--partition_edges",
+        dest="partition_edges",
+        default="0.5,0.8",
+        help="comma separated edges of the |u_1|/u_0 shells of the partitioned ensemble (training mode 12)",
+        metavar="PARTITIONEDGES",
+    )
+    parser.add_option(
+        "--expert_widths",
+        dest="expert_widths",
+        default="",
+        help="comma separated widths of the experts from the interior to the boundary shell (training mode 12). "
+             "Default: networkwidth for all experts",
+        metavar="EXPERTWIDTHS",
+    )
+
     (options, args) = parser.parse_args()
     options.objective = int(options.objective)
     options.sampling = int(options.sampling)
@@ -211,6 +319,18 @@ def main():
     options.gamma_level = int(options.gamma_level)
     options.rotated = bool(int(options.rotated))
     options.max_alpha_norm = float(options.max_alpha_norm)
+    options.lbfgs = int(options.lbfgs)
+    options.lbfgs_batch = int(options.lbfgs_batch)
+    options.coarse_quad = int(options.coarse_quad)
+    options.fine_quad_epochs = int(options.fine_quad_epochs)
+    options.distill_samples = int(options.distill_samples)
+    options.prune_ratio = float(options.prune_ratio)
+    options.jit = bool(int(options.jit))
+    options.partition_edges = [float(edge) for edge in options.partition_edges.split(",") if edge]
+    if options.expert_widths:
+        options.expert_widths = [int(width) for width in options.expert_widths.split(",")]
+    else:
+        options.expert_widths = [options.networkwidth] * (len(options.partition_edges) + 1)
     # --- End Option Parsing ---
 
     # witch to CPU mode, if wished
@@ -243,12 +363,15 @@ def main():
         basis=options.basis,
         rotated=options.rotated,
     )
+    neuralClosureModel.set_precision_policy(policy=options.precision, reconstruction_dtype=options.recons_precision)
+    neuralClosureModel.set_quadrature_schedule(coarse_order=options.coarse_quad, fine_epochs=options.fine_quad_epochs)
 
     # --- load model data before creating model (important for data scaling)
-    if options.training == 1:
+    if options.training == 1 or options.training == 7:
         # create training Data
         # Save options and runscript to file (only for training)
-        utils.write_config_file(options, neuralClosureModel)
+        if options.training == 1:
+            utils.write_config_file(options, neuralClosureModel)
         neuralClosureModel.load_training_data(
             shuffle_mode=True,
             sampling=options.sampling,
@@ -257,12 +380,28 @@ def main():
             gamma_level=options.gamma_level,
             max_alpha_norm=options.max_alpha_norm,
         )
+    elif options.training == 6:
+        if not options.teacher:
+            print("Distillation mode needs a teacher model (--teacher)")
+            exit(1)
+        utils.write_config_file(options, neuralClosureModel)
+    elif options.training == 12:
+        utils.write_config_file(options, neuralClosureModel)
     # create model after loading training data to get correct scaling in
-    if (
+    if options.training == 6:
+        print("The student model is created with the distilled training data")
+    elif options.training == 12:
+        print("The expert models are created with the training data of their shells")
+    elif (
             options.loadmodel == 1
             or options.training == 0
             or options.training == 2
             or options.training == 5
+            or options.training == 7
+            or options.training == 8
+            or options.training == 9
+            or options.training == 10
+            or options.training == 11
     ):
         neuralClosureModel.load_model()  # also creates model
         # preprocess training data. Compute scalings
@@ -276,6 +415,12 @@ def main():
             scaled_output=options.scaledOutput, model_loaded=options.loadmodel
         )
         neuralClosureModel.create_model()
+        if options.transfer:
+            try:
+                neuralClosureModel.transfer_model(options.transfer)
+            except ValueError as error:
+                print(error)
+                exit(1)
     # neuralClosureModel.model.summary()
 
     if options.training == 1:
@@ -287,7 +432,22 @@ def main():
             batch_size=options.batch,
             verbosity=options.verbosity,
             processing_mode=options.processingmode,
+            lbfgs_iterations=options.lbfgs,
+            lbfgs_batch_size=options.lbfgs_batch,
         )
+        # single file artifact of the best model (see src/networks/registry.py)
+        neuralClosureModel.model.load_weights(neuralClosureModel.folder_name + "/best_model/")
+        artifact_file = export_artifact(neuralClosureModel)
+        problems = ModelRegistry().validate(options.folder)  # round trip into a closure with the default options
+        if problems:
+            # loads fall back to the SavedModel in best_model
+            os.remove(artifact_file)
+            print("Warning: artifact is not valid and was removed: " + str(problems))
+        if options.precision != "float32" or options.recons_precision != "float64":
+            # accuracy and speed of the reduced precision model
+            u_test = neuralClosureModel.training_data[0][:100000]
+            u_test = np.concatenate([np.ones(shape=(u_test.shape[0], 1)), u_test], axis=1)
+            neuralClosureModel.precision_report(u_test)
 
     elif options.training == 2:
         print("Analysis mode entered.")
@@ -417,6 +577,99 @@ def main():
         if options.decorrInput:
             print(all_layers_nt[0])
             print(all_layers_nt[1])
+    elif options.training == 6:
+        print("Distillation mode entered.")
+        teacher = load_neural_closure(options.teacher)
+        distill_closure(
+            teacher=teacher,
+            student=neuralClosureModel,
+            n_samples=options.distill_samples,
+            max_alpha_norm=options.max_alpha_norm,
+            val_split=0.1,
+            epoch_count=options.epoch,
+            curriculum=options.curriculum,
+            batch_size=options.batch,
+            verbosity=options.verbosity,
+            processing_mode=options.processingmode,
+            lbfgs_iterations=options.lbfgs,
+        )
+    elif options.training == 7:
+        print("Pruning mode entered.")
+        u_sample = neuralClosureModel.training_data[0][:100000]
+        u_test = np.concatenate([np.ones(shape=(u_sample.shape[0], 1)), u_sample], axis=1)
+        pruned_model = prune_closure(
+            neuralClosureModel,
+            prune_ratio=options.prune_ratio,
+            target_folder=options.folder + "_pruned",
+            x_sample=u_sample,
+        )
+        pruning_report(neuralClosureModel, pruned_model, u_test)
+        if options.epoch > 0 or options.lbfgs > 0:
+            # fine tuning of the pruned model
+            pruned_model.training_data = neuralClosureModel.training_data
+            pruned_model.config_start_training(
+                val_split=0.1,
+                epoch_count=options.epoch,
+                curriculum=options.curriculum,
+                batch_size=options.batch,
+                verbosity=options.verbosity,
+                processing_mode=options.processingmode,
+                lbfgs_iterations=options.lbfgs,
+                lbfgs_batch_size=options.lbfgs_batch,
+            )
+            pruning_report(neuralClosureModel, pruned_model, u_test, name="prune_report_finetuned")
+    elif options.training == 8:
+        print("Reduced precision export mode entered.")
+        if options.export_precision == "all":
+            precisions = export_precisions
+        else:
+            precisions = [options.export_precision]
+        for precision in precisions:
+            export_reduced_precision(neuralClosureModel, precision=precision, max_alpha_norm=options.max_alpha_norm)
+    elif options.training == 9:
+        print("Frozen export mode entered.")
+        export_folder = export_frozen_closure(neuralClosureModel, jit_compile=options.jit)
+        frozen_report(neuralClosureModel, export_folder, max_alpha_norm=options.max_alpha_norm)
+    elif options.training == 10:
+        print("NumPy export mode entered.")
+        file_name = export_numpy_closure(neuralClosureModel)
+        alpha_test = sample_alpha(10000, neuralClosureModel.model.input_dim - 1, options.max_alpha_norm)
+        [u_test, _, _] = compute_exact_labels(neuralClosureModel.model, alpha_test)
+        u_test = u_test * np.random.uniform(low=0.1, high=10.0, size=(u_test.shape[0], 1))
+        numpy_report(neuralClosureModel, file_name, u_test)
+    elif options.training == 11:
+        print("Artifact export mode entered.")
+        export_artifact(neuralClosureModel)
+        problems = ModelRegistry().validate(options.folder)
+        if problems:
+            print("Artifact is not valid: " + str(problems))
+            exit(1)
+    elif options.training == 12:
+        print("Partitioned ensemble training mode entered.")
+        partitioned = train_partitioned_closure(
+            folder_name=options.folder,
+            network_mk=options.model,
+            poly_degree=options.degree,
+            spatial_dim=options.spatial_dimension,
+            edges=options.partition_edges,
+            widths=options.expert_widths,
+            nw_depth=options.networkdepth,
+            loss_combination=options.objective,
+            input_decorrelation=options.decorrInput,
+            scale_active=options.scaledOutput,
+            gamma_lvl=options.gamma_level,
+            n_samples=options.distill_samples,
+            max_alpha_norm=options.max_alpha_norm,
+            val_split=0.1,
+            epoch_count=options.epoch,
+            curriculum=options.curriculum,
+            batch_size=options.batch,
+            verbosity=options.verbosity,
+            processing_mode=options.processingmode,
+            lbfgs_iterations=options.lbfgs,
+        )
+        partition_report(partitioned, max_alpha_norm=options.max_alpha_norm,
+                         file_name=neuralClosureModel.folder_name + "/partition_report.csv")
     else:
         # --- in execution mode,  call_network or call_network_batchwise get called from c++ directly ---
         print("pure execution mode")
@@ -0,0 +1,98 @@
+"""
+Script to benchmark the accuracy versus the inference cost of all trained closures below a model root (default:
+models/). Each model is evaluated on a common held-out realizable test set (per moment system) and timed on the same
+host (see src/networks/benchmark.py). The Pareto front of cost and error is written as table and plot.
+The models are evaluated in parallel worker processes.
+Author: Steffen Schotthoefer
+Version: 0.0
+Date 19.10.2026
+"""
+
+import multiprocessing
+import os
+from optparse import OptionParser
+
+
+def init_worker(intra_op_threads: int) -> None:
+    """
+    brief: sets the thread counts of tensorflow in a new worker process (before any operation)
+    """
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def main():
+    print("---------- Start Closure Pareto Benchmark ------------")
+    print("Parsing options")
+    # --- parse options ---
+    parser = OptionParser()
+    parser.add_option("-r", "--root", dest="root", default="models",
+                      help="folder that contains the model folders", metavar="ROOT")
+    parser.add_option("-f", "--folders", dest="folders", default="",
+                      help="comma separated list of model folders (relative to the root). Default: all models",
+                      metavar="FOLDERS")
+    parser.add_option("--n_samples", dest="n_samples", default=100000,
+                      help="number of test samples", metavar="NSAMPLES")
+    parser.add_option("--batch_size", dest="batch_size", default=10000,
+                      help="cells per call of the timing", metavar="BATCHSIZE")
+    parser.add_option("--n_repeats", dest="n_repeats", default=20,
+                      help="minimal number of timed calls", metavar="NREPEATS")
+    parser.add_option("-w", "--workers", dest="workers", default=2,
+                      help="number of worker processes", metavar="WORKERS")
+    parser.add_option("-t", "--threads", dest="threads", default=1,
+                      help="intra op threads per worker. The costs are comparable, if workers x threads does not "
+                           "exceed the number of cores", metavar="THREADS")
+    parser.add_option("-e", "--error", dest="error", default="err_h",
+                      help="error of the Pareto front (err_u, err_alpha, err_h, max_err_<u,alpha,h>_boundary)",
+                      metavar="ERROR")
+    parser.add_option("-o", "--output", dest="output", default="benchmark/closure_pareto",
+                      help="output file name (without extension) of the table and the plot", metavar="OUTPUT")
+
+    (options, args) = parser.parse_args()
+    options.n_samples = int(options.n_samples)
+    options.batch_size = int(options.batch_size)
+    options.n_repeats = int(options.n_repeats)
+    options.workers = int(options.workers)
+    options.threads = int(options.threads)
+    # --- End Option Parsing ---
+
+    from src.networks.benchmark import evaluate_model_worker, pareto_front, plot_pareto
+    from src.networks.registry import ModelRegistry
+
+    folders = [folder for folder in options.folders.split(",") if folder]
+    if not folders:
+        models = ModelRegistry(options.root).list_models()
+        folders = list(models["name"]) if not models.empty else []
+    if not folders:
+        print("No models found in " + options.root)
+        exit(1)
+    print("Evaluate " + str(len(folders)) + " models with " + str(options.workers) + " workers")
+
+    # spawn: the workers must not inherit the tensorflow state of the parent
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(options.workers, initializer=init_worker, initargs=(options.threads,)) as pool:
+        records = pool.map(evaluate_model_worker,
+                           [(options.root, folder, options.n_samples, options.batch_size, options.n_repeats)
+                            for folder in folders], chunksize=1)
+
+    failed = [r for r in records if r["failed"]]
+    for record in failed:
+        print("Evaluation failed for " + record["name"] + ": " + record["failed"])
+    frame = pareto_front(records, error_key=options.error)
+    if frame.empty:
+        print("No model could be evaluated")
+        exit(1)
+    os.makedirs(os.path.dirname(options.output) or ".", exist_ok=True)
+    frame.to_csv(options.output + ".csv", index=False)
+    plot_pareto(frame, options.output + ".png", error_key=options.error)
+    print("Pareto front:")
+    print(frame[frame["pareto"]][["name", "poly_degree", "spatial_dim", "basis", "network_mk", "nw_width", "nw_depth",
+                                  "cost_per_cell", options.error]].to_string(index=False))
+    print("Results saved to " + options.output + ".csv and " + options.output + ".png")
+    return True
+
+
+if __name__ == '__main__':
+    main()
@@ -11,10 +11,32 @@ import src.utils
 from src.utils import load_density_function, load_solution, plot_1d
 from optparse import OptionParser
 from src.networks.configmodel import init_neural_closure
+from src.networks.registry import ModelRegistry, is_current_artifact
 
 import tensorflow as tf
 
 
+def load_legacy_closure(folder_name: str) -> list:
+    """
+    brief: loads a legacy M1 1D closure model. Uses the MK11 artifact written by callConvertLegacyModels.py, if it
+           exists, else the tf 2.2 SavedModel in legacy mode
+    input: folder_name = model folder (relative to models/)
+    returns: [neural_closure, model], where model maps normalized moments u_1 to [h, alpha, ...]
+    """
+    if is_current_artifact("models/" + folder_name):
+        neural_closure = ModelRegistry().load(folder_name)
+        return [neural_closure, neural_closure.model]
+    neural_closure = init_neural_closure(network_mk=11, poly_degree=1, spatial_dim=1,
+                                         folder_name="tmp",
+                                         loss_combination=2,
+                                         nw_width=10, nw_depth=7, normalized=True)
+    neural_closure.create_model()
+    ### Need to load this model as legacy code
+    print("Load model in legacy mode. Model was created using tf 2.2.0")
+    neural_closure.model_legacy = tf.keras.models.load_model("models/" + folder_name + "/best_model")
+    return [neural_closure, neural_closure.model_legacy]
+
+
 def main():
     print("---------- Start Synthetic test Suite ------------")
     print("Parsing options")
@@ -29,17 +51,7 @@ def main():
     # --- M1 1D synthetic tests  ----
     if options.legacy:
         # load network
-        neural_closure = init_neural_closure(network_mk=11, poly_degree=1, spatial_dim=1,
-                                             folder_name="tmp",
-                                             loss_combination=2,
-                                             nw_width=10, nw_depth=7, normalized=True)
-        neural_closure.create_model()
-        ### Need to load this model as legacy code
-        print("Load model in legacy mode. Model was created using tf 2.2.0")
-        legacy_model = True
-        imported = tf.keras.models.load_model("models/_simulation/mk11_M1_1D/best_model")
-        neural_closure.model_legacy = imported
-        test_model = neural_closure.model_legacy
+        [neural_closure, test_model] = load_legacy_closure("_simulation/mk11_M1_1D")
     else:
         neural_closure = init_neural_closure(network_mk=15, poly_degree=1, spatial_dim=1,
                                              folder_name="_simulation/mk15_M1_1D",
@@ -55,7 +67,7 @@ def main():
     u_tnsr = tf.constant(u_t[:, 1], shape=(u_t.shape[0], 1))
 
     if options.legacy:
-        [h_pred, alpha_pred] = test_model(u_tnsr)
+        [h_pred, alpha_pred] = test_model(u_tnsr)[:2]
         alpha64 = tf.cast(alpha_pred, dtype=tf.float64, name=None)
         alpha_complete = neural_closure.model.reconstruct_alpha(alpha64)
         u_complete = neural_closure.model.reconstruct_u(alpha_complete)
@@ -95,16 +107,7 @@ def main():
     u_tnsr = tf.constant(u_t[:, 1], shape=(u_t.shape[0], 1))
 
     # load network
-    neural_closure = init_neural_closure(network_mk=11, poly_degree=1, spatial_dim=1,
-                                         folder_name="tmp",
-                                         loss_combination=2,
-                                         nw_width=10, nw_depth=7, normalized=True)
-    neural_closure.create_model()
-    ### Need to load this model as legacy code
-    print("Load model in legacy mode. Model was created using tf 2.2.0")
-    imported = tf.keras.models.load_model("models/_simulation/mk11_M1_1D_normal/best_model")
-    neural_closure.model_legacy = imported
-    test_model_normal = neural_closure.model_legacy
+    [neural_closure, test_model_normal] = load_legacy_closure("_simulation/mk11_M1_1D_normal")
 
     [h_pred, alpha_pred, u] = test_model_normal(u_tnsr)
     alpha64 = tf.cast(alpha_pred, dtype=tf.float64, name=None)
@@ -121,10 +124,7 @@ def main():
     err_h = np.linalg.norm(h_t - h_pred_np_normal, axis=1).reshape((u_t.shape[0], 1))
     rel_err_h_normal = err_h / np.linalg.norm(u_t, axis=1).reshape((u_t.shape[0], 1))
 
-    ### Need to load this model as legacy code
-    imported = tf.keras.models.load_model("models/_simulation/mk11_M1_1D_alpha/best_model")
-    neural_closure.model_legacy = imported
-    test_model_alpha = neural_closure.model_legacy
+    [neural_closure, test_model_alpha] = load_legacy_closure("_simulation/mk11_M1_1D_alpha")
 
     [h_pred, alpha_pred, u] = test_model_alpha(u_tnsr)
     alpha64 = tf.cast(alpha_pred, dtype=tf.float64, name=None)
@@ -529,6 +529,153 @@ def reconstructUSingleCell(alpha, m, w):
     return integrate(res, w)
 
 
+def newton_refine_closure(u, alpha, m, w, max_iter=2, tol=1e-10, max_backtracking=10):
+    """
+    brief: vectorized Newton iteration of the dual minimal entropy problem min_alpha <exp(alpha*m)> - alpha*u of all
+           cells, started at alpha (e.g. the prediction of a neural closure). Steps are damped by backtracking, s.t.
+           the dual objective decreases. Cells stop iterating, if |<m exp(alpha*m)> - u| <= tol * |u| (converged),
+           if no halved step decreases the objective (the step is discarded) or if alpha is not finite.
+    input: u, dims = (nS x N)
+           alpha = initial Lagrange multipliers, dims = (nS x N)
+           m    , dims = (N x nq)
+           w    , dims = nq
+           max_iter = maximal number of Newton steps
+           tol = relative tolerance of the gradient norm
+           max_backtracking = maximal number of step halvings
+    returns: [alpha, n_iter, grad_norm], dims = (nS x N), nS, nS
+             n_iter = accepted Newton steps per cell, grad_norm = relative gradient norm at the returned alpha
+             (inf for non finite alpha or gradient). Cells with grad_norm > tol did not converge.
+    """
+    u = np.asarray(u, dtype=np.float64)
+    alpha = np.array(alpha, dtype=np.float64)
+    w = np.reshape(w, (1, -1))
+    u_norm = np.linalg.norm(u, axis=1)
+    n_iter = np.zeros(u.shape[0], dtype=int)
+    grad_norm = np.zeros(u.shape[0])
+    active = np.arange(u.shape[0])
+
+    def dual_objective(alpha_a, u_a):
+        return np.sum(np.exp(alpha_a @ m) * w, axis=1) - np.sum(alpha_a * u_a, axis=1)
+
+    for k in range(max_iter + 1):
+        with np.errstate(over="ignore", invalid="ignore"):
+            f_weighted = np.exp(alpha[active] @ m) * w  # dims = (nA x nq)
+            grad = f_weighted @ m.T - u[active]
+            grad_norm[active] = np.linalg.norm(grad, axis=1) / u_norm[active]
+        grad_norm[active[~np.isfinite(grad_norm[active])]] = np.inf
+        iterate = (grad_norm[active] > tol) & np.isfinite(grad_norm[active])
+        active = active[iterate]
+        if k == max_iter or active.size == 0:
+            break
+        grad = grad[iterate]
+        hessian = np.einsum("sq,iq,jq->sij", f_weighted[iterate], m, m)
+        step = np.linalg.solve(hessian, grad[:, :, np.newaxis])[:, :, 0]
+        # backtracking: halve the step of the cells, where the dual objective increases (beyond round-off)
+        objective = dual_objective(alpha[active], u[active])
+        objective = objective + 1e-13 * np.abs(objective)
+        step_size = np.ones(active.size)
+        for i in range(max_backtracking + 1):
+            alpha_new = alpha[active] - step_size[:, np.newaxis] * step
+            with np.errstate(over="ignore", invalid="ignore"):
+                increase = ~(dual_objective(alpha_new, u[active]) <= objective)  # includes non finite objectives
+            if not np.any(increase) or i == max_backtracking:
+                break
+            step_size[increase] *= 0.5
+        # cells without decreasing step keep alpha and stop iterating
+        accepted = ~increase
+        alpha[active[accepted]] = alpha_new[accepted]
+        n_iter[active[accepted]] += 1
+        active = active[accepted]
+    return [alpha, n_iter, grad_norm]
+
+
+def equilibrium_expansion(m, w, rel_eig_tol=1e-12):
+    """
+    brief: precomputes the moment Gram matrices of the near-equilibrium expansion of the dual problem around the
+           isotropic Maxwellian alpha = (alpha_0, 0, ..., 0). The basis function m_0 must be constant.
+           With p = w / <1> and the reduced basis m_r = (m_1, ..., m_N), the mean mu = <m_r p>, the covariance
+           Sigma = <(m_r - mu)(m_r - mu)^T p> and its inverse square root W are stored, as well as the radius
+           M = max_q |W (m_r(q) - mu)| of the whitened basis on the quadrature points.
+    input: m    , dims = (N x nq)
+           w    , dims = nq
+           rel_eig_tol = relative eigenvalue threshold of Sigma, below which the basis is rejected as degenerate
+    returns: expansion = dict of the precomputed quantities
+    """
+    m = np.asarray(m, dtype=np.float64)
+    w = np.asarray(w, dtype=np.float64).reshape(-1)
+    if np.ptp(m[0]) > 1e-12 * np.abs(m[0]).max():
+        raise ValueError("The near-equilibrium expansion requires a constant basis function m_0.")
+    z = np.sum(w)
+    p = w / z
+    m_r = m[1:]
+    mean = m_r @ p
+    m_centered = m_r - mean[:, np.newaxis]
+    sigma = (m_centered * p) @ m_centered.T
+    eig_val, eig_vec = np.linalg.eigh(sigma)
+    if eig_val[0] <= rel_eig_tol * eig_val[-1]:
+        raise ValueError("The moment covariance matrix is singular on the given quadrature.")
+    whitening = (eig_vec / np.sqrt(eig_val)) @ eig_vec.T  # W = Sigma^(-1/2)
+    return {"m_0": float(m[0, 0]), "log_z": float(np.log(z)), "mean": mean, "whitening": whitening,
+            "radius": float(np.max(np.linalg.norm(whitening @ m_centered, axis=0))),
+            "whitening_norm": float(1.0 / np.sqrt(eig_val[0])),
+            "mean_norm": float(np.linalg.norm(whitening @ mean))}
+
+
+def expansion_error_bound(r, expansion):
+    """
+    brief: rigorous bound of the Euclidean error |alpha - alpha_exact| of expansion_closure, w.r.t. the exact
+           solution of the dual problem on the same quadrature, as function of the whitened anisotropy r = |delta|.
+           Proof sketch (gamma = Sigma^(1/2) alpha_r, y = W(m_r - mu), |y| <= M on the quadrature): the
+           covariance of y under the tilted density exp(gamma*y) p lies in [exp(-2M|gamma|) I, exp(M|gamma|) I].
+           Integrating along the ray from 0 to gamma* gives |gamma*| <= R = -ln(1 - 2Mr) / (2M) and
+           |gamma - gamma*| <= eps(R) R with eps(R) = max((exp(MR) - 1)/(MR) - 1, 1 - (1 - exp(-2MR))/(2MR)).
+           The error of alpha_0 follows from the remainder of the quadratic cumulant expansion.
+    input: r = whitened anisotropy, dims = nS
+           expansion = output of equilibrium_expansion
+    returns: bound, dims = nS (inf, where 2 M r >= 1)
+    """
+    r = np.asarray(r, dtype=np.float64)
+    big_m = expansion["radius"]
+    bound = np.full(r.shape, np.inf)
+    valid = 2.0 * big_m * r < 1.0
+    r = r[valid]
+    r_star = -np.log1p(-2.0 * big_m * r) / (2.0 * big_m)  # bound of |gamma*|
+    x = np.maximum(big_m * r_star, 1e-300)
+    eps = np.maximum(np.expm1(x) / x - 1.0, 1.0 + np.expm1(-2.0 * x) / (2.0 * x))
+    err_gamma = eps * r_star
+    # alpha_0: |mu * delta_alpha_r| + |K(gamma*) - K(gamma)| + |K(gamma) - |gamma|^2 / 2|
+    y = big_m * r
+    eps_0 = np.maximum(np.expm1(y), -np.expm1(-2.0 * y))
+    err_0 = ((expansion["mean_norm"] + big_m) * err_gamma + 0.5 * r ** 2 * eps_0) / abs(expansion["m_0"])
+    bound[valid] = np.sqrt((expansion["whitening_norm"] * err_gamma) ** 2 + err_0 ** 2)
+    return bound
+
+
+def expansion_closure(u, expansion):
+    """
+    brief: near-equilibrium closure of the dual minimal entropy problem. The dual objective is expanded to second
+           order in alpha_r around the isotropic Maxwellian, i.e. alpha_r = Sigma^(-1) (m_0 u_r / u_0 - mu) and
+           alpha_0 = (ln(u_0 / (m_0 <1>)) - alpha_r * mu - |Sigma^(1/2) alpha_r|^2 / 2) / m_0.
+           The cost per cell are two small matrix-vector products. The error bound is rigorous w.r.t. the exact
+           solution on the same quadrature (see expansion_error_bound).
+    input: u, dims = (nS x N), u_0 > 0
+           expansion = output of equilibrium_expansion
+    returns: [alpha, h, error_bound], dims = (nS x N), nS, nS
+             h = alpha*u - <exp(alpha*m)> (entropy convention of the neural closures)
+    """
+    u = np.asarray(u, dtype=np.float64)
+    m_0 = expansion["m_0"]
+    u_0 = u[:, 0]
+    shifted = m_0 * u[:, 1:] / u_0[:, np.newaxis] - expansion["mean"]
+    delta = shifted @ expansion["whitening"]  # W is symmetric
+    alpha = np.empty(u.shape)
+    alpha[:, 1:] = delta @ expansion["whitening"]
+    r = np.linalg.norm(delta, axis=1)
+    alpha[:, 0] = (np.log(u_0 / m_0) - expansion["log_z"] - alpha[:, 1:] @ expansion["mean"] - 0.5 * r ** 2) / m_0
+    h = np.sum(alpha * u, axis=1) - u_0 / m_0
+    return [alpha, h, expansion_error_bound(r, expansion)]
+
+
 # Basis Computation
 def computeMonomialBasis1D(quadPts, polyDegree):
     """
@@ -6,6 +6,8 @@ Date 29.10.2020
 """
 
 import csv
+import functools
+import re
 import time
 from os import path, makedirs, walk
 
@@ -14,6 +16,7 @@ import pandas as pd
 ### imports ###
 # python modules
 import tensorflow as tf
+from scipy.optimize import minimize
 from sklearn.preprocessing import MinMaxScaler
 
 # intern modules
@@ -22,12 +25,33 @@ from src.networks.customcallbacks import (
     HaltWhenCallback,
     LossAndErrorPrintingCallback,
     LearningRateSchedulerWithWarmup,
+    QuadratureScheduleCallback,
 )
+from src.networks.customlayers import MeanShiftLayer, DecorrelationLayer
+from src.networks.reports import relative_error, write_report
 
 
 ### class definitions ###
 
 
+def precision_scoped(create_model):
+    """
+    brief: decorator of create_model. The layers of the model are built with the precision policy of the closure
+           (see BaseNetwork.set_precision_policy), the global keras policy is restored afterwards.
+    """
+
+    @functools.wraps(create_model)
+    def create_model_with_policy(self, *args, **kwargs):
+        previous_policy = tf.keras.mixed_precision.global_policy()
+        tf.keras.mixed_precision.set_global_policy(self.precision_policy)
+        try:
+            return create_model(self, *args, **kwargs)
+        finally:
+            tf.keras.mixed_precision.set_global_policy(previous_policy)
+
+    return create_model_with_policy
+
+
 class BaseNetwork:
     normalized: bool  # Determines if model works with normalized data
     poly_degree: int  # Degree of basis function polynomials
@@ -63,6 +87,11 @@ class BaseNetwork:
     input_dim_dict_3D_sh: dict = {1: 4, 2: 9, 3: 16}
     input_dim_dict_2D_sh: dict = input_dim_dict_2D
     rotated: bool
+    precision_policy: str  # keras (mixed) precision policy of the core network
+    reconstruction_dtype: str  # precision of the entropy reconstruction in the entropy wrapper
+    precision_policies: tuple = ("float32", "mixed_bfloat16", "mixed_float16")
+    coarse_quadrature_order: int  # quadrature order of the training steps of the entropy wrapper (0 = full)
+    fine_quadrature_epochs: int  # number of final training epochs that use the full quadrature
 
     def __init__(
             self,
@@ -100,6 +129,10 @@ class BaseNetwork:
         self.scaler_min = 0.0  # default is no scaling
         self.basis = basis
         self.rotated = rotated
+        self.precision_policy = "float32"
+        self.reconstruction_dtype = "float64"
+        self.coarse_quadrature_order = 0
+        self.fine_quadrature_epochs = 0
 
         # --- Determine loss combination ---
         if loss_combination < 4:
@@ -150,6 +183,158 @@ class BaseNetwork:
     def create_model(self) -> bool:
         pass
 
+    def transfer_model(self, source_folder: str) -> bool:
+        """
+        brief: Warm start from a trained model of the same family with lower (or equal) polynomial degree and width.
+               Must be called after create_model. Both models must have the same layers with weights, i.e. the
+               same depth. Named layers are matched by name, layers with a generated keras name (e.g.
+               "batch_normalization_4") by their order among the layers of the same type. Widths and the polynomial
+               degree may grow.
+               For each kernel, the source block is copied, rows of new inputs (additional moments or neurons) are
+               set to zero and columns of new neurons keep their initialization. Without input decorrelation,
+               the new model thus starts as the source closure on the shared moments. Kernels of the convex
+               nn_components stay non-negative. Mean shift and decorrelation statistics are not transferred.
+        input: source_folder = model folder of the source model (relative to models/)
+        returns: True, if successful. Raises ValueError, if the layers of the models do not match.
+        """
+        from src.networks.configmodel import load_neural_closure  # avoid circular import
+
+        def weighted_layers(model):
+            layers_by_key = {}
+            class_count = {}
+            for layer in model.core_model.layers:
+                if not layer.weights or isinstance(layer, (MeanShiftLayer, DecorrelationLayer)):
+                    continue
+                generated_name = re.sub(r"(?<!^)(?=[A-Z])", "_", type(layer).__name__).lower()
+                if re.fullmatch(generated_name + r"(_\d+)?", layer.name):
+                    idx = class_count.get(generated_name, 0)
+                    class_count[generated_name] = idx + 1
+                    layers_by_key[generated_name + "#" + str(idx)] = layer
+                else:
+                    layers_by_key[layer.name] = layer
+            return layers_by_key
+
+        print("Transfer weights from model " + source_folder)
+        source = load_neural_closure(source_folder)
+        source_by_name = weighted_layers(source.model)
+        target_by_name = weighted_layers(self.model)
+        missing = [name for name in target_by_name if name not in source_by_name]
+        unused = [name for name in source_by_name if name not in target_by_name]
+        if missing or unused:
+            raise ValueError("Cannot transfer model " + source_folder + " (" + str(len(source_by_name)) +
+                             " layers with weights) into a model with " + str(len(target_by_name)) +
+                             " layers with weights. Layers without counterpart in the source: " + str(missing) +
+                             ", layers of the source without counterpart: " + str(unused))
+        for name, layer in target_by_name.items():
+            source_layer = source_by_name[name]
+            new_weights = []
+            for target_w, source_w in zip(layer.get_weights(), source_layer.get_weights()):
+                if target_w.ndim != source_w.ndim or any(t < s for t, s in zip(target_w.shape, source_w.shape)):
+                    raise ValueError("Cannot transfer layer " + source_layer.name + " with shape " + str(
+                        source_w.shape) + " into layer " + layer.name + " with shape " + str(target_w.shape))
+                weight = np.copy(target_w)
+                if weight.ndim == 2:
+                    weight[source_w.shape[0]:, :] = 0.0  # new inputs do not contribute
+                weight[tuple(slice(0, n) for n in source_w.shape)] = source_w
+                new_weights.append(weight)
+            if isinstance(getattr(layer, "kernel_constraint", None), tf.keras.constraints.NonNeg):
+                new_weights[0] = np.maximum(new_weights[0], 0.0)
+            layer.set_weights(new_weights)
+        print("Weights transferred from model " + source_folder)
+        return True
+
+    def set_precision_policy(self, policy: str = "float32", reconstruction_dtype: str = "float64") -> bool:
+        """
+        brief: Sets the compute precision of the core network and the precision of the entropy reconstruction.
+               Must be called before create_model or load_model. The policy is only active while create_model
+               builds the layers (see precision_scoped), the global keras policy is not changed.
+               Variables (master weights) stay in float32 for all policies. For "mixed_float16", the optimizer
+               is wrapped in a LossScaleOptimizer (dynamic loss scaling). bfloat16 needs no loss scaling.
+        input: policy = "float32", "mixed_bfloat16" or "mixed_float16"
+               reconstruction_dtype = "float64" or "float32", used for reconstruct_alpha, reconstruct_u and compute_h
+        returns: True, if successful
+        """
+        if policy not in self.precision_policies:
+            raise ValueError("Precision policy >" + str(policy) + "< not supported. Choose from " + str(
+                self.precision_policies))
+        if reconstruction_dtype not in ("float64", "float32"):
+            raise ValueError("Reconstruction precision >" + str(reconstruction_dtype) + "< not supported")
+        self.precision_policy = policy
+        self.reconstruction_dtype = reconstruction_dtype
+        if policy == "mixed_float16":
+            self.optimizer = tf.keras.mixed_precision.LossScaleOptimizer(tf.keras.optimizers.Adam())
+        else:
+            self.optimizer = "adam"
+        print("Core network uses precision policy " + policy + ". Entropy reconstruction uses " + reconstruction_dtype)
+        return True
+
+    def set_quadrature_schedule(self, coarse_order: int = 0, fine_epochs: int = 0) -> bool:
+        """
+        brief: Lets the entropy wrapper use a coarse quadrature for the reconstruction in training steps.
+               Validation and execution (call_scaled_64, export) use the full quadrature.
+               Must be called before create_model or load_model.
+        input: coarse_order = order of the coarse quadrature. 0 = always use the full quadrature
+               fine_epochs = number of final training epochs that switch to the full quadrature
+        returns: True, if successful
+        """
+        if coarse_order < 0 or fine_epochs < 0:
+            raise ValueError("Quadrature order and number of epochs must be non-negative")
+        self.coarse_quadrature_order = coarse_order
+        self.fine_quadrature_epochs = fine_epochs
+        return True
+
+    def precision_report(self, u_test: np.ndarray, n_repeats: int = 10) -> dict:
+        """
+        brief: Compares the current (reduced precision) model to a copy with identical weights, float32 core network
+               and float64 reconstruction.
+               Reports the relative errors (w.r.t. the whole test set) in u, alpha and h of call_scaled_64 and the
+               average execution times.
+               Results are written to folder_name/precision_report.csv
+        input: u_test = non normalized moments, dim = (nS x N)
+               n_repeats = number of timed calls per model
+        returns: dict with errors and timings
+        """
+
+        def time_model():
+            self.call_scaled_64(u_test[:2])  # warm up
+            durations = []
+            for i in range(n_repeats):
+                start = time.perf_counter()
+                result = self.call_scaled_64(u_test)
+                durations.append(time.perf_counter() - start)
+            return [r.numpy() for r in result], float(np.mean(durations))
+
+        [u_red, alpha_red, h_red], time_red = time_model()
+
+        # float32 reference with the same weights
+        reduced_model = self.model
+        weights = reduced_model.get_weights()
+        policy = self.precision_policy
+        reconstruction_dtype = self.reconstruction_dtype
+        self.precision_policy = "float32"
+        self.reconstruction_dtype = "float64"
+        self.create_model()
+        self.model.set_weights(weights)
+        [u_ref, alpha_ref, h_ref], time_ref = time_model()
+        self.precision_policy = policy
+        self.reconstruction_dtype = reconstruction_dtype
+        self.model = reduced_model
+
+        report = {
+            "policy": policy,
+            "reconstruction_dtype": self.reconstruction_dtype,
+            "n_samples": u_test.shape[0],
+            "rel_err_u": relative_error(u_ref, u_red),
+            "rel_err_alpha": relative_error(alpha_ref, alpha_red),
+            "rel_err_h": relative_error(h_ref, h_red),
+            "max_err_alpha": float(np.max(np.abs(alpha_ref - alpha_red))),
+            "time_float32": time_ref,
+            "time_" + policy: time_red,
+            "speedup": time_ref / time_red,
+        }
+        return write_report(report, "Precision report (reference: float32 core network, float64 reconstruction):",
+                            self.folder_name + "/precision_report.csv")
+
     def call_network(self, u_complete) -> list:
         """
         Brief: This does not reconstruct u, but returns original u. Careful here!
@@ -191,18 +376,18 @@ class BaseNetwork:
             batch_size: int = 500,
             verbosity: int = 1,
             processing_mode: int = 0,
+            lbfgs_iterations: int = 0,
+            lbfgs_batch_size: int = 0,
     ):
         """
         Method to train network
+        lbfgs_iterations: if > 0, the network is first trained with full batch L-BFGS for this many iterations.
+                          Afterwards, the chosen curriculum fine-tunes the model for epoch_count epochs (0 = no Adam)
+        lbfgs_batch_size: number of samples used by L-BFGS. 0 = full training set
         """
 
         # print scaling data to file.
-        scaling_file_name = self.folder_name + "/scaling_data/min_max_scaler.csv"
-        if not path.exists(self.folder_name + "/scaling_data"):
-            makedirs(self.folder_name + "/scaling_data")
-        with open(scaling_file_name, "w") as csv_file:
-            writer = csv.writer(csv_file, delimiter=",")
-            writer.writerow([self.scaler_min, self.scaler_max])
+        self.save_scaling_data()
 
         # Set double precision training for CPU training #TODO
         if processing_mode == 0:
@@ -210,14 +395,45 @@ class BaseNetwork:
         elif processing_mode == 1:
             tf.keras.backend.set_floatx("float32")
 
+        if lbfgs_iterations > 0:
+            if self.coarse_quadrature_order > 0:
+                # L-BFGS trains on the full quadrature, the coarse quadrature is only used by the following epochs
+                self.model.coarse_quadrature_active.assign(False)
+            self.call_training_lbfgs(
+                val_split=val_split,
+                max_iterations=lbfgs_iterations,
+                batch_size=lbfgs_batch_size,
+                verbosity=verbosity,
+            )
+            self.save_model()
+            if epoch_count == 0:
+                return self.history
+            print("Hand off to " + str(self.optimizer) + " for fine tuning")
+
         # Create callbacks
+        monitored_loss = "output_3_loss"
+        if self.coarse_quadrature_order > 0:
+            # training losses of coarse and full quadrature epochs are not comparable. The validation loss always uses
+            # the full quadrature
+            if val_split <= 0.0:
+                raise ValueError("Training with a coarse quadrature selects the best model by the validation loss. "
+                                 "Choose val_split > 0")
+            monitored_loss = "val_output_3_loss"
         mc_best = tf.keras.callbacks.ModelCheckpoint(
             self.folder_name + "/best_model",
-            monitor="output_3_loss",
+            monitor=monitored_loss,
             mode="min",
             save_best_only=True,
             verbose=verbosity,
         )
+        if lbfgs_iterations > 0:
+            # best_model holds the L-BFGS result, later epochs only replace it, if they improve the monitored loss
+            x_data, y_data = self.get_training_targets()
+            n_train = int(x_data.shape[0] * (1.0 - val_split))
+            part = slice(n_train, None) if monitored_loss.startswith("val_") else slice(0, n_train)
+            mc_best.best = self.model.evaluate(x_data[part], [y[part] for y in y_data], batch_size=batch_size,
+                                               verbose=0, return_dict=True)["output_3_loss"]
+            print("Monitored loss (" + monitored_loss + ") of the L-BFGS model: " + str(mc_best.best))
         es = tf.keras.callbacks.EarlyStopping(
             monitor="loss", mode="min", min_delta=0.0001, patience=10, verbose=1
         )
@@ -309,6 +525,10 @@ class BaseNetwork:
                     HW,
                     LR,
                 ]  # , ES]  # LR,
+            if self.coarse_quadrature_order > 0:
+                callbackList.append(
+                    QuadratureScheduleCallback(epoch_count=epoch_count, fine_epochs=self.fine_quadrature_epochs)
+                )
 
             # start Training
             self.history = self.call_training(
@@ -347,6 +567,167 @@ class BaseNetwork:
         )
         return self.history
 
+    def get_training_targets(self) -> tuple:
+        """
+        brief: returns the network input and the training targets in the order of the model outputs.
+               Default is the sobolev layout [h, alpha, u] of MK11 - MK14.
+        returns: x_data, y_data
+        """
+        x_data = self.training_data[0]
+        y_data = [self.training_data[2], self.training_data[1], self.training_data[0]]
+        return x_data, y_data
+
+    def call_training_lbfgs(
+            self,
+            val_split: float = 0.1,
+            max_iterations: int = 500,
+            batch_size: int = 0,
+            verbosity: int = 1,
+            chunk_size: int = 100000,
+    ) -> dict:
+        """
+        brief: Full batch (or large batch) quasi-Newton training with L-BFGS-B and its line search (scipy).
+               Only sensible for small networks, e.g. MK11/MK13 closures for M1 and M2.
+               Kernels with NonNeg constraint (nn_component of the ICNN) are kept non-negative by the box constraints
+               of L-BFGS-B, i.e. each step is projected onto the feasible set. All other kernel constraints are
+               applied after the optimization.
+        input: val_split = fraction of the training data used for validation (last entries, as in keras fit)
+               max_iterations = maximal number of L-BFGS iterations
+               batch_size = number of (randomly chosen, fixed) training samples. 0 = full training set
+               verbosity = prints loss every iteration, if 1
+               chunk_size = number of samples evaluated at once. Loss and gradient are accumulated over chunks.
+        returns: dict with the training loss per iteration, wall time per iteration and the final validation loss
+        """
+        x_data, y_data = self.get_training_targets()
+        n_train = int(x_data.shape[0] * (1.0 - val_split))
+        x_train = tf.constant(x_data[:n_train], dtype=tf.float32)
+        y_train = [tf.convert_to_tensor(y[:n_train]) for y in y_data]
+        x_val = x_data[n_train:]
+        y_val = [y[n_train:] for y in y_data]
+        if 0 < batch_size < n_train:
+            indices = np.random.choice(n_train, size=batch_size, replace=False)
+            x_train = tf.gather(x_train, indices)
+            y_train = [tf.gather(y, indices) for y in y_train]
+            n_train = batch_size
+        chunks = [(i, min(i + chunk_size, n_train)) for i in range(0, n_train, chunk_size)]
+
+        variables = self.model.trainable_variables
+        shapes = [v.shape for v in variables]
+        sizes = [int(np.prod(shape)) for shape in shapes]
+
+        # NonNeg kernels are box constrained, all other variables are free
+        bounds = []
+        for var, size in zip(variables, sizes):
+            if isinstance(getattr(var, "constraint", None), tf.keras.constraints.NonNeg):
+                bounds += [(0.0, None)] * size
+            else:
+                bounds += [(None, None)] * size
+
+        # build the compiled loss eagerly, before it is traced
+        self.model.compiled_loss(
+            [y[:2] for y in y_train], self.model(x_train[:2], training=True)
+        )
+
+        @tf.function
+        def data_loss_and_gradient(x_chunk, y_chunk):
+            with tf.GradientTape() as tape:
+                y_pred = self.model(x_chunk, training=True)
+                loss = self.model.compiled_loss(y_chunk, y_pred)
+            return loss, tape.gradient(loss, variables)
+
+        @tf.function
+        def regularization_loss_and_gradient():
+            with tf.GradientTape() as tape:
+                loss = tf.constant(0.0, dtype=tf.float32)
+                for reg_loss in self.model.losses:
+                    loss = loss + tf.cast(reg_loss, dtype=tf.float32)
+            return loss, tape.gradient(loss, variables)
+
+        def flatten(gradients) -> np.ndarray:
+            return np.concatenate(
+                [
+                    np.zeros(size) if grad is None else grad.numpy().reshape(size)
+                    for grad, size in zip(gradients, sizes)
+                ]
+            )
+
+        def assign(theta: np.ndarray):
+            offset = 0
+            for var, shape, size in zip(variables, shapes, sizes):
+                var.assign(np.reshape(theta[offset: offset + size], shape))
+                offset += size
+
+        last_evaluation = {"theta": None, "loss": 0.0}
+
+        def objective(theta: np.ndarray):
+            assign(theta)
+            loss_val, gradients = regularization_loss_and_gradient()
+            loss_total = float(loss_val)
+            grad_total = flatten(gradients)
+            for (start, end) in chunks:
+                loss_val, gradients = data_loss_and_gradient(
+                    x_train[start:end], [y[start:end] for y in y_train]
+                )
+                weight = (end - start) / n_train
+                loss_total += weight * float(loss_val)
+                grad_total += weight * flatten(gradients)
+            last_evaluation["theta"] = np.copy(theta)
+            last_evaluation["loss"] = loss_total
+            return loss_total, grad_total
+
+        history = {"loss": [], "time": []}
+        start_time = time.perf_counter()
+
+        def log_iteration(theta: np.ndarray):
+            # the accepted iterate is usually the last evaluated point of the line search
+            if np.array_equal(theta, last_evaluation["theta"]):
+                loss_val = last_evaluation["loss"]
+            else:
+                loss_val, _ = objective(theta)
+            history["loss"].append(loss_val)
+            history["time"].append(time.perf_counter() - start_time)
+            if verbosity == 1:
+                print(
+                    "L-BFGS iteration "
+                    + str(len(history["loss"]))
+                    + ": loss = "
+                    + str(loss_val)
+                    + ", elapsed time: "
+                    + str(history["time"][-1])
+                )
+
+        theta_0 = np.concatenate([v.numpy().reshape(size) for v, size in zip(variables, sizes)]).astype(np.float64)
+        print("Start L-BFGS training with " + str(n_train) + " samples and " + str(theta_0.size) + " parameters")
+        result = minimize(
+            objective,
+            theta_0,
+            jac=True,
+            method="L-BFGS-B",
+            bounds=bounds,
+            callback=log_iteration,
+            options={"maxiter": max_iterations, "maxcor": 50, "ftol": 1e-12, "gtol": 1e-10},
+        )
+        assign(result.x)
+        # project onto the remaining constraints
+        for var in variables:
+            constraint = getattr(var, "constraint", None)
+            if constraint is not None and not isinstance(constraint, tf.keras.constraints.NonNeg):
+                var.assign(constraint(var))
+        print("L-BFGS finished after " + str(result.nit) + " iterations: " + str(result.message))
+        print("Elapsed time: " + str(time.perf_counter() - start_time))
+
+        if x_val.shape[0] > 0:
+            history["val"] = self.model.evaluate(x_val, y_val, batch_size=chunk_size, verbose=0, return_dict=True)
+            print("Validation losses: " + str(history["val"]))
+
+        # write history to file
+        if not path.exists(self.folder_name):
+            makedirs(self.folder_name)
+        pd.DataFrame({"loss": history["loss"], "time": history["time"]}).to_csv(
+            self.folder_name + "/lbfgs_history.csv", index_label="iteration"
+        )
+        return history
+
     def concat_history_files(self):
         """
         concatenates the historylogs (works only for up to 10 logs right now)
@@ -405,6 +786,18 @@ class BaseNetwork:
         )
         return csv_logger, tensorboard_callback
 
+    def save_scaling_data(self):
+        """
+        Writes the output scaling (scaler_min, scaler_max) to folder_name/scaling_data/min_max_scaler.csv
+        """
+        scaling_file_name = self.folder_name + "/scaling_data/min_max_scaler.csv"
+        if not path.exists(self.folder_name + "/scaling_data"):
+            makedirs(self.folder_name + "/scaling_data")
+        with open(scaling_file_name, "w") as csv_file:
+            writer = csv.writer(csv_file, delimiter=",")
+            writer.writerow([self.scaler_min, self.scaler_max])
+        return 0
+
     def save_model(self):
         """
         Saves best model to .pb file
@@ -416,13 +809,32 @@ class BaseNetwork:
         #    json.dump(self.model.history.history, file)
         return 0
 
-    def load_model(self, file_name=None):
+    def load_model(self, file_name=None, use_cache: bool = False):
+        """
+        brief: loads scaling data and weights of the model folder (default: folder_name). Uses the artifact
+               closure_artifact.npz of the folder, if it is current, else the SavedModel in best_model
+               (see src/networks/registry.py). Also creates the model.
+        input: file_name = model folder
+               use_cache = share the model with a closure of the same config that was loaded before in this process.
+                           Only for inference (e.g. solvers), the shared model must not be trained or modified.
+        returns: 0, if successful
+        """
+        from src.networks.registry import load_closure_weights  # avoid circular import
+
         used_file_name = self.folder_name
         if file_name != None:
             used_file_name = file_name
+        load_closure_weights(self, used_file_name, use_cache=use_cache)
+        return 0
 
+    def load_saved_model(self, folder_name: str) -> bool:
+        """
+        brief: creates the model and loads scaling data and weights of the SavedModel in folder_name/best_model
+        input: folder_name = model folder
+        returns: True, if successful
+        """
         # read scaling data
-        scaling_file_name = used_file_name + "/scaling_data/min_max_scaler.csv"
+        scaling_file_name = folder_name + "/scaling_data/min_max_scaler.csv"
         if not path.exists(scaling_file_name):
             print("Scaling Data is missing. Expected in: " + scaling_file_name)
             exit(1)
@@ -433,18 +845,14 @@ class BaseNetwork:
         self.scaler_min = float(scaling_data[0])
         self.scaler_max = float(scaling_data[1])
         self.create_model()
-        used_file_name = used_file_name + "/best_model/"
+        used_file_name = folder_name + "/best_model/"
 
         if not path.exists(used_file_name):
             print("Model does not exists at this path: " + used_file_name)
             exit(1)
-        model = tf.keras.models.load_model(
-            used_file_name, custom_objects={"CustomModel": self.model}
-        )
         self.model.load_weights(used_file_name)
-        # self.model = model
         print("Model loaded from file ")
-        return 0
+        return True
 
     def print_weights(self):
         for layer in self.model.layers:
@@ -619,24 +1027,34 @@ class BaseNetwork:
                 self.training_data[idx] = self.training_data[idx][indices]
 
         if selected_cols[0] and self.input_decorrelation:
-            print("Computing input data statistics")
-            self.mean_u = np.mean(u_ndarray, axis=0)
-            print("Training data mean (of u) is")
-            print(self.mean_u)
-            print("Training data covariance (of u) is")
-            self.cov_u = np.cov(u_ndarray, rowvar=False)
-            print(self.cov_u)
-            if self.input_dim > 1:
-                [_, self.cov_ev] = np.linalg.eigh(self.cov_u)
-            else:
-                self.cov_ev = self.cov_u  # 1D case
-            print(
-                "Shifting the data accordingly if network architecture is MK11, MK12, MK13 or MK15..."
-            )
+            self.compute_input_statistics(u_ndarray)
         else:
             print("Warning: Mean of training data moments was not computed")
         return True
 
+    def compute_input_statistics(self, u_ndarray: np.ndarray) -> bool:
+        """
+        brief: computes mean, covariance and eigenvectors of the covariance of the input moments
+               (used by the mean shift and decorrelation layers)
+        input: u_ndarray = network input moments, dim = (nS x input_dim)
+        returns: True, if successful
+        """
+        print("Computing input data statistics")
+        self.mean_u = np.mean(u_ndarray, axis=0)
+        print("Training data mean (of u) is")
+        print(self.mean_u)
+        print("Training data covariance (of u) is")
+        self.cov_u = np.cov(u_ndarray, rowvar=False)
+        print(self.cov_u)
+        if self.input_dim > 1:
+            [_, self.cov_ev] = np.linalg.eigh(self.cov_u)
+        else:
+            self.cov_ev = self.cov_u  # 1D case
+        print(
+            "Shifting the data accordingly if network architecture is MK11, MK12, MK13 or MK15..."
+        )
+        return True
+
     def training_data_preprocessing(
             self, scaled_output: bool = False, model_loaded: bool = False
     ) -> bool:
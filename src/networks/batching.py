@@ -0,0 +1,138 @@
+"""
+brief: Dynamic request batching in front of a neural closure. Concurrent small calls (threads or asyncio tasks) are
+       coalesced into one evaluation of call_scaled_64.
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class BatchingClosure:
+    """
+    Collects requests in a queue. A worker thread takes the first waiting request, waits at most max_latency seconds
+    for more requests (or until max_batch_size cells are collected), evaluates all collected moments at once and
+    scatters the results back to the futures of the requests.
+    Same interface as call_scaled_64 (call), plus non blocking (submit) and asyncio (call_async) front-ends.
+    """
+    max_batch_size: int  # maximal number of cells of a coalesced batch (a single larger request is not split)
+    max_latency: float  # maximal waiting time (seconds) for further requests after the first one of a batch
+    n_batches: int  # number of evaluated batches
+    n_requests: int  # number of served requests
+
+    def __init__(self, closure, max_batch_size: int = 100000, max_latency: float = 0.002):
+        """
+        input: closure = neural closure (BaseNetwork) with call_scaled_64
+               max_batch_size = maximal number of cells per evaluation
+               max_latency = maximal waiting time (seconds) for further requests
+        """
+        self.closure = closure
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.n_batches = 0
+        self.n_requests = 0
+        self.requests = queue.Queue()
+        self.pending = []  # request that did not fit into the last batch (or the stop signal None)
+        self.stopped = False
+        self.worker = threading.Thread(target=self.run, name="closure_batching", daemon=True)
+        self.worker.start()
+
+    def submit(self, u_non_normal: np.ndarray) -> Future:
+        """
+        brief: queues a request
+        input: u_non_normal = non normalized moments, dim = (nS x N)
+        returns: future with the result [u, alpha, h] (numpy arrays) of call_scaled_64
+        """
+        if self.stopped:
+            raise RuntimeError("Batching closure is closed")
+        future = Future()
+        self.requests.put((np.asarray(u_non_normal, dtype=np.float64), future))
+        return future
+
+    def call(self, u_non_normal: np.ndarray) -> list:
+        """
+        brief: blocking call with the interface of call_scaled_64
+        returns: [u, alpha, h] as numpy arrays
+        """
+        return self.submit(u_non_normal).result()
+
+    async def call_async(self, u_non_normal: np.ndarray) -> list:
+        """
+        brief: asyncio front-end of call
+        returns: [u, alpha, h] as numpy arrays
+        """
+        return await asyncio.wrap_future(self.submit(u_non_normal))
+
+    def collect(self) -> list:
+        """
+        brief: blocks for the first request and collects further requests until the batch is full or the deadline
+               of the first request is reached
+        returns: list of (u, future) tuples, empty if the closure was closed
+        """
+        if self.pending:
+            first = self.pending.pop()
+        else:
+            first = self.requests.get()
+        if first is None:
+            return []
+        batch = [first]
+        n_cells = first[0].shape[0]
+        deadline = time.perf_counter() + self.max_latency
+        while n_cells < self.max_batch_size:
+            try:
+                request = self.requests.get(timeout=max(deadline - time.perf_counter(), 0.0))
+            except queue.Empty:
+                break
+            if request is None or n_cells + request[0].shape[0] > self.max_batch_size:
+                self.pending.append(request)  # opens the next batch (or stops the worker after this batch)
+                break
+            batch.append(request)
+            n_cells += request[0].shape[0]
+        return batch
+
+    def run(self) -> None:
+        """
+        brief: worker loop, evaluates the collected batches until the closure is closed
+        """
+        while True:
+            batch = self.collect()
+            if not batch:
+                return
+            batch = [(u, future) for (u, future) in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                u_all = np.concatenate([u for (u, future) in batch], axis=0)
+                [u_res, alpha_res, h_res] = [np.asarray(r) for r in self.closure.call_scaled_64(u_all)]
+            except Exception as error:
+                for (u, future) in batch:
+                    future.set_exception(error)
+                continue
+            self.n_batches += 1
+            self.n_requests += len(batch)
+            offset = 0
+            for (u, future) in batch:
+                end = offset + u.shape[0]
+                future.set_result([u_res[offset:end], alpha_res[offset:end], h_res[offset:end]])
+                offset = end
+
+    def close(self) -> None:
+        """
+        brief: serves all queued requests and stops the worker
+        """
+        if not self.stopped:
+            self.stopped = True
+            self.requests.put(None)
+            self.worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
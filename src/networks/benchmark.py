@@ -0,0 +1,296 @@
+"""
+brief: Inference benchmark of neural closures. Times the full closure call_scaled_64 on realizable moments for a sweep
+       of architectures (MK, width, depth, degree, basis), precision policies and batch sizes, selects the best batch
+       size and thread setting per architecture and compares the results to a stored baseline.
+       The thread settings of tensorflow can only be set once per process, see callBenchmark.py for the driver that
+       runs one process per thread setting.
+       The accuracy versus latency benchmark evaluates trained models on a common held-out test set and computes their
+       Pareto front, see callParetoBenchmark.py.
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+import itertools
+import json
+import platform
+import time
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from matplotlib import pyplot as plt
+
+from src.networks.basenetwork import BaseNetwork
+from src.networks.configmodel import init_neural_closure
+from src.networks.distillation import sample_alpha, compute_exact_labels
+from src.networks.registry import ModelRegistry
+
+# keys of a benchmark record that identify an architecture and a run setting
+architecture_keys: tuple = ("network_mk", "nw_width", "nw_depth", "poly_degree", "spatial_dim", "basis", "precision")
+setting_keys: tuple = ("batch_size", "intra_op_threads", "inter_op_threads")
+
+
+def benchmark_configs(models: list, widths: list, depths: list, degrees: list, spatial_dims: list, bases: list,
+                      precisions: list) -> list:
+    """
+    brief: all combinations of the sweep parameters. Combinations with unsupported bases are skipped.
+    returns: list of dicts with the keys architecture_keys
+    """
+    configs = []
+    for network_mk, width, depth, degree, spatial_dim, basis, precision in itertools.product(
+            models, widths, depths, degrees, spatial_dims, bases, precisions):
+        if basis == "monomial" and spatial_dim not in (1, 2):
+            continue
+        if basis == "spherical_harmonics" and spatial_dim not in (2, 3):
+            continue
+        configs.append(dict(network_mk=network_mk, nw_width=width, nw_depth=depth, poly_degree=degree,
+                            spatial_dim=spatial_dim, basis=basis, precision=precision))
+    return configs
+
+
+def create_benchmark_closure(config: dict) -> BaseNetwork:
+    """
+    brief: creates a closure with random weights (the latency does not depend on the weights)
+    input: config = dict with the keys architecture_keys
+    returns: the created closure
+    """
+    closure = init_neural_closure(network_mk=config["network_mk"], poly_degree=config["poly_degree"],
+                                  spatial_dim=config["spatial_dim"], folder_name="benchmark", loss_combination=2,
+                                  nw_width=config["nw_width"], nw_depth=config["nw_depth"], normalized=True,
+                                  input_decorrelation=False, scale_active=False, basis=config["basis"])
+    closure.set_precision_policy(policy=config["precision"])
+    closure.create_model()
+    return closure
+
+
+def sample_realizable_moments(closure: BaseNetwork, n_samples: int, max_alpha_norm: float = 10.0,
+                              seed: int = 1) -> np.ndarray:
+    """
+    brief: realizable moments with random u_0 in [0.1,10], sampled via their Lagrange multipliers
+    returns: u, dims = (n_samples x N)
+    """
+    rng = np.random.default_rng(seed)
+    alpha = sample_alpha(n_samples, closure.model.input_dim - 1, max_alpha_norm, rng=rng)
+    [u_normalized, _, _] = compute_exact_labels(closure.model, alpha)
+    return u_normalized * rng.uniform(low=0.1, high=10.0, size=(n_samples, 1))
+
+
+def time_closure(closure: BaseNetwork, u_pool: np.ndarray, batch_size: int, n_repeats: int = 20,
+                 min_time: float = 0.5) -> dict:
+    """
+    brief: times call_scaled_64 (including the conversion of the results to numpy) on batches of the moment pool.
+           Repeats at least n_repeats times and at least min_time seconds.
+    input: closure = neural closure
+           u_pool = realizable moments, dims = (nP x N). Batches larger than the pool repeat the pool.
+           batch_size = number of cells per call
+           n_repeats = minimal number of timed calls
+           min_time = minimal total time (seconds) of the timed calls
+    returns: dict with median, 10% and 90% quantile of the latency (seconds) and the throughput (cells per second)
+    """
+    batch = np.resize(u_pool, (batch_size, u_pool.shape[1]))  # repeats the pool, if necessary
+    for i in range(2):  # warm up (tracing)
+        [r.numpy() for r in closure.call_scaled_64(batch)]
+    durations = []
+    start_all = time.perf_counter()
+    while len(durations) < n_repeats or time.perf_counter() - start_all < min_time:
+        start = time.perf_counter()
+        [r.numpy() for r in closure.call_scaled_64(batch)]
+        durations.append(time.perf_counter() - start)
+    median = float(np.median(durations))
+    return {"latency_median": median, "latency_p10": float(np.quantile(durations, 0.1)),
+            "latency_p90": float(np.quantile(durations, 0.9)), "throughput": batch_size / median,
+            "n_calls": len(durations)}
+
+
+def run_benchmark(configs: list, batch_sizes: list, n_repeats: int = 20, min_time: float = 0.5,
+                  seed: int = 1) -> list:
+    """
+    brief: benchmarks all architectures and batch sizes with the thread setting of this process
+    input: configs = list of architectures (see benchmark_configs)
+           batch_sizes = list of batch sizes
+           n_repeats, min_time = see time_closure
+           seed = seed of the moment pool
+    returns: list of records (dicts with architecture_keys, setting_keys and the timings)
+    """
+    threads = {"intra_op_threads": tf.config.threading.get_intra_op_parallelism_threads(),
+               "inter_op_threads": tf.config.threading.get_inter_op_parallelism_threads()}
+    records = []
+    for config in configs:
+        try:
+            closure = create_benchmark_closure(config)
+        except Exception as error:  # some architectures do not build for all settings
+            print("Skip architecture " + str(config) + ": " + str(error))
+            continue
+        u_pool = sample_realizable_moments(closure, min(max(batch_sizes), 100000), seed=seed)
+        for batch_size in batch_sizes:
+            timing = time_closure(closure, u_pool, batch_size, n_repeats=n_repeats, min_time=min_time)
+            records.append(dict(**config, batch_size=batch_size, **threads, **timing))
+            print("Benchmark " + str(config) + " batch size " + str(batch_size) + ": " + str(
+                timing["throughput"]) + " cells/s")
+        tf.keras.backend.clear_session()
+    return records
+
+
+def select_best(records: list) -> list:
+    """
+    brief: selects the batch size and thread setting with the highest throughput per architecture
+    returns: list of records, one per architecture
+    """
+    frame = pd.DataFrame(records)
+    best = frame.loc[frame.groupby(list(architecture_keys))["throughput"].idxmax()]
+    return best.to_dict(orient="records")
+
+
+def compare_baseline(records: list, baseline: list, threshold: float = 0.1) -> list:
+    """
+    brief: compares the throughput to a baseline. Records are matched by architecture and setting.
+    input: records = current benchmark records
+           baseline = stored benchmark records (e.g. of the last release)
+           threshold = relative loss of throughput that is flagged as regression
+    returns: list of regressions (dicts with the matching keys, baseline and current throughput)
+    """
+    keys = architecture_keys + setting_keys
+    reference = {tuple(r[k] for k in keys): r["throughput"] for r in baseline}
+    regressions = []
+    for record in records:
+        key = tuple(record[k] for k in keys)
+        if key in reference and record["throughput"] < (1.0 - threshold) * reference[key]:
+            regressions.append(dict(zip(keys, key), baseline_throughput=reference[key],
+                                    throughput=record["throughput"]))
+    return regressions
+
+
+def write_results(records: list, file_name: str) -> bool:
+    """
+    brief: writes the records to <file_name>.json (with host information) and <file_name>.csv
+    returns: True, if successful
+    """
+    host = {"machine": platform.machine(), "processor": platform.processor(), "python": platform.python_version(),
+            "tensorflow": tf.__version__}
+    with open(file_name + ".json", "w") as f:
+        json.dump({"host": host, "records": records}, f, indent=1)
+    pd.DataFrame(records).to_csv(file_name + ".csv", index=False)
+    return True
+
+
+def read_results(file_name: str) -> list:
+    """
+    returns: records of a results file written by write_results (<file_name>.json)
+    """
+    with open(file_name + ".json") as f:
+        return json.load(f)["records"]
+
+
+def create_test_set(closure: BaseNetwork, n_samples: int = 100000, max_alpha_norm: float = 10.0,
+                    boundary_fraction: float = 0.3, seed: int = 2) -> dict:
+    """
+    brief: held-out realizable test set of normalized moments with exact labels. The test set is deterministic for a
+           given seed, moment basis and sampling, i.e. all closures with the same degree, dimension and basis are
+           evaluated on the same samples.
+    input: closure = neural closure (created or loaded)
+           n_samples = number of test samples
+           max_alpha_norm = radius of the sampling ball of the Lagrange multipliers
+           boundary_fraction = fraction of samples near the realizable boundary (0.8*max_alpha_norm <= |alpha|)
+           seed = seed of the sampling (differs from the training and distillation seeds)
+    returns: dict with u, alpha, h, dims = (nS x N), (nS x N), (nS x 1), and boundary (mask of the boundary samples)
+    """
+    rng = np.random.default_rng(seed)
+    alpha = sample_alpha(n_samples, closure.model.input_dim - 1, max_alpha_norm, boundary_fraction, rng)
+    [u, alpha_complete, h] = compute_exact_labels(closure.model, alpha)
+    boundary = np.zeros(n_samples, dtype=bool)
+    boundary[n_samples - int(boundary_fraction * n_samples):] = True
+    return {"u": u, "alpha": alpha_complete, "h": h, "boundary": boundary}
+
+
+def evaluate_accuracy(closure: BaseNetwork, test_set: dict, chunk_size: int = 100000) -> dict:
+    """
+    brief: relative errors of the closure on a test set (see create_test_set), computed with call_scaled_64 on chunks
+           of the test set
+    returns: dict with the mean relative errors of u, alpha and h and the maximal relative error of u, alpha and h on
+             the boundary samples
+    """
+    n_samples = test_set["u"].shape[0]
+    predictions = [np.concatenate(p, axis=0) for p in zip(
+        *[[r.numpy() for r in closure.call_scaled_64(test_set["u"][start:start + chunk_size])]
+          for start in range(0, n_samples, chunk_size)])]
+    result = {}
+    for key, prediction in zip(("u", "alpha", "h"), predictions):
+        error = np.linalg.norm(prediction - test_set[key], axis=1) / np.maximum(
+            np.linalg.norm(test_set[key], axis=1), 1e-10)
+        result["err_" + key] = float(np.mean(error))
+        result["max_err_" + key + "_boundary"] = float(np.max(error[test_set["boundary"]], initial=0.0))
+    return result
+
+
+def evaluate_model_worker(arguments: tuple) -> dict:
+    """
+    brief: evaluates the accuracy and the cost per cell of one trained model. Runs in a worker process of
+           callParetoBenchmark.py, i.e. must be importable and gets picklable arguments.
+    input: arguments = (root, name, n_samples, batch_size, n_repeats)
+    returns: record with the name, the config, the errors (see evaluate_accuracy) and the cost per cell (seconds) or
+             the error message, if the model can not be evaluated
+    """
+    [root, name, n_samples, batch_size, n_repeats] = arguments
+    try:
+        closure = ModelRegistry(root).load(name, use_cache=False)
+        test_set = create_test_set(closure, n_samples)
+        record = {"name": name, "network_mk": int(type(closure).__name__[2:-len("Network")]),
+                  "nw_width": closure.model_width, "nw_depth": closure.model_depth,
+                  "poly_degree": closure.poly_degree, "spatial_dim": closure.spatial_dim, "basis": closure.basis}
+        record.update(evaluate_accuracy(closure, test_set))
+        timing = time_closure(closure, test_set["u"], batch_size, n_repeats=n_repeats)
+        record["cost_per_cell"] = timing["latency_median"] / batch_size
+        record["failed"] = ""
+    except (Exception, SystemExit) as error:  # broken model folders are reported, not fatal (legacy loaders exit)
+        record = {"name": name, "failed": type(error).__name__ + ": " + str(error)}
+    print("Evaluated " + name + ": " + str(record))
+    return record
+
+
+def pareto_front(records: list, cost_key: str = "cost_per_cell", error_key: str = "err_h") -> pd.DataFrame:
+    """
+    brief: Pareto front of cost and error, separately for each moment system (degree, dimension, basis).
+           A model is on the front, if no other model of its moment system has lower or equal cost and error
+           (and is strictly better in one of them).
+    returns: DataFrame of all evaluated models with the column "pareto" (bool), sorted by moment system and cost
+    """
+    frame = pd.DataFrame([r for r in records if not r["failed"]])
+    if frame.empty:
+        return frame
+    frame = frame.drop(columns="failed")
+    frame = frame.sort_values(["poly_degree", "spatial_dim", "basis", cost_key, error_key], ignore_index=True)
+    frame["pareto"] = False
+    for _, group in frame.groupby(["poly_degree", "spatial_dim", "basis"]):
+        best_error = np.inf
+        for idx in group.index:  # sorted by cost, on the front if the error is below all cheaper models
+            if frame.loc[idx, error_key] < best_error:
+                frame.loc[idx, "pareto"] = True
+                best_error = frame.loc[idx, error_key]
+    return frame
+
+
+def plot_pareto(frame: pd.DataFrame, file_name: str, cost_key: str = "cost_per_cell",
+                error_key: str = "err_h") -> bool:
+    """
+    brief: plots error over cost of all models (one subplot per moment system) and marks the Pareto front
+    returns: True, if successful
+    """
+    systems = list(frame.groupby(["poly_degree", "spatial_dim", "basis"]))
+    fig, axes = plt.subplots(1, len(systems), figsize=(6 * len(systems), 5), squeeze=False)
+    for ax, ((degree, dim, basis), group) in zip(axes[0], systems):
+        for network_mk, mk_group in group.groupby("network_mk"):
+            ax.scatter(mk_group[cost_key], mk_group[error_key], label="MK" + str(network_mk))
+        front = group[group["pareto"]]
+        ax.plot(front[cost_key], front[error_key], "k--", label="Pareto front")
+        for _, row in front.iterrows():
+            ax.annotate(row["name"], (row[cost_key], row[error_key]), fontsize=8)
+        ax.set_xscale("log")
+        ax.set_yscale("log")
+        ax.set_xlabel("cost per cell [s]")
+        ax.set_ylabel("mean relative error of " + error_key[4:])
+        ax.set_title("M" + str(degree) + " " + str(dim) + "D " + basis)
+        ax.legend()
+    plt.tight_layout()
+    plt.savefig(file_name, dpi=300)
+    plt.close(fig)
+    return True
@@ -5,6 +5,7 @@ Version: 0.0
 Date 29.10.2020
 """
 
+from src import utils
 from src.networks.basenetwork import BaseNetwork
 
 ### imports ###
@@ -164,3 +165,36 @@ def init_neural_closure(
         exit()
     print("Neural closure model created")
     return neural_closure_model
+
+
+def load_neural_closure(folder_name: str, load_weights: bool = True, use_cache: bool = False) -> BaseNetwork:
+    """
+    brief: re-creates a trained neural closure from the config file in models/<folder_name> (written at training start)
+    params: folder_name = name of the model folder (relative to models/)
+            load_weights = if true, the scaling data and weights are loaded as well
+            use_cache = share the loaded model with earlier loads of the same model (see BaseNetwork.load_model)
+    returns: the configured (and loaded) neural closure
+    """
+    config = utils.read_config_file("models/" + folder_name)
+
+    def to_bool(value: str) -> bool:
+        return value in ("True", "true", "1")
+
+    neural_closure_model = init_neural_closure(
+        network_mk=int(config["model"]),
+        poly_degree=int(config["degree"]),
+        spatial_dim=int(config["spatial Dimension"]),
+        folder_name=folder_name,
+        loss_combination=int(config["objective"]),
+        nw_width=int(config["network width"]),
+        nw_depth=int(config["network depth"]),
+        normalized=to_bool(config["normalized moments"]),
+        input_decorrelation=to_bool(config["decorrelate inputs"]),
+        scale_active=to_bool(config["scaled outputs"]),
+        gamma_lvl=int(config.get("gamma_level", 0)),
+        basis=config.get("basis", "monomial"),
+        rotated=to_bool(config.get("rotated", "False")),
+    )
+    if load_weights:
+        neural_closure_model.load_model(use_cache=use_cache)
+    return neural_closure_model
@@ -59,3 +59,21 @@ class LearningRateSchedulerWithWarmup(tf.keras.callbacks.Callback):
         logs = logs or {}
         logs['lr'] = tf.keras.backend.get_value(self.model.optimizer.lr)
         print("Current learning rate: " + str(tf.keras.backend.get_value(self.model.optimizer.lr)))
+
+
+class QuadratureScheduleCallback(tf.keras.callbacks.Callback):
+    def __init__(self, epoch_count: int, fine_epochs: int):
+        """
+        Switches the entropy wrapper from the coarse training quadrature to the full quadrature
+        for the last <fine_epochs> of <epoch_count> epochs. Validation always uses the full quadrature.
+        """
+        super(QuadratureScheduleCallback, self).__init__()
+        self.switch_epoch = epoch_count - fine_epochs
+
+    def on_train_begin(self, logs=None):
+        self.model.coarse_quadrature_active.assign(self.switch_epoch > 0)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        if epoch == self.switch_epoch:
+            print('\n\nSwitch to full quadrature for the remaining training epochs.')
+            self.model.coarse_quadrature_active.assign(False)
@@ -29,7 +29,7 @@ class MeanShiftLayer(layers.Layer):
         self.mu.assign(mean_shift)
 
     def call(self, inputs):
-        return inputs - self.mu
+        return inputs - tf.cast(self.mu, dtype=inputs.dtype)
 
 
 class DecorrelationLayer(layers.Layer):
@@ -50,7 +50,7 @@ class DecorrelationLayer(layers.Layer):
 
     def call(self, inputs):
         """the layer performs operation (ev.T*data.T).T, which is data*ev"""
-        return tf.matmul(inputs, self.ev_cov_mat)
+        return tf.matmul(inputs, tf.cast(self.ev_cov_mat, dtype=inputs.dtype))
 
 
 class PositiveWeightLayer(layers.Dense):
@@ -163,3 +163,118 @@ class PositiveWeightLayer(layers.Dense):
                 # out = layers.BatchNormalization(name='bn_' + str(layerIdx))(out)
                 return out
                 """
+
+
+class IcnnGradientLayer(layers.Layer):
+    """
+    Evaluates an input convex core network (MK11, MK13, MK14) and its gradient w.r.t. the network input in one sweep:
+    forward pass through the layers of the core network, then a hand written backward pass.
+    Used for inference (call_scaled_64, frozen export), where it replaces the GradientTape of the SobolevModel.
+    Training steps use the GradientTape (see call_tape), since the explicit gradient gave no measurable speed-up of
+    the training step and does not contain the dependence of the batch statistics of BN on the batch.
+    The layer uses the layers (and weights) of the core network and has no weights of its own.
+    Structure: z_-1 = elu(W x + b), z_l = elu(BN(Wnn_l z_l-1 + b_l + Wd_l x)) (+ z_l-1 for residual networks),
+               h = Wnn_out z + b_out + Wd_out x (relu, if the output is scaled), where x is the (shifted and
+               decorrelated) input. BN only in MK14.
+    """
+
+    def __init__(self, core_model, depth: int, residual: bool = False, relu_output: bool = False, **kwargs):
+        """
+        input: core_model = ICNN core model with the layer names of MK11/MK13/MK14
+               depth = number of convex layers
+               residual = if true, the convex layers have skip connections (MK13)
+               relu_output = if true, the output layer has a relu activation (scaled output)
+        """
+        super(IcnnGradientLayer, self).__init__(**kwargs)
+        self.depth = depth
+        self.residual = residual
+        self.relu_output = relu_output
+        # the custom layers do not keep their names, so they are found by type
+        layer_types = {type(layer).__name__: layer for layer in core_model.layers}
+        self.mean_shift = layer_types.get("MeanShiftLayer")
+        self.decorrelation = layer_types.get("DecorrelationLayer")
+        self.input_layer = core_model.get_layer("layer_-1_input")
+        layer_indices = list(range(depth)) + [depth + 2]
+        self.nn_components = [core_model.get_layer("layer_" + str(idx) + "nn_component") for idx in layer_indices]
+        self.dense_components = [core_model.get_layer("layer_" + str(idx) + "dense_component") for idx in
+                                 layer_indices]
+        # one batch normalization per convex layer (MK14), in the order of creation
+        self.batch_norms = [layer for layer in core_model.layers if type(layer).__name__ == "BatchNormalization"]
+        self.core_model = core_model
+
+    def call(self, inputs, training=False):
+        """
+        input: inputs = network input (normalized moments without u_0), dims = (nS x N-1)
+        returns: [h, dh/dinputs], dims = (nS x 1), (nS x N-1)
+        """
+        if training:
+            return self.call_tape(inputs)
+        dtype = self.input_layer.compute_dtype
+        x = tf.cast(inputs, dtype=dtype)
+        if self.mean_shift is not None:
+            x = self.decorrelation(self.mean_shift(x))
+        kernels_nn = [tf.cast(layer.kernel, dtype) for layer in self.nn_components]
+        kernels_dense = [tf.cast(layer.kernel, dtype) for layer in self.dense_components]
+
+        # forward pass
+        kernel_input = tf.cast(self.input_layer.kernel, dtype)
+        z = tf.keras.activations.elu(tf.matmul(x, kernel_input) + tf.cast(self.input_layer.bias, dtype))
+        activations = [z]
+        bn_scales = []
+        for idx in range(self.depth):
+            a = tf.matmul(z, kernels_nn[idx]) + tf.cast(self.nn_components[idx].bias, dtype) + tf.matmul(
+                x, kernels_dense[idx])
+            if self.batch_norms:
+                bn_scales.append(self.batch_norm_scale(self.batch_norms[idx], dtype))
+                a = self.batch_norms[idx](a, training=False)
+            activation = tf.keras.activations.elu(a)
+            activations.append(activation)
+            z = activation + z if self.residual else activation
+        out = tf.matmul(z, kernels_nn[-1]) + tf.cast(self.nn_components[-1].bias, dtype) + tf.matmul(
+            x, kernels_dense[-1])
+
+        # backward pass. The output layer has one neuron, i.e. its backward step is a broadcast of its kernels
+        grad_z = tf.transpose(kernels_nn[-1])
+        grad_x = tf.transpose(kernels_dense[-1])
+        if self.relu_output:
+            grad_out = tf.cast(out > 0, dtype=dtype)
+            grad_z = grad_out * grad_z
+            grad_x = grad_out * grad_x
+            out = tf.keras.activations.relu(out)
+        else:
+            grad_z = tf.broadcast_to(grad_z, shape=tf.shape(z))
+        for idx in reversed(range(self.depth)):
+            # elu'(a) = 1 for a > 0, elu(a) + 1 else
+            grad_a = tf.raw_ops.EluGrad(gradients=grad_z, outputs=activations[idx + 1])
+            if self.batch_norms:
+                grad_a = grad_a * bn_scales[idx]
+            grad_x += tf.matmul(grad_a, kernels_dense[idx], transpose_b=True)
+            grad_z_prev = tf.matmul(grad_a, kernels_nn[idx], transpose_b=True)
+            grad_z = grad_z_prev + grad_z if self.residual else grad_z_prev
+        grad_x += tf.matmul(tf.raw_ops.EluGrad(gradients=grad_z, outputs=activations[0]), kernel_input,
+                            transpose_b=True)
+        if self.decorrelation is not None:
+            grad_x = tf.matmul(grad_x, tf.cast(self.decorrelation.ev_cov_mat, dtype), transpose_b=True)
+        return [out, grad_x]
+
+    def call_tape(self, inputs):
+        """
+        brief: [h, dh/dinputs] of the core network in training mode with a GradientTape (as the SobolevModel
+               without gradient layer), i.e. including the dependence of the batch statistics of BN on the batch
+        """
+        with tf.GradientTape() as grad_tape:
+            grad_tape.watch(inputs)
+            h = self.core_model(inputs, training=True)
+        return [h, grad_tape.gradient(h, inputs)]
+
+    @staticmethod
+    def batch_norm_scale(batch_norm, dtype):
+        """
+        brief: derivative of the batch normalization w.r.t. its input in inference mode
+        returns: gamma / sqrt(var + epsilon), where var is the moving variance
+        """
+        variance = tf.cast(batch_norm.moving_variance, dtype)
+        scale = tf.math.rsqrt(variance + batch_norm.epsilon)
+        if batch_norm.scale:
+            scale = scale * tf.cast(batch_norm.gamma, dtype)
+        return scale
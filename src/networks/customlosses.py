@@ -6,6 +6,8 @@ from tensorflow.keras.losses import Loss
 import tensorflow as tf
 from keras import backend
 
+from src.networks.entropymodels import reconstruct_density
+
 
 class MonotonicFunctionLoss(Loss):
     """
@@ -56,30 +58,6 @@ def kl_divergence_loss(m_b, q_w):
     returns: KL_divergence function using mBasis and quadWeights
     """
 
-    def reconstruct_alpha(alpha):
-        """
-        brief:  Reconstructs alpha_0 and then concats alpha_0 to alpha_1,... , from alpha1,...
-                Only works for maxwell Boltzmann entropy so far.
-                => copied from sobolev model code
-        nS = batchSize
-        N = basisSize
-        nq = number of quadPts
-
-        input: alpha, dims = (nS x N-1)
-               m    , dims = (N x nq)
-               w    , dims = nq
-        returns alpha_complete = [alpha_0,alpha], dim = (nS x N), where alpha_0 = - ln(<exp(alpha*m)>)
-        """
-        # Check the predicted alphas for +/- infinity or nan - raise error if found
-        checked_alpha = tf.debugging.check_numerics(alpha, message='input tensor checking error', name='checked')
-        # Clip the predicted alphas below the tf.exp overflow threshold
-        clipped_alpha = tf.clip_by_value(checked_alpha, clip_value_min=-50, clip_value_max=50,
-                                         name='checkedandclipped')
-
-        tmp = tf.math.exp(tf.tensordot(clipped_alpha, m_b[1:, :], axes=([1], [0])))  # tmp = alpha * m
-        alpha_0 = -tf.math.log(tf.tensordot(tmp, q_w, axes=([1], [1])))  # ln(<tmp>)
-        return tf.concat([alpha_0, alpha], axis=1)  # concat [alpha_0,alpha]
-
     def kl_divergence(y_true: tf.Tensor, y_pred: tf.Tensor) -> tf.Tensor:
         """
         brief: computes the Kullback-Leibler Divergence of the kinetic density w.r.t alpha given the kinetic density w.r.t
@@ -89,14 +67,12 @@ def kl_divergence_loss(m_b, q_w):
         output: pointwise KL Divergence, dim  = ns x 1
         """
 
-        # extend alpha_true to full dimension
-        alpha_true_recon = reconstruct_alpha(y_true)
-        alpha_pred_recon = reconstruct_alpha(y_pred)
+        # extend alpha_true to full dimension, f_true = exp(alpha_true_recon*m)*w with one exp per sample
+        [alpha_true_recon, f_true] = reconstruct_density(y_true, m_b, q_w)
+        [alpha_pred_recon, _] = reconstruct_density(y_pred, m_b, q_w)
         # compute KL_divergence
         diff = alpha_true_recon - alpha_pred_recon
-        t1 = tf.math.exp(tf.tensordot(alpha_true_recon, m_b, axes=([1], [0])))
         t2 = tf.tensordot(diff, m_b, axes=([1], [0]))
-        integrand = tf.math.multiply(t1, t2)
-        return tf.tensordot(integrand, q_w, axes=([1], [1]))
+        return tf.math.reduce_sum(tf.math.multiply(f_true, t2), axis=1, keepdims=True)
 
     return kl_divergence
@@ -0,0 +1,176 @@
+"""
+brief: Knowledge distillation of a trained (large) neural closure into a small and fast student closure
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from src.networks.basenetwork import BaseNetwork
+from src.networks.reports import relative_error, write_report
+
+
+def sample_alpha(n_samples: int, dim: int, max_alpha_norm: float, boundary_fraction: float = 0.3,
+                 rng: np.random.Generator = None) -> np.ndarray:
+    """
+    brief: samples Lagrange multipliers alpha_1,...,alpha_N of normalized moments.
+           (1-boundary_fraction) of the samples are uniform in the ball |alpha| <= max_alpha_norm,
+           the remaining samples are uniform in the shell 0.8*max_alpha_norm <= |alpha| <= max_alpha_norm,
+           i.e. their moments are close to the boundary of the realizable set.
+    input: n_samples = number of samples
+           dim = number of Lagrange multipliers (without alpha_0)
+           max_alpha_norm = radius of the sampling ball
+           boundary_fraction = fraction of samples in the outer shell
+           rng = numpy random generator
+    returns: alpha, dim = (n_samples x dim)
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    directions = rng.normal(size=(n_samples, dim))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    n_boundary = int(boundary_fraction * n_samples)
+    r_interior = max_alpha_norm * rng.uniform(size=(n_samples - n_boundary, 1)) ** (1.0 / dim)
+    r_boundary = rng.uniform(low=0.8 * max_alpha_norm, high=max_alpha_norm, size=(n_boundary, 1))
+    return directions * np.concatenate([r_interior, r_boundary], axis=0)
+
+
+def compute_exact_labels(entropy_model, alpha: np.ndarray) -> list:
+    """
+    brief: computes the normalized moments u, the complete Lagrange multipliers and the entropy h of the given
+           alpha_1,...,alpha_N. These are exact solutions of the dual minimal entropy problem, i.e. the labels a
+           converged Newton solver returns for u.
+    input: entropy_model = entropy wrapper (EntropyModel) of a neural closure
+           alpha = Lagrange multipliers without alpha_0, dim = (nS x N-1)
+    returns: [u, alpha, h], dims = (nS x N), (nS x N), (nS x 1)
+    """
+    alpha_complete = entropy_model.reconstruct_alpha(tf.constant(alpha, dtype=entropy_model.recons_dtype))
+    u_complete = entropy_model.reconstruct_u(alpha_complete)
+    h = entropy_model.compute_h(u_complete, alpha_complete)
+    return [u_complete.numpy(), alpha_complete.numpy(), h.numpy()]
+
+
+def create_distillation_data(teacher: BaseNetwork, n_samples: int, max_alpha_norm: float,
+                             boundary_fraction: float = 0.3, label_tolerance: float = 1e-3, seed: int = None,
+                             chunk_size: int = 100000) -> dict:
+    """
+    brief: creates the training data of the student. Moments u are sampled densely (also near the realizable
+           boundary) via Lagrange multipliers, and labeled with the teacher's prediction of alpha and h, i.e. the
+           student learns the function of the teacher. Each teacher label is verified against the exact labels of u
+           (the solution a converged Newton solver returns): if the moments reconstructed from the teacher's alpha
+           miss u by more than label_tolerance (relative error), the teacher fails and the exact labels are used.
+    input: teacher = trained neural closure
+           n_samples = number of training samples
+           max_alpha_norm = radius of the sampling ball of alpha
+           boundary_fraction = fraction of samples near the realizable boundary
+           label_tolerance = maximal relative moment reconstruction error of an accepted teacher label
+           seed = seed of the sampling
+           chunk_size = number of samples per teacher call
+    returns: dict with normalized training data u, alpha, h (without 0th entries of u and alpha) and label statistics
+    """
+    rng = np.random.default_rng(seed)
+    alpha = sample_alpha(n_samples, teacher.model.input_dim - 1, max_alpha_norm, boundary_fraction, rng)
+    [u, alpha_exact, h_exact] = compute_exact_labels(teacher.model, alpha)
+
+    alpha_teacher = np.zeros(alpha_exact.shape)
+    h_teacher = np.zeros(h_exact.shape)
+    u_teacher = np.zeros(u.shape)
+    for start in range(0, n_samples, chunk_size):
+        end = min(start + chunk_size, n_samples)
+        [u_pred, alpha_pred, h_pred] = teacher.call_scaled_64(u[start:end])
+        u_teacher[start:end] = u_pred.numpy()
+        alpha_teacher[start:end] = alpha_pred.numpy()
+        h_teacher[start:end] = np.reshape(h_pred.numpy(), (-1, 1))
+    residual = np.linalg.norm(u_teacher - u, axis=1) / np.linalg.norm(u, axis=1)
+    accepted = residual <= label_tolerance  # false for non finite teacher predictions
+
+    alpha_label = np.where(accepted[:, np.newaxis], alpha_teacher, alpha_exact)
+    h_label = np.where(accepted[:, np.newaxis], h_teacher, h_exact)
+    print("Teacher labels accepted for " + str(np.count_nonzero(accepted)) + " of " + str(
+        n_samples) + " samples (tolerance " + str(label_tolerance) + ")")
+    return {"u": u[:, 1:], "alpha": alpha_label[:, 1:], "h": h_label, "accepted_fraction": float(np.mean(accepted)),
+            "max_teacher_residual": float(np.max(residual))}
+
+
+def distillation_report(teacher: BaseNetwork, student: BaseNetwork, n_test: int = 10000, max_alpha_norm: float = 20,
+                        batch_sizes: tuple = (100, 10000), n_repeats: int = 10, seed: int = 1,
+                        label_statistics: dict = None) -> dict:
+    """
+    brief: compares teacher and student on an exact test set (same sampling as the training data) and measures the
+           latency per cell of call_scaled_64 for the given batch sizes (100 = grid of MNSolver1D).
+           Results are written to student.folder_name/distillation_report.csv
+    input: teacher, student = neural closures of the same moment system
+           n_test = number of test samples
+           max_alpha_norm = radius of the sampling ball of alpha
+           batch_sizes = batch sizes of the latency measurement
+           n_repeats = number of timed calls per batch size
+           seed = seed of the test set
+           label_statistics = additional entries of the report, e.g. the fraction of accepted teacher labels
+    returns: dict with relative errors (w.r.t. the whole test set), latencies and parameter counts
+    """
+    rng = np.random.default_rng(seed)
+    alpha = sample_alpha(n_test, teacher.model.input_dim - 1, max_alpha_norm, rng=rng)
+    [u_test, alpha_test, h_test] = compute_exact_labels(teacher.model, alpha)
+
+    report = {"n_test": n_test}
+    if label_statistics is not None:
+        report.update(label_statistics)
+    for name, closure in (("teacher", teacher), ("student", student)):
+        [u_pred, alpha_pred, h_pred] = [r.numpy() for r in closure.call_scaled_64(u_test)]
+        report[name + "_params"] = closure.model.core_model.count_params()
+        report[name + "_rel_err_u"] = relative_error(u_test, u_pred)
+        report[name + "_rel_err_alpha"] = relative_error(alpha_test, alpha_pred)
+        report[name + "_rel_err_h"] = relative_error(h_test, h_pred)
+        for batch_size in batch_sizes:
+            u_batch = np.resize(u_test, (batch_size, u_test.shape[1]))
+            closure.call_scaled_64(u_batch)  # warm up
+            durations = []
+            for i in range(n_repeats):
+                start = time.perf_counter()
+                closure.call_scaled_64(u_batch)
+                durations.append(time.perf_counter() - start)
+            report[name + "_time_per_cell_" + str(batch_size)] = float(np.mean(durations)) / batch_size
+    for batch_size in batch_sizes:
+        report["speedup_" + str(batch_size)] = report["teacher_time_per_cell_" + str(batch_size)] / report[
+            "student_time_per_cell_" + str(batch_size)]
+
+    return write_report(report, "Distillation report (reference: exact minimal entropy closure):",
+                        student.folder_name + "/distillation_report.csv")
+
+
+def distill_closure(teacher: BaseNetwork, student: BaseNetwork, n_samples: int = 200000,
+                    max_alpha_norm: float = 20, boundary_fraction: float = 0.3, label_tolerance: float = 1e-3,
+                    val_split: float = 0.1, epoch_count: int = 1000, curriculum: int = 1, batch_size: int = 128,
+                    verbosity: int = 1, processing_mode: int = 0, lbfgs_iterations: int = 0, seed: int = None) -> dict:
+    """
+    brief: trains a (small) student closure of any MK type on labels of a trained teacher closure. The student
+           model is created here (after the training data is known, as for the standard training).
+    input: teacher = trained neural closure (normalized, with call_scaled_64)
+           student = neural closure of the same moment system, model is not yet created
+           n_samples, max_alpha_norm, boundary_fraction, label_tolerance, seed = see create_distillation_data
+           val_split, epoch_count, curriculum, batch_size, verbosity, processing_mode, lbfgs_iterations =
+           see BaseNetwork.config_start_training
+    returns: distillation report, see distillation_report
+    """
+    for closure in (teacher, student):
+        if not closure.normalized or type(closure).call_scaled_64 is BaseNetwork.call_scaled_64:
+            raise ValueError("Distillation needs normalized closures with a call_scaled_64 method (MK11, MK13 - MK15)")
+    if (teacher.poly_degree, teacher.spatial_dim, teacher.basis, teacher.input_dim) != (
+            student.poly_degree, student.spatial_dim, student.basis, student.input_dim):
+        raise ValueError("Teacher and student must close the same moment system")
+
+    data = create_distillation_data(teacher, n_samples=n_samples, max_alpha_norm=max_alpha_norm,
+                                    boundary_fraction=boundary_fraction, label_tolerance=label_tolerance, seed=seed)
+    student.training_data = [data["u"], data["alpha"], data["h"]]
+    if student.input_decorrelation:
+        student.compute_input_statistics(data["u"])
+    student.training_data_preprocessing(scaled_output=student.scale_active)
+    student.create_model()
+    student.config_start_training(val_split=val_split, epoch_count=epoch_count, curriculum=curriculum,
+                                  batch_size=batch_size, verbosity=verbosity, processing_mode=processing_mode,
+                                  lbfgs_iterations=lbfgs_iterations)
+    return distillation_report(teacher, student, max_alpha_norm=max_alpha_norm,
+                               label_statistics={"accepted_teacher_labels": data["accepted_fraction"],
+                                                 "max_teacher_residual": data["max_teacher_residual"]})
@@ -0,0 +1,291 @@
+"""
+brief: Zero-copy embedding API of exported closures for external (C++) solvers. The caller passes the moments and
+       preallocated output buffers (row-major float64, any object with the buffer protocol, e.g. a memoryview of the
+       solver's arrays). The closure is evaluated with the NumPy engine (see numpyclosure.py) on views of these
+       buffers, all intermediate results are written with out= operations into a workspace that is allocated once
+       for max_batch_size cells.
+       This module must not import tensorflow (directly or via other modules of this package).
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+import sys
+
+import numpy as np
+
+from src.networks.numpyclosure import NumpyClosure, selu_alpha, selu_scale
+
+
+def as_float64_array(buffer, n_cols: int, name: str, writable: bool = False) -> np.ndarray:
+    """
+    brief: zero-copy view of a row-major float64 buffer as array with n_cols columns
+    input: buffer = numpy array, memoryview, array.array("d"), ctypes array or any other object with the buffer
+                    protocol and float64 items. Untyped byte buffers (format "B", e.g. bytearray, shared memory) are
+                    read as float64
+           n_cols = number of columns
+           name = name of the buffer (error messages)
+           writable = the buffer must be writable (output buffers)
+    returns: array, dims = (nS x n_cols), shares the memory of the buffer
+    """
+    if isinstance(buffer, np.ndarray):
+        if buffer.dtype != np.float64 or not buffer.flags.c_contiguous:
+            raise ValueError("Buffer " + name + " must be a C-contiguous float64 array")
+        array = buffer
+    else:
+        view = memoryview(buffer)
+        if view.format not in ("d", "@d", "=d", "<d", "B") or (view.format == "<d" and sys.byteorder != "little"):
+            raise ValueError("Buffer " + name + " must hold float64 items, got format " + view.format)
+        if not view.c_contiguous:
+            raise ValueError("Buffer " + name + " must be C-contiguous")
+        array = np.frombuffer(view.cast("B"), dtype=np.float64)
+    if writable and not array.flags.writeable:
+        raise ValueError("Buffer " + name + " must be writable")
+    if array.size % n_cols != 0:
+        raise ValueError("Size " + str(array.size) + " of buffer " + name + " is not a multiple of " + str(n_cols))
+    return array.reshape((-1, n_cols))
+
+
+class EmbeddedClosure:
+    """
+    Closure with in-place evaluation on caller owned buffers. close_into reads u and writes u, alpha and h of the
+    closure into the output buffers. Batches larger than max_batch_size are processed in chunks of the workspace.
+    """
+    closure: NumpyClosure  # evaluated closure (weights, moment basis, quadrature)
+    max_batch_size: int  # number of cells of the workspace
+    workspace: dict  # name -> preallocated array with max_batch_size rows
+
+    def __init__(self, file_name: str, max_batch_size: int = 10000):
+        """
+        input: file_name = .npz file written by export_numpy_closure
+               max_batch_size = number of cells per evaluation (size of the workspace)
+        """
+        if max_batch_size < 1:
+            raise ValueError("Batch size of the embedded closure must be positive")
+        self.closure = NumpyClosure(file_name)
+        self.max_batch_size = max_batch_size
+        w = self.closure.weights
+        n_x = self.closure.input_dim - 1
+        width = w["input_kernel"].shape[1]
+        n_quad = self.closure.moment_basis.shape[1]
+        shapes = {"x": n_x, "x_pre": n_x, "grad_x": n_x, "tmp_x": n_x, "f": n_quad, "tmp_u": n_x + 1, "col": 1,
+                  "col_2": 1, "out": 1, "y": width, "tmp": width, "grad_z": width}
+        if self.closure.architecture == "resnet":
+            shapes.update({"hidden": width, "alpha": n_x})
+        else:
+            for idx in range(self.closure.depth + 1):  # activations and elu derivatives of all hidden layers
+                shapes["z_" + str(idx)] = width
+                shapes["elu_derivative_" + str(idx)] = width
+        self.workspace = {name: np.empty((max_batch_size, n_cols)) for name, n_cols in shapes.items()}
+        self.moment_basis_reduced = np.ascontiguousarray(self.closure.moment_basis[1:, :])
+        self.moment_basis_transposed = np.ascontiguousarray(self.closure.moment_basis.T)
+        self.quad_weights_transposed = np.ascontiguousarray(self.closure.quad_weights.T)
+        self.gamma_vector = np.full(shape=(1, self.closure.input_dim), fill_value=self.closure.gamma)
+        self.gamma_vector[0, 0] = 0.0
+
+    def ws(self, name: str, n: int) -> np.ndarray:
+        """
+        returns: view of the first n rows of a workspace array
+        """
+        return self.workspace[name][:n]
+
+    @staticmethod
+    def elu_into(a: np.ndarray, z: np.ndarray, derivative: np.ndarray) -> None:
+        """
+        brief: z = elu(a) = max(a,0) + expm1(min(a,0)), derivative = elu'(a) = expm1(min(a,0)) + 1, in place.
+               a is overwritten.
+        """
+        np.minimum(a, 0.0, out=z)
+        np.expm1(z, out=z)
+        np.add(z, 1.0, out=derivative)
+        np.maximum(a, 0.0, out=a)
+        z += a
+
+    @staticmethod
+    def selu_into(y: np.ndarray, out: np.ndarray) -> None:
+        """
+        brief: out = selu(y) = scale * (max(y,0) + alpha * expm1(min(y,0))), in place. y is overwritten.
+        """
+        np.minimum(y, 0.0, out=out)
+        np.expm1(out, out=out)
+        out *= selu_alpha
+        np.maximum(y, 0.0, out=y)
+        out += y
+        out *= selu_scale
+
+    def call_icnn_into(self, x: np.ndarray, n: int) -> np.ndarray:
+        """
+        brief: forward and backward pass of the ICNN (see NumpyClosure.call_icnn) in the workspace
+        input: x = network input, dims = (n x N-1)
+        returns: workspace view of dh/dx, dims = (n x N-1)
+        """
+        w = self.closure.weights
+        resnet = self.closure.architecture == "resnet_icnn"
+        a = self.ws("y", n)
+        np.matmul(x, w["input_kernel"], out=a)
+        a += w["input_bias"]
+        self.elu_into(a, self.ws("z_0", n), self.ws("elu_derivative_0", n))
+        for idx in range(self.closure.depth):
+            z_prev = self.ws("z_" + str(idx), n)
+            z = self.ws("z_" + str(idx + 1), n)
+            np.matmul(z_prev, w["nn_kernel_" + str(idx)], out=a)
+            np.matmul(x, w["dense_kernel_" + str(idx)], out=self.ws("tmp", n))
+            a += self.ws("tmp", n)
+            a += w["nn_bias_" + str(idx)]
+            self.elu_into(a, z, self.ws("elu_derivative_" + str(idx + 1), n))
+            if resnet:
+                z += z_prev
+        out = self.ws("out", n)
+        grad_out = self.ws("col", n)
+        np.matmul(self.ws("z_" + str(self.closure.depth), n), w["nn_kernel_" + str(self.closure.depth)], out=out)
+        np.matmul(x, w["dense_kernel_" + str(self.closure.depth)], out=grad_out)
+        out += grad_out
+        out += w["nn_bias_" + str(self.closure.depth)]
+        grad_out.fill(1.0)
+        if self.closure.scale_active:  # relu output
+            np.greater(out, 0.0, out=grad_out)
+        # backward pass
+        grad_z = self.ws("grad_z", n)
+        grad_x = self.ws("grad_x", n)
+        tmp_x = self.ws("tmp_x", n)
+        np.matmul(grad_out, w["nn_kernel_" + str(self.closure.depth)].T, out=grad_z)
+        np.matmul(grad_out, w["dense_kernel_" + str(self.closure.depth)].T, out=grad_x)
+        grad_a = self.ws("tmp", n)
+        for idx in reversed(range(self.closure.depth)):
+            np.multiply(grad_z, self.ws("elu_derivative_" + str(idx + 1), n), out=grad_a)
+            np.matmul(grad_a, w["dense_kernel_" + str(idx)].T, out=tmp_x)
+            grad_x += tmp_x
+            if resnet:
+                grad_z += np.matmul(grad_a, w["nn_kernel_" + str(idx)].T, out=a)
+            else:
+                np.matmul(grad_a, w["nn_kernel_" + str(idx)].T, out=grad_z)
+        np.multiply(grad_z, self.ws("elu_derivative_0", n), out=grad_a)
+        np.matmul(grad_a, w["input_kernel"].T, out=tmp_x)
+        grad_x += tmp_x
+        if self.closure.decorrelation:
+            np.matmul(grad_x, w["decorrelation"].T, out=tmp_x)
+            return tmp_x
+        return grad_x
+
+    def call_resnet_into(self, x: np.ndarray, n: int) -> np.ndarray:
+        """
+        brief: forward pass of the residual network (see NumpyClosure.call_resnet) in the workspace
+        input: x = network input, dims = (n x N-1)
+        returns: workspace view of the core network output, dims = (n x N-1)
+        """
+        w = self.closure.weights
+        hidden = self.ws("hidden", n)
+        y = self.ws("y", n)
+        tmp = self.ws("tmp", n)
+        np.matmul(x, w["input_kernel"], out=hidden)
+        hidden += w["input_bias"]
+        for idx in range(self.closure.depth):
+            block = "block_" + str(idx)
+            np.copyto(y, hidden)
+            for j in range(2):
+                if block + "_bn_scale_" + str(j) in w:  # not folded into the previous dense layer
+                    y *= w[block + "_bn_scale_" + str(j)]
+                    y += w[block + "_bn_shift_" + str(j)]
+                self.selu_into(y, tmp)
+                np.matmul(tmp, w[block + "_kernel_" + str(j)], out=y)
+                y += w[block + "_bias_" + str(j)]
+            hidden += y
+        alpha = self.ws("alpha", n)
+        np.matmul(hidden, w["output_kernel"], out=alpha)
+        alpha += w["output_bias"]
+        if self.closure.scale_active:
+            # scale to [scaler_min, scaler_max]
+            alpha += 1.0
+            alpha *= (w["scaler_max"] - w["scaler_min"]) * 0.5
+            alpha += w["scaler_min"]
+        return alpha
+
+    def close_chunk(self, u: np.ndarray, u_out: np.ndarray, alpha_out: np.ndarray, h_out: np.ndarray) -> None:
+        """
+        brief: closes at most max_batch_size cells (see NumpyClosure.call_scaled_64), results are written to the
+               output views
+        """
+        n = u.shape[0]
+        u_0 = u[:, :1]
+        x = self.ws("x", n)
+        np.divide(u[:, 1:], u_0, out=x)
+        if self.closure.decorrelation:
+            x_pre = self.ws("x_pre", n)
+            np.subtract(x, self.closure.weights["mean_shift"], out=self.ws("tmp_x", n))
+            np.matmul(self.ws("tmp_x", n), self.closure.weights["decorrelation"], out=x_pre)
+            x = x_pre
+        if self.closure.architecture == "resnet":
+            alpha = self.call_resnet_into(x, n)
+        else:
+            alpha = self.call_icnn_into(x, n)
+        alpha_reduced = alpha_out[:, 1:]
+        np.clip(alpha, -50, 50, out=alpha_reduced)
+        # alpha_0 = - ln(<exp(alpha*m)>), the basis function m_0 is constant
+        m_0 = self.closure.moment_basis[0, 0]
+        f = self.ws("f", n)
+        integral = self.ws("col", n)
+        np.matmul(alpha_reduced, self.moment_basis_reduced, out=f)
+        np.exp(f, out=f)
+        np.matmul(f, self.quad_weights_transposed, out=integral)
+        alpha_0 = alpha_out[:, :1]
+        np.log(integral, out=alpha_0)
+        alpha_0 += np.log(m_0)
+        alpha_0 *= -1.0 / m_0
+        # f_weighted = exp(alpha_complete*m) * w
+        f *= self.closure.quad_weights
+        integral *= m_0
+        np.divide(f, integral, out=f)
+        np.matmul(f, self.moment_basis_transposed, out=u_out)
+        tmp_u = self.ws("tmp_u", n)
+        if self.closure.gamma != 0.0:
+            np.multiply(alpha_out, self.gamma_vector, out=tmp_u)
+            u_out += tmp_u
+        # rescaling, h = alpha_rescaled*u_rescaled - u_0^m_0 <f> - 0.5 gamma |alpha|^2
+        u_out *= u_0
+        col = self.ws("col", n)
+        np.log(u_0, out=col)
+        alpha_0 += col
+        np.multiply(alpha_out, u_out, out=tmp_u)
+        np.sum(tmp_u, axis=1, keepdims=True, out=h_out)
+        np.sum(f, axis=1, keepdims=True, out=col)
+        col_2 = self.ws("col_2", n)
+        np.power(u_0, m_0, out=col_2)
+        col *= col_2
+        h_out -= col
+        if self.closure.gamma != 0.0:
+            tmp_x = self.ws("tmp_x", n)
+            np.multiply(alpha_reduced, alpha_reduced, out=tmp_x)
+            np.sum(tmp_x, axis=1, keepdims=True, out=col)
+            col *= 0.5 * self.closure.gamma
+            h_out -= col
+
+    def close_into(self, u, u_out, alpha_out, h_out) -> int:
+        """
+        brief: closes the moments in u and writes the results into the output buffers (no allocation of arrays of
+               the batch size, outputs must not share memory with u)
+        input: u = non normalized moments, row-major float64 buffer of nS x N values
+               u_out, alpha_out = output buffers of nS x N values (reconstructed moments, Lagrange multipliers)
+               h_out = output buffer of nS values (entropy)
+        returns: number of closed cells nS
+        """
+        n_moments = self.closure.input_dim
+        u = as_float64_array(u, n_moments, "u")
+        u_out = as_float64_array(u_out, n_moments, "u_out", writable=True)
+        alpha_out = as_float64_array(alpha_out, n_moments, "alpha_out", writable=True)
+        h_out = as_float64_array(h_out, 1, "h_out", writable=True)
+        n_cells = u.shape[0]
+        if not n_cells == u_out.shape[0] == alpha_out.shape[0] == h_out.shape[0]:
+            raise ValueError("Output buffers must hold " + str(n_cells) + " cells")
+        for start in range(0, n_cells, self.max_batch_size):
+            end = min(start + self.max_batch_size, n_cells)
+            self.close_chunk(u[start:end], u_out[start:end], alpha_out[start:end], h_out[start:end])
+        return n_cells
+
+
+def load_embedded_closure(folder_name: str, max_batch_size: int = 10000) -> EmbeddedClosure:
+    """
+    brief: entry point of external solvers. Loads the NumPy export of a trained closure (training mode 10)
+    input: folder_name = model folder (relative to models/)
+           max_batch_size = number of cells per evaluation (size of the workspace)
+    returns: the embedded closure
+    """
+    return EmbeddedClosure("models/" + folder_name + "/numpy_closure.npz", max_batch_size=max_batch_size)
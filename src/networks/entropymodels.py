@@ -13,6 +13,34 @@ from tensorflow import Tensor
 from src import math
 
 
+def reconstruct_density(alpha, moment_basis, quad_weights) -> list:
+    """
+    brief: reconstructs alpha_0 from alpha_1,...,alpha_N and the weighted kinetic density with one evaluation of
+           exp(alpha*m) per sample. The basis function m_0 is constant, i.e.
+           exp(alpha_complete*m) = exp(alpha_0*m_0) exp(alpha*m_r) and alpha_0 = -(ln(m_0) + ln(<exp(alpha*m_r)>))/m_0
+           follows from the partial integral. Only works for maxwell Boltzmann entropy so far.
+    nS = batchSize
+    N = basisSize
+    nq = number of quadPts
+
+    input: alpha, dims = (nS x N-1)
+           moment_basis, dims = (N x nq)
+           quad_weights, dims = (1 x nq)
+    returns [alpha_complete, f_weighted], where alpha_complete = [alpha_0, alpha], dims = (nS x N) and
+            f_weighted = exp(alpha_complete*m) * w, dims = (nS x nq). Note that sum(f_weighted) = 1/m_0.
+    """
+    # Check the predicted alphas for +/- infinity or nan - raise error if found
+    checked_alpha = tf.debugging.check_numerics(alpha, message='input tensor checking error', name='checked')
+    # Clip the predicted alphas below the tf.exp overflow threshold
+    clipped_alpha = tf.clip_by_value(checked_alpha, clip_value_min=-50, clip_value_max=50, name='checkedandclipped')
+    m_0 = moment_basis[0, 0]
+    f_reduced = tf.math.exp(tf.matmul(clipped_alpha, moment_basis[1:, :]))  # exp(alpha*m_r), dims = (nS x nq)
+    integral = tf.matmul(f_reduced, quad_weights, transpose_b=True)  # <exp(alpha*m_r)>, dims = (nS x 1)
+    alpha_0 = - (tf.math.log(m_0) + tf.math.log(integral)) / m_0
+    f_weighted = f_reduced * quad_weights / (m_0 * integral)
+    return [tf.concat([alpha_0, alpha], axis=1), f_weighted]
+
+
 class EntropyModel(tf.keras.Model, ABC):
     """
     model that wraps entropy tools around a given core model to reconstruct moments, scale lagrange multipliers etc
@@ -35,23 +63,32 @@ class EntropyModel(tf.keras.Model, ABC):
     # @brief: tensor of the form [0,gamma,gamma,...]
     regularization_gamma_vector: Tensor
     input_dim: int  # @brief size of moment basis
+    # @brief: precision of the entropy reconstruction (the core model may use a lower precision compute policy)
+    recons_dtype: tf.DType
+    # @brief: coarse quadrature used in training steps (only if coarse_quadrature_order > 0)
+    quad_weights_coarse: Tensor
+    moment_basis_coarse: Tensor
+    # @brief: switch between coarse and fine quadrature in training steps. None, if no coarse quadrature is used
+    coarse_quadrature_active: tf.Variable
 
     def __init__(self, core_model: tf.keras.Model, polynomial_degree: int = 1, spatial_dimension: int = 1,
                  reconstruct_u: bool = False, scaler_min: float = 0.0, scaler_max: float = 1.0,
                  scale_active: bool = True, subclass: bool = False, gamma: float = 0.0, basis: str = "monomial",
-                 rotated=False, **opts):
-        super(EntropyModel, self).__init__()
+                 rotated=False, reconstruction_dtype: str = "float64", coarse_quadrature_order: int = 0, **opts):
+        # the wrapper itself always computes in float32, independent of the global mixed precision policy
+        super(EntropyModel, self).__init__(dtype="float32")
+        self.recons_dtype = tf.as_dtype(reconstruction_dtype)
         # Member is only the model we want to wrap with sobolev execution
         self.core_model = core_model  # must be a compiled tensorflow model
         self.enable_recons_u = reconstruct_u
         # Create quadrature and momentBasis. Currently only for 1D problems
         self.poly_degree = polynomial_degree
-        self.derivative_scaler_min = tf.constant(scaler_min, dtype=tf.float64)
-        self.derivative_scaler_max = tf.constant(scaler_max, dtype=tf.float64)
+        self.derivative_scaler_min = tf.constant(scaler_min, dtype=self.recons_dtype)
+        self.derivative_scaler_max = tf.constant(scaler_max, dtype=self.recons_dtype)
         self.scale_active = scale_active
         self.derivative_scale_factor = tf.constant(
-            (scaler_max - scaler_min) * 0.5, dtype=tf.float64)
-        self.regularization_gamma = tf.constant(gamma, dtype=tf.float64)
+            (scaler_max - scaler_min) * 0.5, dtype=self.recons_dtype)
+        self.regularization_gamma = tf.constant(gamma, dtype=self.recons_dtype)
         self.basis = basis
         self.rotated = rotated
         print("Model uses regularization with parameter gamma = " + str(gamma))
@@ -59,21 +96,54 @@ class EntropyModel(tf.keras.Model, ABC):
         if not subclass:
             print("Model output alpha will be scaled by factor " +
                   str(self.derivative_scale_factor.numpy()))
+        [quad_pts, quad_weights, m_basis] = self.create_quadrature(6 * polynomial_degree, spatial_dimension)
+        self.nq = quad_weights.size
+
+        # if self.rotated:
+        #    m_basis = np.delete(m_basis, 2, axis=0)  # delete m1_y component from basis
+
+        self.quad_pts = tf.constant(quad_pts, shape=(self.nq, spatial_dimension),
+                                    dtype=self.recons_dtype)  # dims = (ds x nq)
+        self.quad_weights = tf.constant(quad_weights, shape=(1, self.nq),
+                                        dtype=self.recons_dtype)  # dims=(batchSIze x N x nq)
+        self.input_dim = m_basis.shape[0]
+        self.moment_basis = tf.constant(m_basis, shape=(self.input_dim, self.nq),
+                                        dtype=self.recons_dtype)  # dims=(batchSIze x N x nq)
+        gamma_vec = gamma * np.ones(shape=(1, self.input_dim))
+        gamma_vec[0, 0] = 0.0
+        self.regularization_gamma_vector = tf.constant(gamma_vec, dtype=self.recons_dtype, shape=(1, self.input_dim))
+
+        # multi fidelity: coarse quadrature for training steps, full quadrature for validation and execution
+        self.coarse_quadrature_active = None
+        if coarse_quadrature_order > 0:
+            [_, quad_weights_coarse, m_basis_coarse] = self.create_quadrature(coarse_quadrature_order,
+                                                                              spatial_dimension)
+            self.quad_weights_coarse = tf.constant(quad_weights_coarse, shape=(1, quad_weights_coarse.size),
+                                                   dtype=self.recons_dtype)
+            self.moment_basis_coarse = tf.constant(m_basis_coarse, shape=(self.input_dim, quad_weights_coarse.size),
+                                                   dtype=self.recons_dtype)
+            self.coarse_quadrature_active = tf.Variable(True, trainable=False, name="coarse_quadrature_active")
+            print("Training steps use a coarse quadrature with " + str(quad_weights_coarse.size) + " of " + str(
+                self.nq) + " points")
+
+    def create_quadrature(self, order: int, spatial_dimension: int) -> list:
+        """
+        brief: creates quadrature points, weights and the moment basis evaluated at the quadrature points
+        input: order = order of the quadrature
+               spatial_dimension = spatial dimension of the closure
+        returns: [quad_pts, quad_weights, m_basis], dims = (nq x ds), nq, (N x nq)
+        """
         if spatial_dimension == 1 and self.basis == "monomial":
-            [quad_pts, quad_weights] = math.qGaussLegendre1D(6 * polynomial_degree)  # dims = nq
+            [quad_pts, quad_weights] = math.qGaussLegendre1D(order)  # dims = nq
             m_basis = math.computeMonomialBasis1D(quad_pts, self.poly_degree)  # dims = (N x nq)
-            self.nq = quad_weights.size  # = 20 * polyDegree
         elif spatial_dimension == 2 and self.basis == "monomial":
-            [quad_pts, quad_weights, _, _] = math.qGaussLegendre2D(6 * polynomial_degree)  # dims = nq
-            self.nq = quad_weights.size  # is not 20 * polyDegree
+            [quad_pts, quad_weights, _, _] = math.qGaussLegendre2D(order)  # dims = nq
             m_basis = math.computeMonomialBasis2D(quad_pts, self.poly_degree)  # dims = (N x nq)
         elif spatial_dimension == 3 and self.basis == "spherical_harmonics":
-            [quad_pts, quad_weights, mu, phi] = math.qGaussLegendre3D(6 * polynomial_degree)  # dims = nq
-            self.nq = quad_weights.size  # is not 20 * polyDegree
+            [quad_pts, quad_weights, mu, phi] = math.qGaussLegendre3D(order)  # dims = nq
             m_basis = math.compute_spherical_harmonics(mu, phi, self.poly_degree)
         elif spatial_dimension == 2 and self.basis == "spherical_harmonics":
-            [quad_pts, quad_weights, mu, phi] = math.qGaussLegendre2D(6 * polynomial_degree)  # dims = nq #
-            self.nq = quad_weights.size  # is not 20 * polyDegree
+            [quad_pts, quad_weights, mu, phi] = math.qGaussLegendre2D(order)  # dims = nq #
             # print(sum(quad_weights))
             m_basis = math.compute_spherical_harmonics_2D(mu, phi, self.poly_degree)
             np.set_printoptions(precision=2)
@@ -87,18 +157,7 @@ class EntropyModel(tf.keras.Model, ABC):
         else:
             print("spatial dimension not yet supported for sobolev wrapper")
             exit()
-
-        # if self.rotated:
-        #    m_basis = np.delete(m_basis, 2, axis=0)  # delete m1_y component from basis
-
-        self.quad_pts = tf.constant(quad_pts, shape=(self.nq, spatial_dimension), dtype=tf.float64)  # dims = (ds x nq)
-        self.quad_weights = tf.constant(quad_weights, shape=(1, self.nq), dtype=tf.float64)  # dims=(batchSIze x N x nq)
-        self.input_dim = m_basis.shape[0]
-        self.moment_basis = tf.constant(m_basis, shape=(self.input_dim, self.nq),
-                                        dtype=tf.float64)  # dims=(batchSIze x N x nq)
-        gamma_vec = gamma * np.ones(shape=(1, self.input_dim))
-        gamma_vec[0, 0] = 0.0
-        self.regularization_gamma_vector = tf.constant(gamma_vec, dtype=tf.float64, shape=(1, self.input_dim))
+        return [quad_pts, quad_weights, m_basis]
 
     def call(self, x: Tensor, training=False, **kwargs) -> list:
         """
@@ -108,24 +167,21 @@ class EntropyModel(tf.keras.Model, ABC):
                 u = [u_1,u_2,...,u_N]
         """
 
-        alpha = self.core_model(x)
+        alpha = tf.cast(self.core_model(x), dtype=tf.float32)
         if self.enable_recons_u:
             if self.scale_active:
                 print("Scaled reconstruction of u and h enabled")
                 # scale to [scaler_min, scaler_max]
-                t1 = tf.add(tf.cast(alpha, dtype=tf.float64, name=None), 1)  # shift
+                t1 = tf.add(tf.cast(alpha, dtype=self.recons_dtype, name=None), 1)  # shift
                 t2 = tf.math.scalar_mul(self.derivative_scale_factor, t1)  # scale
                 alpha64 = tf.add(t2, self.derivative_scaler_min)  # shift
             else:
                 print("Reconstruction of u and h enabled")
-                alpha64 = tf.cast(alpha, dtype=tf.float64, name=None)
-            alpha_complete = self.reconstruct_alpha(alpha64)
-            u_complete = self.reconstruct_u(alpha_complete)
+                alpha64 = tf.cast(alpha, dtype=self.recons_dtype, name=None)
+            # reconstruct u and compute entropy functional h
+            [alpha_complete, u_complete, h_res] = self.reconstruct(alpha64, training=training, compute_entropy=True)
             # cutoff the 0th order moment, since it is 1 by construction
             u_res = u_complete[:, 1:]
-
-            # compute entropy functional h
-            h_res = self.compute_h(u=u_complete, alpha=alpha_complete)
         else:
             print("Reconstruction of u and h disabled. Output 3 and 4 are meaningless")
             u_res = alpha
@@ -138,6 +194,7 @@ class EntropyModel(tf.keras.Model, ABC):
         brief: neural network call, with non-normalized input.
         input: u_non_normal: tensor with non_normalized moments
         """
+        u_non_normal = tf.cast(u_non_normal, dtype=self.recons_dtype)
         u_0 = u_non_normal[:, 0]
         u_downscaled = self.scale_u(u_non_normal, tf.math.reciprocal(
             u_non_normal[:, 0]))  # downscaling
@@ -147,21 +204,81 @@ class EntropyModel(tf.keras.Model, ABC):
             print("Scaled reconstruction of u and h enabled")
             # scale to [scaler_min, scaler_max]
             t1 = tf.add(
-                tf.cast(alpha, dtype=tf.float64, name=None), 1)  # shift
+                tf.cast(alpha, dtype=self.recons_dtype, name=None), 1)  # shift
             t2 = tf.math.scalar_mul(self.derivative_scale_factor, t1)  # scale
             alpha64 = tf.add(t2, self.derivative_scaler_min)  # shift
         else:
             print("Reconstruction of u and h enabled")
-            alpha64 = tf.cast(alpha, dtype=tf.float64, name=None)
-        alpha_complete = self.reconstruct_alpha(alpha64)
-        u_complete = self.reconstruct_u(alpha_complete)
-        u_rescaled = self.scale_u(u_complete, u_0)  # upscaling
-        alpha_rescaled = self.scale_alpha(alpha_complete, u_0)
-        # u_rescaled_recons = self.reconstruct_u(alpha_rescaled)
-        h = self.compute_h(u_rescaled, alpha_rescaled)
+            alpha64 = tf.cast(alpha, dtype=self.recons_dtype, name=None)
+        # reconstruction and upscaling
+        return self.reconstruct_scaled(alpha64, u_0)
+
+    def reconstruct(self, alpha, training=False, compute_entropy: bool = False) -> list:
+        """
+        brief: Reconstructs alpha_0 and u (and h) from alpha_1,...,alpha_N. Training steps use the coarse quadrature,
+               if it is active. Validation and execution always use the full quadrature.
+        input: alpha, dims = (nS x N-1)
+               training = True, if called in a training step
+               compute_entropy = if True, h is computed as well
+        returns [alpha_complete, u_complete, (h)], dims = (nS x N), (nS x N), (nS x 1)
+        """
+
+        def reconstruct_on(moment_basis, quad_weights):
+            [alpha_complete, u_complete, h] = self.reconstruct_fused(alpha, moment_basis, quad_weights)
+            if compute_entropy:
+                return [alpha_complete, u_complete, h]
+            return [alpha_complete, u_complete]
+
+        if training and self.coarse_quadrature_active is not None:
+            return tf.cond(self.coarse_quadrature_active,
+                           lambda: reconstruct_on(self.moment_basis_coarse, self.quad_weights_coarse),
+                           lambda: reconstruct_on(self.moment_basis, self.quad_weights))
+        return reconstruct_on(self.moment_basis, self.quad_weights)
+
+    def reconstruct_fused(self, alpha, moment_basis=None, quad_weights=None) -> list:
+        """
+        brief: reconstructs alpha_0, u and h of normalized moments from alpha_1,...,alpha_N with one evaluation of
+               exp(alpha*m) per sample (see reconstruct_density). Same results as reconstruct_alpha, reconstruct_u and
+               compute_h, where h = alpha_complete*u - <exp(alpha_complete*m)> - 0.5*gamma*|alpha|^2 and
+               <exp(alpha_complete*m)> = 1/m_0 (i.e. h = alpha_complete*u - u_0 for the monomial basis).
+        input: alpha, dims = (nS x N-1)
+               m    , dims = (N x nq) (default: self.moment_basis)
+               w    , dims = nq (default: self.quad_weights)
+        returns [alpha_complete, u_complete, h], dims = (nS x N), (nS x N), (nS x 1)
+        """
+        if moment_basis is None:
+            moment_basis = self.moment_basis
+            quad_weights = self.quad_weights
+        [alpha_complete, f_weighted] = reconstruct_density(alpha, moment_basis, quad_weights)
+        u_complete = tf.matmul(f_weighted, moment_basis, transpose_b=True) + tf.math.multiply(
+            self.regularization_gamma_vector, alpha_complete)
+        h = tf.math.reduce_sum(tf.math.multiply(alpha_complete, u_complete), axis=1, keepdims=True) - tf.math.divide(
+            1.0, moment_basis[0, 0]) - 0.5 * self.regularization_gamma * tf.math.reduce_sum(
+            tf.math.multiply(alpha, alpha), axis=1, keepdims=True)
+        return [alpha_complete, u_complete, h]
+
+    def reconstruct_scaled(self, alpha, u_0) -> list:
+        """
+        brief: reconstructs the closure of non normalized moments from alpha_1,...,alpha_N of the normalized moments
+               with one evaluation of exp(alpha*m) per sample (see reconstruct_density).
+               Same results as reconstruct_alpha, reconstruct_u, scale_u, scale_alpha and compute_h on the
+               rescaled variables, where <exp(alpha_rescaled*m)> = u_0^m_0 / m_0.
+        input: alpha, dims = (nS x N-1)
+               u_0 = zero order moments, dims = (nS)
+        returns [u_rescaled, alpha_rescaled, h], dims = (nS x N), (nS x N), (nS x 1)
+        """
+        u_0 = tf.reshape(u_0, shape=(-1, 1))
+        [alpha_complete, f_weighted] = reconstruct_density(alpha, self.moment_basis, self.quad_weights)
+        u_rescaled = tf.math.multiply(tf.matmul(f_weighted, self.moment_basis, transpose_b=True) + tf.math.multiply(
+            self.regularization_gamma_vector, alpha_complete), u_0)
+        alpha_rescaled = tf.concat([alpha_complete[:, :1] + tf.math.log(u_0), alpha], axis=1)
+        m_0 = self.moment_basis[0, 0]
+        h = tf.math.reduce_sum(tf.math.multiply(alpha_rescaled, u_rescaled), axis=1, keepdims=True) - tf.math.exp(
+            m_0 * tf.math.log(u_0)) / m_0 - 0.5 * self.regularization_gamma * tf.math.reduce_sum(
+            tf.math.multiply(alpha, alpha), axis=1, keepdims=True)
         return [u_rescaled, alpha_rescaled, h]
 
-    def reconstruct_alpha(self, alpha):
+    def reconstruct_alpha(self, alpha, moment_basis=None, quad_weights=None):
         """
         brief:  Reconstructs alpha_0 and then concats alpha_0 to alpha_1,... , from alpha1,...
                 Only works for maxwell Boltzmann entropy so far.
@@ -170,10 +287,13 @@ class EntropyModel(tf.keras.Model, ABC):
         nq = number of quadPts
 
         input: alpha, dims = (nS x N-1)
-               m    , dims = (N x nq)
-               w    , dims = nq
+               m    , dims = (N x nq) (default: self.moment_basis)
+               w    , dims = nq (default: self.quad_weights)
         returns alpha_complete = [alpha_0,alpha], dim = (nS x N), where alpha_0 = - ln(<exp(alpha*m)>)
         """
+        if moment_basis is None:
+            moment_basis = self.moment_basis
+            quad_weights = self.quad_weights
         # Check the predicted alphas for +/- infinity or nan - raise error if found
         checked_alpha = tf.debugging.check_numerics(alpha,
                                                     message='input tensor checking error at alpha = ' + str(alpha),
@@ -182,16 +302,16 @@ class EntropyModel(tf.keras.Model, ABC):
         clipped_alpha = tf.clip_by_value(
             checked_alpha, clip_value_min=-50, clip_value_max=50, name='checkedandclipped')
 
-        tmp = tf.math.exp(tf.tensordot(clipped_alpha, self.moment_basis[1:, :], axes=([1], [0])))  # tmp = alpha * m
+        tmp = tf.math.exp(tf.tensordot(clipped_alpha, moment_basis[1:, :], axes=([1], [0])))  # tmp = alpha * m
 
         # ln(<tmp>)
 
-        alpha_0 = - (tf.math.log(self.moment_basis[0, 0]) + tf.math.log(
-            tf.tensordot(tmp, self.quad_weights, axes=([1], [1])))) / self.moment_basis[0, 0]
+        alpha_0 = - (tf.math.log(moment_basis[0, 0]) + tf.math.log(
+            tf.tensordot(tmp, quad_weights, axes=([1], [1])))) / moment_basis[0, 0]
 
         return tf.concat([alpha_0, alpha], axis=1)  # concat [alpha_0,alpha]
 
-    def reconstruct_u(self, alpha):
+    def reconstruct_u(self, alpha, moment_basis=None, quad_weights=None):
         """
         brief: reconstructs u from alpha with regularization in mind
         nS = batchSize
@@ -199,19 +319,22 @@ class EntropyModel(tf.keras.Model, ABC):
         nq = number of quadPts
 
         input: alpha, dims = (nS x N)
-               m    , dims = (N x nq)
-               w    , dims = nq
+               m    , dims = (N x nq) (default: self.moment_basis)
+               w    , dims = nq (default: self.quad_weights)
         returns u = <m*eta_*'(alpha*m)>, dim = (nS x N)
         """
+        if moment_basis is None:
+            moment_basis = self.moment_basis
+            quad_weights = self.quad_weights
         # Check the predicted alphas for +/- infinity or nan - raise error if found
         checked_alpha = tf.debugging.check_numerics(alpha, message='input tensor checking error', name='checked')
         # Clip the predicted alphas below the tf.exp overflow threshold
         clipped_alpha = tf.clip_by_value(checked_alpha, clip_value_min=-50, clip_value_max=50, name='checkedandclipped')
 
         # Currently only for maxwell Boltzmann entropy
-        f_quad = tf.math.exp(tf.tensordot(clipped_alpha, self.moment_basis, axes=([1], [0])))  # exp(alpha*m)
-        tmp = tf.math.multiply(f_quad, self.quad_weights)  # f*w
-        u_rec = tf.tensordot(tmp, self.moment_basis[:, :], axes=([1], [1]))  # f * w * momentBasis
+        f_quad = tf.math.exp(tf.tensordot(clipped_alpha, moment_basis, axes=([1], [0])))  # exp(alpha*m)
+        tmp = tf.math.multiply(f_quad, quad_weights)  # f*w
+        u_rec = tf.tensordot(tmp, moment_basis[:, :], axes=([1], [1]))  # f * w * momentBasis
         alpha_regularization = tf.math.multiply(self.regularization_gamma_vector, alpha)
         return u_rec + alpha_regularization  # add regularization
 
@@ -236,7 +359,7 @@ class EntropyModel(tf.keras.Model, ABC):
         """
         return tf.math.multiply(u_orig, tf.reshape(scale_values, shape=(scale_values.shape[0], 1)))
 
-    def compute_h(self, u, alpha):
+    def compute_h(self, u, alpha, moment_basis=None, quad_weights=None):
         """
         brief: computes the entropy functional h on u and alpha with regularization in mind
 
@@ -246,16 +369,19 @@ class EntropyModel(tf.keras.Model, ABC):
 
         input: alpha, dims = (nS x N)
                u, dims = (nS x N)
-        used members: m    , dims = (N x nq)
-                    w    , dims = nq
+               m    , dims = (N x nq) (default: self.moment_basis)
+               w    , dims = nq (default: self.quad_weights)
 
         returns h = alpha*u - <eta_*(alpha*m)>
         """
+        if moment_basis is None:
+            moment_basis = self.moment_basis
+            quad_weights = self.quad_weights
         # Currently only for maxwell Boltzmann entropy
         f_quad = tf.math.exp(tf.tensordot(
-            alpha, self.moment_basis, axes=([1], [0])))  # exp(alpha*m)
+            alpha, moment_basis, axes=([1], [0])))  # exp(alpha*m)
         entropy_pt1 = tf.tensordot(
-            f_quad, self.quad_weights, axes=([1], [1]))  # f*w
+            f_quad, quad_weights, axes=([1], [1]))  # f*w
         entropy_pt2 = tf.math.reduce_sum(tf.math.multiply(
             alpha, u), axis=1, keepdims=True)  # alpha*u
         # 0.5*gamma*alpha_r*alpha_r
@@ -294,15 +420,22 @@ class SobolevModel(EntropyModel):
 
     def __init__(self, core_model: tf.keras.Model, polynomial_degree: int = 1, spatial_dimension: int = 1,
                  reconstruct_u: bool = False, scaler_min: float = 0.0, scaler_max: float = 1.0,
-                 scale_active: bool = True, gamma: float = 0.0, basis: str = "monomial", rotated=False, **opts):
+                 scale_active: bool = True, gamma: float = 0.0, basis: str = "monomial", rotated=False,
+                 reconstruction_dtype: str = "float64", coarse_quadrature_order: int = 0,
+                 gradient_layer: tf.keras.layers.Layer = None, **opts):
         super(SobolevModel, self).__init__(core_model=core_model, polynomial_degree=polynomial_degree,
                                            spatial_dimension=spatial_dimension, reconstruct_u=reconstruct_u,
                                            scaler_min=scaler_min, scaler_max=scaler_max, scale_active=scale_active,
-                                           subclass=True, gamma=gamma, basis=basis, rotated=rotated)
+                                           subclass=True, gamma=gamma, basis=basis, rotated=rotated,
+                                           reconstruction_dtype=reconstruction_dtype,
+                                           coarse_quadrature_order=coarse_quadrature_order)
         self.derivative_scale_factor = tf.constant(
-            scaler_max - scaler_min, dtype=tf.float64)
+            scaler_max - scaler_min, dtype=self.recons_dtype)
         print("Model output alpha and h will be scaled by factor " +
               str(self.derivative_scale_factor.numpy()))
+        # @brief: layer that returns [h, dh/dx] of the core model in one sweep for inference (e.g. IcnnGradientLayer,
+        #         uses a GradientTape in training). None = the derivative is computed with a GradientTape
+        self.gradient_layer = gradient_layer
 
     def call(self, x: Tensor, training=False, **kwargs) -> list:
         """
@@ -312,24 +445,30 @@ class SobolevModel(EntropyModel):
                 alpha = [alpha_1,...,alpha_N]
                 u = [u_1,u_2,...,u_N]
         """
-        with tf.GradientTape() as grad_tape:
-            grad_tape.watch(x)
-            h = self.core_model(x)
-
-        if self.rotated:
-            alpha = tf.concat([grad_tape.gradient(h, x), tf.math.scalar_mul(0.0, x)], axis=1)
+        if self.gradient_layer is not None:
+            [h, alpha] = self.gradient_layer(x, training=training)
+            # cast the outputs of (mixed precision) core models back to float32
+            h = tf.cast(h, dtype=tf.float32)
+            alpha = tf.cast(alpha, dtype=tf.float32)
         else:
+            with tf.GradientTape() as grad_tape:
+                grad_tape.watch(x)
+                # cast the output of (mixed precision) core models back to float32
+                h = tf.cast(self.core_model(x), dtype=tf.float32)
             alpha = grad_tape.gradient(h, x)
 
+        if self.rotated:
+            alpha = tf.concat([alpha, tf.math.scalar_mul(0.0, x)], axis=1)
+
         if self.enable_recons_u:
             if self.scale_active:
                 print("Scaled reconstruction of u enabled")
-                alpha64 = tf.math.scalar_mul(self.derivative_scale_factor, tf.cast(alpha, dtype=tf.float64, name=None))
+                alpha64 = tf.math.scalar_mul(self.derivative_scale_factor,
+                                             tf.cast(alpha, dtype=self.recons_dtype, name=None))
             else:
                 print("Reconstruction of u enabled")
-                alpha64 = tf.cast(alpha, dtype=tf.float64, name=None)
-            alpha_complete = self.reconstruct_alpha(alpha64)
-            u_complete = self.reconstruct_u(alpha_complete)
+                alpha64 = tf.cast(alpha, dtype=self.recons_dtype, name=None)
+            [alpha_complete, u_complete] = self.reconstruct(alpha64, training=training)
             if self.rotated:  # only viable for m1!
                 return [h, alpha[:, 0], u_complete[:, 1]]
             # cutoff the 0th order moment, since it is 1 by construction
@@ -340,6 +479,8 @@ class SobolevModel(EntropyModel):
         return [h, alpha, alpha]
 
     def call_derivative(self, x, training=False):
+        if self.gradient_layer is not None:
+            return self.gradient_layer(x, training=training)[1]
         with tf.GradientTape() as grad_tape:
             grad_tape.watch(x)
             y = self.core_model(x)
@@ -0,0 +1,154 @@
+"""
+brief: Frozen inference export of neural closures. The whole closure (normalization by u_0, core network, gradient,
+       alpha_0 reconstruction, rescaling and h) is compiled into one tf.function with the signature
+       closure(u: float64 (nS x N)) -> {"u", "alpha", "h"} and stored as SavedModel in <folder>/frozen_model.
+       The SavedModel is loaded with tf.saved_model.load only, i.e. without the code of src.networks (see FrozenClosure
+       in src/networks/frozenloader.py).
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from src.networks.basenetwork import BaseNetwork
+from src.networks.distillation import sample_alpha, compute_exact_labels
+from src.networks.entropymodels import SobolevModel, reconstruct_density
+from src.networks.frozenloader import FrozenClosure
+from src.networks.reports import relative_error, write_report
+
+
+class ClosureModule(tf.Module):
+    """
+    Inference graph of a neural closure. Reproduces call_scaled_64 of the closure:
+    SobolevModel cores (MK11-MK14) predict h and alpha is the gradient of the core network,
+    EntropyModel cores (MK15, MK16) predict alpha (scaled to [scaler_min, scaler_max], if scaling is active).
+    Normalization and the entropy reconstruction are computed in recons_dtype, the core network in float32.
+    """
+
+    def __init__(self, closure: BaseNetwork, jit_compile: bool = False):
+        """
+        input: closure = trained neural closure (created or loaded)
+               jit_compile = if true, the closure is compiled with XLA (one compilation per batch size, see
+                             FrozenClosure for the bucketing of batch sizes)
+        """
+        super(ClosureModule, self).__init__(name="frozen_closure")
+        entropy_model = closure.model
+        if entropy_model.rotated:
+            raise ValueError("Frozen export is not supported for rotated models")
+        self.core_model = entropy_model.core_model
+        self.sobolev = isinstance(entropy_model, SobolevModel)
+        self.gradient_layer = entropy_model.gradient_layer if self.sobolev else None
+        self.recons_dtype = entropy_model.recons_dtype
+        self.moment_basis = tf.constant(entropy_model.moment_basis)  # dims = (N x nq)
+        self.quad_weights = tf.constant(entropy_model.quad_weights)  # dims = (1 x nq)
+        self.regularization_gamma = tf.constant(entropy_model.regularization_gamma)
+        self.regularization_gamma_vector = tf.constant(entropy_model.regularization_gamma_vector)
+        # alpha = factor * (core output + 1) + scaler_min for scaled EntropyModel cores, identity otherwise
+        scaled = not self.sobolev and entropy_model.scale_active
+        self.alpha_factor = tf.constant(entropy_model.derivative_scale_factor if scaled else 1.0,
+                                        dtype=self.recons_dtype)
+        self.alpha_shift = tf.constant(
+            entropy_model.derivative_scale_factor + entropy_model.derivative_scaler_min if scaled else 0.0,
+            dtype=self.recons_dtype)
+        # meta data of the SavedModel (constants are not tracked)
+        self.input_dim = tf.Variable(entropy_model.input_dim, trainable=False, name="input_dim")
+        self.jit_compile = tf.Variable(jit_compile, trainable=False, name="jit_compile")
+        self.closure = tf.function(self.evaluate, jit_compile=jit_compile, input_signature=[
+            tf.TensorSpec(shape=[None, entropy_model.input_dim], dtype=tf.float64, name="u")])
+
+    def evaluate(self, u_non_normal):
+        """
+        brief: same as call_scaled_64 of the closure
+        input: u_non_normal = non normalized moments, dims = (nS x N)
+        returns: {"u": u, "alpha": alpha, "h": h}, dims = (nS x N), (nS x N), (nS x 1)
+        """
+        u_non_normal = tf.cast(u_non_normal, dtype=self.recons_dtype)
+        u_0 = u_non_normal[:, :1]
+        u_reduced = tf.cast(u_non_normal[:, 1:] / u_0, dtype=tf.float32)  # normalization, chop of u_0
+        if self.gradient_layer is not None:
+            alpha = self.gradient_layer(u_reduced)[1]
+        elif self.sobolev:
+            with tf.GradientTape() as grad_tape:
+                grad_tape.watch(u_reduced)
+                h_core = tf.cast(self.core_model(u_reduced), dtype=tf.float32)
+            alpha = grad_tape.gradient(h_core, u_reduced)
+        else:
+            alpha = self.core_model(u_reduced)
+        alpha = self.alpha_factor * tf.cast(alpha, dtype=self.recons_dtype) + self.alpha_shift
+        # alpha_0 and f = exp(alpha_complete * m) * w with one exp per sample
+        [alpha_complete, f_weighted] = reconstruct_density(alpha, self.moment_basis, self.quad_weights)
+        m_0 = self.moment_basis[0, 0]
+        u_complete = tf.matmul(f_weighted, self.moment_basis, transpose_b=True) + \
+                     self.regularization_gamma_vector * alpha_complete
+        # rescaling, h as compute_h on the rescaled alpha: <exp(alpha_rescaled * m)> = u_0^m_0 / m_0
+        u_rescaled = u_complete * u_0
+        alpha_rescaled = tf.concat([alpha_complete[:, :1] + tf.math.log(u_0), alpha], axis=1)
+        h = tf.math.reduce_sum(alpha_rescaled * u_rescaled, axis=1, keepdims=True) \
+            - tf.math.exp(m_0 * tf.math.log(u_0)) / m_0 \
+            - 0.5 * self.regularization_gamma * tf.math.reduce_sum(alpha * alpha, axis=1, keepdims=True)
+        return {"u": u_rescaled, "alpha": alpha_rescaled, "h": h}
+
+
+def export_frozen_closure(closure: BaseNetwork, jit_compile: bool = False, export_folder: str = None) -> str:
+    """
+    brief: exports the inference graph of a closure (see ClosureModule) as SavedModel with the serving signature
+           "closure"
+    input: closure = trained neural closure
+           jit_compile = compile the closure with XLA
+           export_folder = target folder (default: <closure folder>/frozen_model)
+    returns: the export folder
+    """
+    if export_folder is None:
+        export_folder = closure.folder_name + "/frozen_model"
+    module = ClosureModule(closure, jit_compile=jit_compile)
+    tf.saved_model.save(module, export_folder, signatures={"closure": module.closure})
+    print("Frozen closure saved to " + export_folder)
+    return export_folder
+
+
+def frozen_report(closure: BaseNetwork, export_folder: str, n_test: int = 10000, max_alpha_norm: float = 20,
+                  n_repeats: int = 20, seed: int = 1) -> dict:
+    """
+    brief: compares the frozen closure to call_scaled_64 of the closure (relative errors w.r.t. the whole test set),
+           measures the loading time of the SavedModel and the latency per call of both variants.
+           The test set are realizable moments with random u_0 in [0.1,10], sampled via their Lagrange multipliers.
+           Results are written to export_folder/frozen_report.csv
+    input: closure = exported closure
+           export_folder = folder of the frozen closure
+           n_test = number of test moments
+           max_alpha_norm = radius of the sampling ball of alpha
+           n_repeats = number of timed calls
+           seed = seed of the test set
+    returns: dict with errors and timings
+    """
+    rng = np.random.default_rng(seed)
+    alpha = sample_alpha(n_test, closure.model.input_dim - 1, max_alpha_norm, rng=rng)
+    [u_normalized, _, _] = compute_exact_labels(closure.model, alpha)
+    u_test = u_normalized * rng.uniform(low=0.1, high=10.0, size=(n_test, 1))
+
+    def latency(function):
+        function(u_test)  # warm up
+        start = time.perf_counter()
+        for i in range(n_repeats):
+            function(u_test)
+        return (time.perf_counter() - start) / n_repeats
+
+    start = time.perf_counter()
+    frozen = FrozenClosure(export_folder)
+    [u_frozen, alpha_frozen, h_frozen] = frozen.call_scaled_64(u_test)
+    cold_start = time.perf_counter() - start
+    [u_ref, alpha_ref, h_ref] = [r.numpy() for r in closure.call_scaled_64(u_test)]
+    report = {
+        "n_test": n_test,
+        "rel_err_u": relative_error(u_ref, u_frozen),
+        "rel_err_alpha": relative_error(alpha_ref, alpha_frozen),
+        "rel_err_h": relative_error(h_ref, h_frozen),
+        "cold_start_frozen": cold_start,
+        "latency_call_scaled_64": latency(closure.call_scaled_64),
+        "latency_frozen": latency(frozen.call_scaled_64),
+    }
+    return write_report(report, "Frozen closure report (reference: call_scaled_64):",
+                        export_folder + "/frozen_report.csv")
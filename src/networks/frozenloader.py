@@ -0,0 +1,59 @@
+"""
+brief: Loader of frozen closures (SavedModels written by export_frozen_closure in src/networks/frozenclosure.py).
+       Only imports tensorflow and numpy, s.t. external codes can copy this file without the rest of src.networks.
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+from os import path
+
+import numpy as np
+import tensorflow as tf
+
+
+class FrozenClosure:
+    """
+    Loader of an exported frozen closure.
+    Batch sizes are padded to the next power of two (bucketing), s.t. XLA compiled closures are compiled only for
+    few batch sizes while the number of cells of the solver changes.
+    """
+    input_dim: int  # size of the moment basis N
+    bucketing: bool  # pad batches to the next power of two
+    min_bucket: int  # smallest padded batch size
+
+    def __init__(self, export_folder: str, bucketing: bool = None, min_bucket: int = 64):
+        """
+        input: export_folder = folder of the SavedModel (written by export_frozen_closure)
+               bucketing = pad batch sizes to powers of two (default: only for XLA compiled closures)
+               min_bucket = smallest padded batch size
+        """
+        if not path.exists(export_folder):
+            print("Frozen closure does not exist at this path: " + export_folder)
+            exit(1)
+        self.module = tf.saved_model.load(export_folder)
+        self.input_dim = int(self.module.input_dim.numpy())
+        self.bucketing = bool(self.module.jit_compile.numpy()) if bucketing is None else bucketing
+        self.min_bucket = min_bucket
+
+    def get_bucket_size(self, n_cells: int) -> int:
+        """
+        returns: padded batch size for n_cells cells
+        """
+        if not self.bucketing:
+            return n_cells
+        return max(self.min_bucket, 1 << int(np.ceil(np.log2(max(n_cells, 1)))))
+
+    def call_scaled_64(self, u_non_normal: np.ndarray) -> list:
+        """
+        brief: same interface as call_scaled_64 of the closures
+        input: u_non_normal = non normalized moments, dims = (nS x N)
+        returns: [u, alpha, h] as numpy arrays, dims = (nS x N), (nS x N), (nS x 1)
+        """
+        u_non_normal = np.asarray(u_non_normal, dtype=np.float64)
+        n_cells = u_non_normal.shape[0]
+        n_padded = self.get_bucket_size(n_cells)
+        if n_padded > n_cells:
+            # pad with copies of the first cell (a realizable moment)
+            u_non_normal = np.concatenate([u_non_normal, np.repeat(u_non_normal[:1], n_padded - n_cells, axis=0)])
+        result = self.module.closure(tf.constant(u_non_normal))
+        return [result["u"].numpy()[:n_cells], result["alpha"].numpy()[:n_cells], result["h"].numpy()[:n_cells]]
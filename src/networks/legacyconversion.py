@@ -0,0 +1,106 @@
+"""
+brief: Conversion of legacy closure models (SavedModels written with tf 2.2, loaded with tf.keras.models.load_model in
+       the legacy_mode paths of the solvers) to closure artifacts of the current MK11 architecture
+       (see src/networks/registry.py).
+       The weights of the legacy model are copied into a new MK11 closure, the equivalence of h and alpha is checked
+       on sampled moments and the closure is saved as <folder>/closure_artifact.npz.
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+import numpy as np
+import tensorflow as tf
+
+from src.networks.basenetwork import BaseNetwork
+from src.networks.configmodel import init_neural_closure
+from src.networks.distillation import sample_alpha, compute_exact_labels
+from src.networks.registry import export_artifact
+
+# legacy models of the solvers and synthetic tests (folder relative to models/) and their MK11 architecture
+legacy_models: dict = {
+    "_simulation/mk11_M1_1D": dict(poly_degree=1, spatial_dim=1, nw_width=10, nw_depth=7),
+    "_simulation/mk11_M1_1D_normal": dict(poly_degree=1, spatial_dim=1, nw_width=10, nw_depth=7),
+    "_simulation/mk11_M1_1D_alpha": dict(poly_degree=1, spatial_dim=1, nw_width=10, nw_depth=7),
+    "_simulation/mk11_M2_1D": dict(poly_degree=2, spatial_dim=1, nw_width=15, nw_depth=7),
+    "_simulation/mk11_M1_2D": dict(poly_degree=1, spatial_dim=2, nw_width=18, nw_depth=8),
+}
+
+
+def short_name(variable_name: str) -> str:
+    """
+    returns: <layer name>/<weight name> of a variable name, e.g. layer_0nn_component/kernel
+    """
+    parts = variable_name.split(":")[0].split("/")
+    return "/".join(parts[-2:])
+
+
+def match_legacy_weights(target_variables: list, legacy_variables: list) -> list:
+    """
+    brief: assigns a legacy variable to each variable of the target model. Variables are matched by their layer and
+           weight name, else by their order among the remaining variables of the same shape.
+    input: target_variables = variables of the core network of the new closure
+           legacy_variables = variables of the legacy model
+    returns: list of numpy arrays in the order of target_variables
+    """
+    remaining = [v for v in legacy_variables if v.trainable]
+    by_name = {short_name(v.name): v for v in remaining}
+    matched = []
+    for target in target_variables:
+        source = by_name.get(short_name(target.name))
+        if source is None or tuple(source.shape) != tuple(target.shape):
+            candidates = [v for v in remaining if tuple(v.shape) == tuple(target.shape)]
+            if not candidates:
+                raise ValueError("Variable " + target.name + " with shape " + str(tuple(target.shape)) +
+                                 " has no counterpart in the legacy model")
+            source = candidates[0]
+        remaining = [v for v in remaining if v is not source]
+        by_name = {short_name(v.name): v for v in remaining}
+        matched.append(source.numpy())
+    if remaining:
+        raise ValueError("Legacy variables are not used: " + str([v.name for v in remaining]))
+    return matched
+
+
+def convert_legacy_model(folder_name: str, poly_degree: int, spatial_dim: int, nw_width: int, nw_depth: int,
+                         n_samples: int = 10000, max_alpha_norm: float = 10.0, tolerance: float = 1e-5,
+                         seed: int = 1) -> BaseNetwork:
+    """
+    brief: converts the legacy SavedModel in models/<folder_name>/best_model to an MK11 closure and writes its artifact.
+           The legacy model has the outputs [h, alpha] or [h, alpha, u] of normalized moments u_1,...,u_N.
+           Both output variants of MK11 (with and without relu output) are tried, the artifact is only written if the
+           maximal relative errors of h and alpha on the sampled moments are below tolerance.
+    input: folder_name = model folder (relative to models/)
+           poly_degree, spatial_dim, nw_width, nw_depth = MK11 architecture of the legacy model
+           n_samples = number of sampled moments of the equivalence check
+           max_alpha_norm = radius of the sampling ball of the Lagrange multipliers
+           tolerance = maximal relative error of h and alpha
+           seed = seed of the sampled moments
+    returns: the converted closure
+    """
+    legacy_model = tf.keras.models.load_model("models/" + folder_name + "/best_model", compile=False)
+    rng = np.random.default_rng(seed)
+    errors = {}
+    for scale_active in (False, True):
+        closure = init_neural_closure(network_mk=11, poly_degree=poly_degree, spatial_dim=spatial_dim,
+                                      folder_name=folder_name, loss_combination=2, nw_width=nw_width,
+                                      nw_depth=nw_depth, normalized=True, input_decorrelation=False,
+                                      scale_active=scale_active)
+        closure.create_model()
+        core_model = closure.model.core_model
+        core_model.set_weights(match_legacy_weights(core_model.weights, legacy_model.variables))
+
+        alpha = sample_alpha(n_samples, closure.model.input_dim - 1, max_alpha_norm, rng=rng)
+        [u_normalized, _, _] = compute_exact_labels(closure.model, alpha)
+        u_reduced = tf.constant(u_normalized[:, 1:], dtype=tf.float32)
+        [h_legacy, alpha_legacy] = [r.numpy() for r in legacy_model(u_reduced)[:2]]
+        [h_new, alpha_new] = [r.numpy() for r in closure.model(u_reduced)[:2]]
+        errors[scale_active] = max(
+            float(np.max(np.abs(h_legacy - h_new)) / np.max(np.abs(h_legacy))),
+            float(np.max(np.abs(alpha_legacy - alpha_new)) / np.max(np.abs(alpha_legacy))))
+        if errors[scale_active] <= tolerance:
+            print("Legacy model " + folder_name + " converted. Maximal relative error of h and alpha: " + str(
+                errors[scale_active]))
+            export_artifact(closure)
+            return closure
+    raise ValueError("Converted model " + folder_name + " does not reproduce the legacy model. Maximal relative "
+                     "errors (without, with relu output): " + str(errors[False]) + ", " + str(errors[True]))
@@ -9,7 +9,7 @@ import tensorflow as tf
 from tensorflow import keras as keras
 from tensorflow.keras import layers
 
-from src.networks.basenetwork import BaseNetwork
+from src.networks.basenetwork import BaseNetwork, precision_scoped
 from src.networks.customlayers import MeanShiftLayer, DecorrelationLayer
 from src.networks.entropymodels import SobolevModel
 
@@ -30,6 +30,7 @@ class MK12Network(BaseNetwork):
                                           input_decorrelation=input_decorrelation, scale_active=scale_active,
                                           gamma_lvl=gamma_lvl, basis=basis, rotated=rotated)
 
+    @precision_scoped
     def create_model(self) -> bool:
 
         # Weight initializer
@@ -86,7 +87,8 @@ class MK12Network(BaseNetwork):
                              reconstruct_u=bool(self.loss_weights[2]), scaler_max=self.scaler_max,
                              scaler_min=self.scaler_min, scale_active=self.scale_active,
                              gamma=self.regularization_gamma, name="sobolev_resnet_wrapper", basis=self.basis,
-                             rotated=self.rotated)
+                             rotated=self.rotated, reconstruction_dtype=self.reconstruction_dtype,
+                             coarse_quadrature_order=self.coarse_quadrature_order)
 
         # build graph
         batch_size: int = 3  # dummy entry
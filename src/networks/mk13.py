@@ -12,8 +12,8 @@ from tensorflow import keras as keras
 from tensorflow.keras import layers
 from tensorflow.keras.constraints import NonNeg
 
-from src.networks.basenetwork import BaseNetwork
-from src.networks.customlayers import MeanShiftLayer, DecorrelationLayer
+from src.networks.basenetwork import BaseNetwork, precision_scoped
+from src.networks.customlayers import MeanShiftLayer, DecorrelationLayer, IcnnGradientLayer
 from src.networks.entropymodels import SobolevModel
 
 
@@ -38,6 +38,7 @@ class MK13Network(BaseNetwork):
                                           input_decorrelation=input_decorrelation, scale_active=scale_active,
                                           gamma_lvl=gamma_lvl, basis=basis, rotated=rotated)
 
+    @precision_scoped
     def create_model(self) -> bool:
 
         initializer = tf.keras.initializers.RandomUniform(minval=-0.5, maxval=0.5, seed=None)
@@ -124,7 +125,10 @@ class MK13Network(BaseNetwork):
                              reconstruct_u=bool(self.loss_weights[2]), scaler_max=self.scaler_max,
                              scaler_min=self.scaler_min, scale_active=self.scale_active,
                              gamma=self.regularization_gamma, name="sobolev_resnet_icnn_wrapper", basis=self.basis,
-                             rotated=self.rotated)
+                             rotated=self.rotated, reconstruction_dtype=self.reconstruction_dtype,
+                             coarse_quadrature_order=self.coarse_quadrature_order,
+                             gradient_layer=IcnnGradientLayer(core_model, depth=self.model_depth, residual=True,
+                                                              relu_output=self.scale_active))
         # build graph
         batch_size: int = 3  # dummy entry
         model.build(input_shape=(batch_size, self.input_dim))
@@ -233,7 +237,7 @@ class MK13Network(BaseNetwork):
         #
         #
         u_reduced = u_downscaled[:, 1:]  # chop of u_0
-        u_0 = tf.cast(u_non_normal[:, 0], dtype=tf.float64, name=None)
+        u_0 = tf.cast(u_non_normal[:, 0], dtype=self.model.recons_dtype, name=None)
         if legacy_mode:
             if self.poly_degree > 1:
                 [h_predicted, alpha_predicted, u_predicted] = self.model_legacy(u_reduced)
@@ -243,12 +247,6 @@ class MK13Network(BaseNetwork):
             [h_predicted, alpha_predicted, u_predicted] = self.model(u_reduced)
 
         ### cast to fp64 ###
-        alpha64 = tf.cast(alpha_predicted, dtype=tf.float64, name=None)
-        alpha_complete = self.model.reconstruct_alpha(alpha64)
-        u_complete = self.model.reconstruct_u(alpha_complete)
-        u_rescaled = self.model.scale_u(u_complete, u_0)  # upscaling
-        alpha_rescaled = self.model.scale_alpha(alpha_complete, u_0)
-        h = self.model.compute_h(u_rescaled, alpha_rescaled)
-        # u_non_2 = self.model.reconstruct_u(alpha_rescaled)
-
-        return [u_rescaled, alpha_rescaled, h]
+        alpha64 = tf.cast(alpha_predicted, dtype=self.model.recons_dtype, name=None)
+        # reconstruction and upscaling with one evaluation of the kinetic density
+        return self.model.reconstruct_scaled(alpha64, u_0)
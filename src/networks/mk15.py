@@ -9,16 +9,13 @@ Version: 0.0
 Date 13.08.2021
 '''
 
-import csv
-from os import path
-
 import numpy as np
 import tensorflow as tf
 from sklearn.preprocessing import MinMaxScaler
 from tensorflow import keras as keras
 from tensorflow.keras import layers
 
-from src.networks.basenetwork import BaseNetwork
+from src.networks.basenetwork import BaseNetwork, precision_scoped
 from src.networks.customlayers import MeanShiftLayer, DecorrelationLayer
 from src.networks.customlosses import MonotonicFunctionLoss
 from src.networks.entropymodels import EntropyModel
@@ -39,6 +36,7 @@ class MK15Network(BaseNetwork):
                                           input_decorrelation=input_decorrelation, scale_active=scale_active,
                                           gamma_lvl=gamma_lvl, basis=basis)
 
+    @precision_scoped
     def create_model(self) -> bool:
 
         # Weight initializer
@@ -99,7 +97,9 @@ class MK15Network(BaseNetwork):
         model = EntropyModel(core_model, polynomial_degree=self.poly_degree, spatial_dimension=self.spatial_dim,
                              reconstruct_u=bool(self.loss_weights[2]), scaler_max=self.scaler_max,
                              scaler_min=self.scaler_min, scale_active=self.scale_active, name="entropy_wrapper",
-                             gamma=self.regularization_gamma, basis=self.basis, rotated=self.rotated)
+                             gamma=self.regularization_gamma, basis=self.basis, rotated=self.rotated,
+                             reconstruction_dtype=self.reconstruction_dtype,
+                             coarse_quadrature_order=self.coarse_quadrature_order)
 
         batch_size = 3  # dummy entry
         model.build(input_shape=(batch_size, self.input_dim))
@@ -143,6 +143,14 @@ class MK15Network(BaseNetwork):
 
         return self.history
 
+    def get_training_targets(self) -> tuple:
+        x_data = self.training_data[0]
+        y_data = [tf.constant(self.training_data[1], dtype=tf.float32),
+                  tf.constant(self.training_data[0], dtype=tf.float32),
+                  tf.constant(self.training_data[0], dtype=tf.float64),
+                  tf.constant(self.training_data[2], dtype=tf.float64)]
+        return x_data, y_data
+
     def select_training_data(self):
         return [True, True, True]
 
@@ -192,7 +200,8 @@ class MK15Network(BaseNetwork):
         """
         u_reduced = u_complete[:, 1:]  # chop of u_0
         [alpha_predicted, mono_loss, u_predicted, h_prediced] = self.model(u_reduced)
-        alpha_complete_predicted = self.model.reconstruct_alpha(tf.cast(alpha_predicted, dtype=tf.float64))
+        alpha_complete_predicted = self.model.reconstruct_alpha(
+            tf.cast(alpha_predicted, dtype=self.model.recons_dtype))
         u_complete_reconstructed = self.model.reconstruct_u(alpha_complete_predicted)
 
         return [u_complete_reconstructed, alpha_complete_predicted, h_prediced]
@@ -214,34 +223,3 @@ class MK15Network(BaseNetwork):
         """
         u_non_normal = tf.constant(u_non_normal, dtype=tf.float64)
         return self.model.call_scaled(u_non_normal)
-
-    def load_model(self, file_name=None):
-        used_file_name = self.folder_name
-        if file_name != None:
-            used_file_name = file_name
-
-        # read scaling data
-        scaling_file_name = used_file_name + '/scaling_data/min_max_scaler.csv'
-        if not path.exists(scaling_file_name):
-            print("Scaling Data is missing. Expected in: " + scaling_file_name)
-            exit(1)
-        with open(scaling_file_name) as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            for row in csv_reader:
-                scaling_data = row
-        self.scaler_min = float(scaling_data[0])
-        self.scaler_max = float(scaling_data[1])
-        self.create_model()
-        used_file_name = used_file_name + '/best_model/'
-
-        if path.exists(used_file_name) == False:
-            print("Model does not exists at this path: " + used_file_name)
-            exit(1)
-        # load model and weights
-        model = tf.keras.models.load_model(used_file_name, custom_objects={"CustomModel": self.model,
-                                                                           "MonotonicFunctionLoss": MonotonicFunctionLoss})
-        # extract weights and save them to .h5
-        model.save_weights(used_file_name + "model_weights/weights")
-        self.model.load_weights(used_file_name + "model_weights/weights")
-        print("Model loaded from file ")
-        return 0
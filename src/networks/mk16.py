@@ -25,7 +25,7 @@ import pandas as pd
 from os import path
 from sklearn.preprocessing import MinMaxScaler
 
-from src.networks.basenetwork import BaseNetwork
+from src.networks.basenetwork import BaseNetwork, precision_scoped
 from src.networks.entropyautoencoder import EntropyAutoEncoder
 
 
@@ -51,6 +51,7 @@ class MK16Network(BaseNetwork):
         # hacked in
         self.input_dim += 1
 
+    @precision_scoped
     def create_model(self) -> bool:
         model = EntropyAutoEncoder(polynomial_degree=self.poly_degree, spatial_dimension=self.spatial_dim,
                                    model_depth=self.model_depth, model_width=self.model_width)
@@ -0,0 +1,298 @@
+"""
+brief: TensorFlow free inference of trained closures (MK11, MK13, MK15). The weights of the core network, the output
+       scaling and the moment basis/quadrature are exported to one .npz file, which is evaluated with NumPy only.
+       ICNN closures (MK11, MK13) compute alpha with an explicit backward pass through the network.
+       At export, the affine inference ops are folded into the adjacent dense layers (see fold_affine_ops). Only the
+       NumPy engine uses folded weights, the frozen and the reduced precision export keep the keras layers.
+       This module must not import tensorflow (directly or via other modules of this package).
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+import time
+
+import numpy as np
+
+from src.networks.reports import relative_error, write_report
+
+# core model names of the supported closures -> architecture of the numpy engine
+numpy_architectures: dict = {"Icnn_closure": "icnn", "ResNetIcnn_closure": "resnet_icnn", "Direct_ResNet": "resnet"}
+
+# constants of the selu activation (as in tf.keras.activations.selu)
+selu_alpha: float = 1.6732632423543772848170429916717
+selu_scale: float = 1.0507009873554804934193349852946
+
+
+def fold_affine_ops(weights: dict, architecture: str, depth: int) -> dict:
+    """
+    brief: folds the affine inference ops into the adjacent dense layers:
+           - mean shift and decorrelation: (x - mu) D K + b = x (D K) + (b - mu D K) for all kernels that act on the
+             network input, i.e. the input layer and (ICNN) the dense components of all convex layers. The
+             non-negative kernels of the convex path are not changed, so the folded ICNN is convex in x.
+           - (MK15) the second batch normalization of each residual block, which follows the first dense layer of
+             the block: bn(x K + b) = x (K s) + (b s + t). The first batch normalization of a block acts on the
+             residual stream (also used by the skip connection) and stays a separate scale and shift.
+    input: weights = exported weights (see export_numpy_closure), modified in place
+           architecture = "icnn", "resnet_icnn" or "resnet"
+           depth = number of convex layers or residual blocks
+    returns: the folded weights
+    """
+    if "mean_shift" in weights:
+        mean_shift = weights.pop("mean_shift").astype(np.float64)
+        decorrelation = weights.pop("decorrelation").astype(np.float64)
+        kernels = [("input_kernel", "input_bias")]
+        if architecture != "resnet":
+            kernels += [("dense_kernel_" + str(idx), "nn_bias_" + str(idx)) for idx in range(depth + 1)]
+        for kernel_name, bias_name in kernels:
+            kernel = decorrelation @ weights[kernel_name].astype(np.float64)
+            weights[kernel_name] = kernel
+            weights[bias_name] = weights[bias_name].astype(np.float64) - mean_shift @ kernel
+    if architecture == "resnet":
+        for idx in range(depth):
+            block = "block_" + str(idx)
+            scale = weights.pop(block + "_bn_scale_1")
+            shift = weights.pop(block + "_bn_shift_1")
+            weights[block + "_kernel_0"] = weights[block + "_kernel_0"].astype(np.float64) * scale
+            weights[block + "_bias_0"] = weights[block + "_bias_0"].astype(np.float64) * scale + shift
+    return weights
+
+
+def export_numpy_closure(closure, file_name: str = None, fold: bool = True) -> str:
+    """
+    brief: writes the weights of a trained MK11, MK13 or MK15 closure, its output scaling and the moment basis and
+           quadrature of its entropy model to an .npz file (see NumpyClosure)
+    input: closure = trained neural closure (BaseNetwork)
+           file_name = target file (default: <closure folder>/numpy_closure.npz)
+           fold = fold the mean shift, the decorrelation and batch normalizations into the dense layers
+    returns: the file name
+    """
+    core_model = closure.model.core_model
+    if core_model.name not in numpy_architectures:
+        raise ValueError("NumPy export is only supported for MK11, MK13 and MK15 (core model >" + core_model.name + "<)")
+    if closure.model.rotated:
+        raise ValueError("NumPy export is not supported for rotated models")
+    architecture = numpy_architectures[core_model.name]
+    # the custom layers do not keep their names, so they are found by type
+    layer_types = {type(layer).__name__: layer for layer in core_model.layers}
+    if architecture != "resnet" and "BatchNormalization" in layer_types:
+        raise ValueError("NumPy export is not supported for MK14 (normalized convex layers)")
+    if file_name is None:
+        file_name = closure.folder_name + "/numpy_closure.npz"
+    weights = {
+        "architecture": np.array(architecture),
+        "depth": np.array(closure.model_depth),
+        "scale_active": np.array(bool(closure.scale_active)),
+        "scaler_min": np.array(closure.scaler_min, dtype=np.float64),
+        "scaler_max": np.array(closure.scaler_max, dtype=np.float64),
+        "gamma": np.array(closure.model.regularization_gamma.numpy(), dtype=np.float64),
+        "moment_basis": closure.model.moment_basis.numpy().astype(np.float64),
+        "quad_weights": closure.model.quad_weights.numpy().astype(np.float64),
+    }
+    if "MeanShiftLayer" in layer_types:
+        weights["mean_shift"] = layer_types["MeanShiftLayer"].get_weights()[0]
+        weights["decorrelation"] = layer_types["DecorrelationLayer"].get_weights()[0]
+    if architecture == "resnet":
+        [weights["input_kernel"], weights["input_bias"]] = core_model.get_layer("layer_input").get_weights()
+        [weights["output_kernel"], weights["output_bias"]] = core_model.get_layer("layer_output").get_weights()
+        # batch normalizations are unnamed, two per residual block in the order of creation
+        batch_norms = [layer for layer in core_model.layers if type(layer).__name__ == "BatchNormalization"]
+        for idx in range(closure.model_depth):
+            for j in range(2):
+                block = "block_" + str(idx)
+                [weights[block + "_kernel_" + str(j)], weights[block + "_bias_" + str(j)]] = core_model.get_layer(
+                    block + "_layer_" + str(j)).get_weights()
+                batch_norm = batch_norms[2 * idx + j]
+                [gamma, beta, moving_mean, moving_variance] = batch_norm.get_weights()
+                # inference mode: bn(x) = x * scale + shift
+                scale = gamma / np.sqrt(moving_variance + batch_norm.epsilon)
+                weights[block + "_bn_scale_" + str(j)] = scale.astype(np.float64)
+                weights[block + "_bn_shift_" + str(j)] = (beta - moving_mean * scale).astype(np.float64)
+    else:
+        [weights["input_kernel"], weights["input_bias"]] = core_model.get_layer("layer_-1_input").get_weights()
+        # convex layers 0,...,depth-1 and the output layer (index depth)
+        layer_indices = list(range(closure.model_depth)) + [closure.model_depth + 2]
+        for idx, layer_idx in enumerate(layer_indices):
+            [weights["nn_kernel_" + str(idx)], weights["nn_bias_" + str(idx)]] = core_model.get_layer(
+                "layer_" + str(layer_idx) + "nn_component").get_weights()
+            [weights["dense_kernel_" + str(idx)]] = core_model.get_layer(
+                "layer_" + str(layer_idx) + "dense_component").get_weights()
+    if fold:
+        fold_affine_ops(weights, architecture, closure.model_depth)
+    np.savez(file_name, **weights)
+    print("NumPy closure saved to " + file_name)
+    return file_name
+
+
+class NumpyClosure:
+    """
+    NumPy evaluator of an exported closure (export_numpy_closure). Same interface as call_scaled_64 of the closures,
+    but returns numpy arrays. All computations are done in float64.
+    """
+    architecture: str  # "icnn" (MK11), "resnet_icnn" (MK13) or "resnet" (MK15)
+    depth: int  # number of convex layers or residual blocks
+    input_dim: int  # size of the moment basis N
+    weights: dict  # name -> weight array
+
+    def __init__(self, file_name: str):
+        """
+        input: file_name = .npz file written by export_numpy_closure
+        """
+        with np.load(file_name) as data:
+            self.weights = {key: data[key].astype(np.float64) for key in data.files if key != "architecture"}
+            self.architecture = str(data["architecture"])
+        self.depth = int(self.weights["depth"])
+        self.scale_active = bool(self.weights["scale_active"])
+        self.moment_basis = self.weights["moment_basis"]  # dims = (N x nq)
+        self.quad_weights = self.weights["quad_weights"]  # dims = (1 x nq)
+        self.gamma = float(self.weights["gamma"])
+        self.input_dim = self.moment_basis.shape[0]
+        self.decorrelation = "mean_shift" in self.weights
+
+    def preprocess(self, x: np.ndarray) -> np.ndarray:
+        """
+        brief: mean shift and decorrelation of the network input (if the model uses them)
+        """
+        if self.decorrelation:
+            return (x - self.weights["mean_shift"]) @ self.weights["decorrelation"]
+        return x
+
+    def call_icnn(self, x: np.ndarray) -> list:
+        """
+        brief: forward pass of the ICNN and explicit backward pass for the gradient w.r.t. the network input
+        input: x = normalized moments without u_0, dims = (nS x N-1)
+        returns: [h, dh/dx], dims = (nS x 1), (nS x N-1)
+        """
+        w = self.weights
+        x_pre = self.preprocess(x)
+        # forward pass, keep elu'(a) = 1 (a > 0) or exp(a) (a <= 0) of each layer
+        a = x_pre @ w["input_kernel"] + w["input_bias"]
+        z = np.where(a > 0, a, np.expm1(np.minimum(a, 0.0)))
+        elu_derivatives = [np.where(a > 0, 1.0, z + 1.0)]
+        for idx in range(self.depth):
+            a = z @ w["nn_kernel_" + str(idx)] + w["nn_bias_" + str(idx)] + x_pre @ w["dense_kernel_" + str(idx)]
+            activation = np.where(a > 0, a, np.expm1(np.minimum(a, 0.0)))
+            elu_derivatives.append(np.where(a > 0, 1.0, activation + 1.0))
+            z = activation + z if self.architecture == "resnet_icnn" else activation
+        out = z @ w["nn_kernel_" + str(self.depth)] + w["nn_bias_" + str(self.depth)] + x_pre @ w[
+            "dense_kernel_" + str(self.depth)]
+        grad_out = np.ones_like(out)
+        if self.scale_active:  # relu output
+            grad_out = (out > 0).astype(np.float64)
+            out = np.maximum(out, 0.0)
+        # backward pass
+        grad_z = grad_out @ w["nn_kernel_" + str(self.depth)].T
+        grad_x = grad_out @ w["dense_kernel_" + str(self.depth)].T
+        for idx in reversed(range(self.depth)):
+            grad_a = grad_z * elu_derivatives[idx + 1]
+            grad_x += grad_a @ w["dense_kernel_" + str(idx)].T
+            grad_z_prev = grad_a @ w["nn_kernel_" + str(idx)].T
+            grad_z = grad_z_prev + grad_z if self.architecture == "resnet_icnn" else grad_z_prev
+        grad_x += (grad_z * elu_derivatives[0]) @ w["input_kernel"].T
+        if self.decorrelation:
+            grad_x = grad_x @ w["decorrelation"].T
+        return [out, grad_x]
+
+    def call_resnet(self, x: np.ndarray) -> np.ndarray:
+        """
+        brief: forward pass of the residual network (MK15) in inference mode
+        input: x = normalized moments without u_0, dims = (nS x N-1)
+        returns: core network output, dims = (nS x N-1)
+        """
+        w = self.weights
+
+        def selu(y):
+            return selu_scale * np.where(y > 0, y, selu_alpha * np.expm1(np.minimum(y, 0.0)))
+
+        hidden = self.preprocess(x) @ w["input_kernel"] + w["input_bias"]
+        for idx in range(self.depth):
+            block = "block_" + str(idx)
+            y = hidden
+            for j in range(2):
+                if block + "_bn_scale_" + str(j) in w:  # not folded into the previous dense layer
+                    y = y * w[block + "_bn_scale_" + str(j)] + w[block + "_bn_shift_" + str(j)]
+                y = selu(y) @ w[block + "_kernel_" + str(j)] + w[block + "_bias_" + str(j)]
+            hidden = hidden + y
+        return hidden @ w["output_kernel"] + w["output_bias"]
+
+    def call_alpha(self, u_reduced: np.ndarray) -> np.ndarray:
+        """
+        brief: Lagrange multipliers alpha_1,...,alpha_N of normalized moments, as in call_scaled_64 of the closure
+        input: u_reduced = normalized moments without u_0, dims = (nS x N-1)
+        returns: alpha, dims = (nS x N-1)
+        """
+        if self.architecture == "resnet":
+            alpha = self.call_resnet(u_reduced)
+            if self.scale_active:
+                # scale to [scaler_min, scaler_max]
+                factor = (self.weights["scaler_max"] - self.weights["scaler_min"]) * 0.5
+                alpha = factor * (alpha + 1.0) + self.weights["scaler_min"]
+            return alpha
+        return self.call_icnn(u_reduced)[1]
+
+    def call_scaled_64(self, u_non_normal: np.ndarray) -> list:
+        """
+        brief: calls the closure with non normalized moments (normalization, core network, reconstruction of
+               alpha_0, u and h, rescaling)
+        input: u_non_normal = non normalized moments, dims = (nS x N)
+        returns: [u, alpha, h], dims = (nS x N), (nS x N), (nS x 1)
+        """
+        u_non_normal = np.asarray(u_non_normal, dtype=np.float64)
+        u_0 = u_non_normal[:, :1]
+        alpha = np.clip(self.call_alpha(u_non_normal[:, 1:] / u_0), -50, 50)
+        # alpha_0 = - ln(<exp(alpha*m)>), the basis function m_0 is constant
+        m_0 = self.moment_basis[0, 0]
+        f_reduced = np.exp(alpha @ self.moment_basis[1:, :])  # dims = (nS x nq)
+        integral = f_reduced @ self.quad_weights.T  # dims = (nS x 1)
+        alpha_0 = - (np.log(m_0) + np.log(integral)) / m_0
+        alpha_complete = np.concatenate([alpha_0, alpha], axis=1)
+        f_weighted = f_reduced * self.quad_weights / (m_0 * integral)  # exp(alpha_complete*m) * w
+        gamma_vector = np.full(shape=(1, self.input_dim), fill_value=self.gamma)
+        gamma_vector[0, 0] = 0.0
+        u_complete = f_weighted @ self.moment_basis.T + gamma_vector * alpha_complete
+        # rescaling, h as compute_h on the rescaled alpha: <exp(alpha_rescaled * m)> = u_0^m_0 <f>
+        u_rescaled = u_complete * u_0
+        alpha_rescaled = np.concatenate([alpha_0 + np.log(u_0), alpha], axis=1)
+        h = np.sum(alpha_rescaled * u_rescaled, axis=1, keepdims=True) \
+            - u_0 ** m_0 * np.sum(f_weighted, axis=1, keepdims=True) \
+            - 0.5 * self.gamma * np.sum(alpha * alpha, axis=1, keepdims=True)
+        return [u_rescaled, alpha_rescaled, h]
+
+
+def numpy_report(closure, file_name: str, u_test: np.ndarray, batch_sizes: tuple = (1, 100, 10000),
+                 n_repeats: int = 20) -> dict:
+    """
+    brief: compares the NumPy closure to call_scaled_64 of the closure (relative errors w.r.t. the whole test set) and
+           measures the loading time and the latency per call of both variants for several batch sizes.
+           Results are written next to file_name (<file_name without .npz>_report.csv)
+    input: closure = exported closure
+           file_name = .npz file of the NumPy closure
+           u_test = non normalized moments, dims = (nS x N)
+           batch_sizes = batch sizes of the latency measurement
+           n_repeats = number of timed calls per batch size
+    returns: dict with errors and timings
+    """
+    def latency(function, u):
+        function(u)  # warm up
+        start = time.perf_counter()
+        for i in range(n_repeats):
+            function(u)
+        return (time.perf_counter() - start) / n_repeats
+
+    start = time.perf_counter()
+    numpy_closure = NumpyClosure(file_name)
+    load_time = time.perf_counter() - start
+    [u_np, alpha_np, h_np] = numpy_closure.call_scaled_64(u_test)
+    [u_ref, alpha_ref, h_ref] = [r.numpy() for r in closure.call_scaled_64(u_test)]
+    report = {
+        "n_test": u_test.shape[0],
+        "rel_err_u": relative_error(u_ref, u_np),
+        "rel_err_alpha": relative_error(alpha_ref, alpha_np),
+        "rel_err_h": relative_error(h_ref, h_np),
+        "load_time_numpy": load_time,
+    }
+    for batch_size in batch_sizes:
+        u_batch = u_test[:batch_size]
+        report["latency_call_scaled_64_" + str(batch_size)] = latency(closure.call_scaled_64, u_batch)
+        report["latency_numpy_" + str(batch_size)] = latency(numpy_closure.call_scaled_64, u_batch)
+    return write_report(report, "NumPy closure report (reference: call_scaled_64):",
+                        file_name[:-len(".npz")] + "_report.csv")
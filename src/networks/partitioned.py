@@ -0,0 +1,249 @@
+"""
+brief: Region partitioned closure ensembles. The normalized realizable set is split into shells of the anisotropy
+       |u_1|/u_0 (norm of the first order moments), each shell is closed by its own (small) expert network.
+       Interior shells, where alpha is small and smooth, get narrow experts, the stiff shell near the realizable
+       boundary (|u_1|/u_0 -> 1) a wider one. The ensemble is evaluated with a vectorized dispatch and has the
+       call_scaled_64 interface of the closures.
+       A trained ensemble is stored as <folder>/partition.json and one artifact per expert in <folder>/expert_<i>.
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+import json
+import time
+from os import path, makedirs
+
+import numpy as np
+import tensorflow as tf
+
+from src.networks.basenetwork import BaseNetwork
+from src.networks.configmodel import init_neural_closure
+from src.networks.distillation import sample_alpha, compute_exact_labels
+from src.networks.registry import ModelRegistry, export_artifact
+from src.networks.reports import relative_error, write_report
+
+partition_file = "partition.json"
+
+
+def anisotropy(u_non_normal: np.ndarray, spatial_dim: int) -> np.ndarray:
+    """
+    brief: norm of the normalized first order moments |u_1|/u_0 (monomial basis: u_1 = u[:,1:1+spatial_dim]).
+           Lies in [0,1) for realizable moments, the realizable boundary is approached for |u_1|/u_0 -> 1.
+    input: u_non_normal = moments, dims = (nS x N)
+           spatial_dim = spatial dimension of the moment system
+    returns: anisotropy, dims = nS
+    """
+    return np.linalg.norm(u_non_normal[:, 1:1 + spatial_dim], axis=1) / u_non_normal[:, 0]
+
+
+class PartitionedClosure:
+    """
+    Ensemble of expert closures on anisotropy shells [0, e_0), [e_0, e_1), ..., [e_{K-2}, inf) of |u_1|/u_0.
+    call_scaled_64 buckets the batch by shell (one stable sort), calls each expert once on its contiguous sub-batch
+    and scatters the results back to the order of the input.
+    """
+    experts: list  # K closures of the same moment system (with call_scaled_64)
+    edges: np.ndarray  # K-1 increasing shell edges of |u_1|/u_0
+    spatial_dim: int
+    poly_degree: int
+    basis: str
+
+    def __init__(self, experts: list, edges: list):
+        """
+        input: experts = K closures of the same moment system, ordered from the interior to the boundary shell
+               edges = K-1 increasing edges of the anisotropy shells
+        """
+        if len(experts) != len(edges) + 1:
+            raise ValueError("A partition with " + str(len(edges)) + " edges needs " + str(len(edges) + 1) +
+                             " experts, got " + str(len(experts)))
+        if np.any(np.diff(edges) <= 0):
+            raise ValueError("Edges of the partition must be increasing: " + str(edges))
+        systems = {(e.poly_degree, e.spatial_dim, e.basis) for e in experts}
+        if len(systems) != 1:
+            raise ValueError("All experts must close the same moment system, got " + str(systems))
+        [(self.poly_degree, self.spatial_dim, self.basis)] = systems
+        if self.basis != "monomial":
+            raise ValueError("Partitioned closures are only supported for the monomial basis")
+        self.experts = experts
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.model = experts[0].model  # entropy model of the moment system (basis, quadrature, reconstruction)
+
+    def region_index(self, u_non_normal: np.ndarray) -> np.ndarray:
+        """
+        returns: shell (expert) index of each cell, dims = nS
+        """
+        return np.digitize(anisotropy(u_non_normal, self.spatial_dim), self.edges)
+
+    def call_scaled_64(self, u_non_normal: np.ndarray, legacy_mode=False) -> list:
+        """
+        brief: closes non normalized moments with the expert of their shell
+        input: u_non_normal = moments, dims = (nS x N)
+        returns: [u, alpha, h] as tensors (float64), dims = (nS x N), (nS x N), (nS x 1)
+        """
+        u_non_normal = np.asarray(u_non_normal, dtype=np.float64)
+        regions = self.region_index(u_non_normal)
+        order = np.argsort(regions, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(regions, minlength=len(self.experts)))])
+        results = [np.empty(u_non_normal.shape), np.empty(u_non_normal.shape), np.empty((u_non_normal.shape[0], 1))]
+        for idx, expert in enumerate(self.experts):
+            if bounds[idx + 1] == bounds[idx]:
+                continue
+            cells = order[bounds[idx]:bounds[idx + 1]]
+            for result, expert_result in zip(results, expert.call_scaled_64(u_non_normal[cells])):
+                result[cells] = np.asarray(expert_result)
+        return [tf.constant(result, dtype=tf.float64) for result in results]
+
+
+def save_partition(folder_name: str, edges: list, expert_names: list, spatial_dim: int) -> str:
+    """
+    brief: writes the partition file of an ensemble (the experts are stored as artifacts in their own folders)
+    input: folder_name = ensemble folder (e.g. models/<name>)
+           edges = shell edges
+           expert_names = expert folders, relative to the ensemble folder
+           spatial_dim = spatial dimension of the moment system
+    returns: the file name
+    """
+    if not path.exists(folder_name):
+        makedirs(folder_name)
+    file_name = folder_name + "/" + partition_file
+    with open(file_name, "w") as f:
+        json.dump({"edges": [float(e) for e in edges], "experts": expert_names, "spatial_dim": spatial_dim}, f,
+                  indent=1)
+    print("Partition saved to " + file_name)
+    return file_name
+
+
+def load_partitioned_closure(folder_name: str, root: str = "models", use_cache: bool = True) -> PartitionedClosure:
+    """
+    brief: loads a trained ensemble and its experts (see save_partition)
+    input: folder_name = ensemble folder (relative to root)
+           root = model root of the registry
+           use_cache = reuse expert models that were loaded before in this process
+    returns: the partitioned closure
+    """
+    file_name = root + "/" + folder_name + "/" + partition_file
+    if not path.exists(file_name):
+        print("Partition file is missing. Expected in: " + file_name)
+        exit(1)
+    with open(file_name) as f:
+        partition = json.load(f)
+    registry = ModelRegistry(root)
+    experts = [registry.load(folder_name + "/" + name, use_cache=use_cache) for name in partition["experts"]]
+    return PartitionedClosure(experts, partition["edges"])
+
+
+def create_partition_data(closure: BaseNetwork, n_samples: int, max_alpha_norm: float,
+                          boundary_fraction: float = 0.3, seed: int = None) -> list:
+    """
+    brief: exact training data of the whole realizable set (sampled via the Lagrange multipliers)
+    input: closure = closure (with created model) of the moment system, only used for the reconstruction
+    returns: [u, alpha, h, anisotropy] of normalized moments, dims = (nS x N), (nS x N), (nS x 1), nS
+    """
+    rng = np.random.default_rng(seed)
+    alpha = sample_alpha(n_samples, closure.model.input_dim - 1, max_alpha_norm, boundary_fraction, rng)
+    [u, alpha_complete, h] = compute_exact_labels(closure.model, alpha)
+    return [u, alpha_complete, h, anisotropy(u, closure.spatial_dim)]
+
+
+def train_partitioned_closure(folder_name: str, network_mk: int, poly_degree: int, spatial_dim: int, edges: list,
+                              widths: list, nw_depth: int, loss_combination: int = 2,
+                              input_decorrelation: bool = False, scale_active: bool = False, gamma_lvl: int = 0,
+                              n_samples: int = 200000, max_alpha_norm: float = 20, overlap: float = 0.02,
+                              val_split: float = 0.1, epoch_count: int = 1000, curriculum: int = 1,
+                              batch_size: int = 128, verbosity: int = 1, processing_mode: int = 0,
+                              lbfgs_iterations: int = 0, seed: int = None) -> PartitionedClosure:
+    """
+    brief: trains one expert per anisotropy shell on exact data of its shell and writes the ensemble
+           (partition file and expert artifacts in models/<folder_name>/expert_<i>)
+    input: folder_name = ensemble folder (relative to models/)
+           network_mk, poly_degree, spatial_dim, nw_depth, loss_combination, input_decorrelation, scale_active,
+           gamma_lvl = config of the experts (see init_neural_closure)
+           edges = K-1 increasing shell edges of |u_1|/u_0
+           widths = K widths of the experts, from the interior to the boundary shell
+           n_samples, max_alpha_norm, seed = sampling of the training data of the whole realizable set
+           overlap = the training data of each expert extends by overlap over its shell edges, s.t. the experts
+                     agree at the edges
+           val_split, epoch_count, curriculum, batch_size, verbosity, processing_mode, lbfgs_iterations =
+           see BaseNetwork.config_start_training
+    returns: the trained ensemble
+    """
+    if len(widths) != len(edges) + 1:
+        raise ValueError("A partition with " + str(len(edges)) + " edges needs " + str(len(edges) + 1) +
+                         " expert widths, got " + str(len(widths)))
+    labeler = init_neural_closure(network_mk=network_mk, poly_degree=poly_degree, spatial_dim=spatial_dim,
+                                  folder_name=folder_name, loss_combination=loss_combination, nw_width=min(widths),
+                                  nw_depth=nw_depth, normalized=True, input_decorrelation=False, scale_active=False)
+    labeler.create_model()
+    [u, alpha, h, u_anisotropy] = create_partition_data(labeler, n_samples, max_alpha_norm, seed=seed)
+    shell_bounds = np.concatenate([[-np.inf], edges, [np.inf]])
+    experts = []
+    expert_names = []
+    for idx, width in enumerate(widths):
+        in_shell = (u_anisotropy >= shell_bounds[idx] - overlap) & (u_anisotropy < shell_bounds[idx + 1] + overlap)
+        print("Train expert " + str(idx) + " (width " + str(width) + ") on " + str(np.count_nonzero(in_shell)) +
+              " samples with " + str(shell_bounds[idx]) + " <= |u_1|/u_0 < " + str(shell_bounds[idx + 1]))
+        if np.count_nonzero(in_shell) == 0:
+            raise ValueError("No training samples in shell " + str(idx) + ". Increase max_alpha_norm or n_samples")
+        expert_names.append("expert_" + str(idx))
+        expert = init_neural_closure(network_mk=network_mk, poly_degree=poly_degree, spatial_dim=spatial_dim,
+                                     folder_name=folder_name + "/" + expert_names[-1],
+                                     loss_combination=loss_combination, nw_width=width, nw_depth=nw_depth,
+                                     normalized=True, input_decorrelation=input_decorrelation,
+                                     scale_active=scale_active, gamma_lvl=gamma_lvl)
+        expert.training_data = [u[in_shell, 1:], alpha[in_shell, 1:], h[in_shell]]
+        if expert.input_decorrelation:
+            expert.compute_input_statistics(expert.training_data[0])
+        expert.training_data_preprocessing(scaled_output=expert.scale_active)
+        expert.create_model()
+        expert.config_start_training(val_split=val_split, epoch_count=epoch_count, curriculum=curriculum,
+                                     batch_size=batch_size, verbosity=verbosity, processing_mode=processing_mode,
+                                     lbfgs_iterations=lbfgs_iterations)
+        expert.model.load_weights(expert.folder_name + "/best_model/")
+        export_artifact(expert)
+        experts.append(expert)
+    save_partition("models/" + folder_name, edges, expert_names, spatial_dim)
+    return PartitionedClosure(experts, edges)
+
+
+def partition_report(partitioned: PartitionedClosure, reference: BaseNetwork = None, n_test: int = 10000,
+                     max_alpha_norm: float = 20, batch_size: int = 10000, n_repeats: int = 10, seed: int = 3,
+                     file_name: str = None) -> dict:
+    """
+    brief: errors of the ensemble per shell on an exact test set and cost per cell of call_scaled_64 of the ensemble,
+           of each expert and of a reference closure (e.g. a single network of the whole realizable set, default:
+           the boundary expert).
+    input: partitioned = trained ensemble
+           reference = closure of the cost comparison
+           n_test, max_alpha_norm, seed = sampling of the test set
+           batch_size, n_repeats = cells per call and number of timed calls
+           file_name = csv file of the report (optional)
+    returns: dict with the fractions of test cells, errors per shell and costs per cell
+    """
+    if reference is None:
+        reference = partitioned.experts[-1]
+    [u_test, alpha_test, h_test, _] = create_partition_data(partitioned.experts[0], n_test, max_alpha_norm,
+                                                            seed=seed)
+    regions = partitioned.region_index(u_test)
+    [u_pred, alpha_pred, h_pred] = [r.numpy() for r in partitioned.call_scaled_64(u_test)]
+
+    def cost_per_cell(closure):
+        u_batch = np.resize(u_test, (batch_size, u_test.shape[1]))
+        closure.call_scaled_64(u_batch)  # warm up
+        start = time.perf_counter()
+        for i in range(n_repeats):
+            closure.call_scaled_64(u_batch)
+        return (time.perf_counter() - start) / (n_repeats * batch_size)
+
+    report = {"n_test": n_test, "rel_err_u": relative_error(u_test, u_pred),
+              "rel_err_alpha": relative_error(alpha_test, alpha_pred), "rel_err_h": relative_error(h_test, h_pred)}
+    for idx in range(len(partitioned.experts)):
+        in_shell = regions == idx
+        report["fraction_shell_" + str(idx)] = float(np.mean(in_shell))
+        if np.any(in_shell):
+            report["rel_err_alpha_shell_" + str(idx)] = relative_error(alpha_test[in_shell], alpha_pred[in_shell])
+            report["rel_err_h_shell_" + str(idx)] = relative_error(h_test[in_shell], h_pred[in_shell])
+        report["cost_per_cell_expert_" + str(idx)] = cost_per_cell(partitioned.experts[idx])
+    report["cost_per_cell_partitioned"] = cost_per_cell(partitioned)
+    report["cost_per_cell_reference"] = cost_per_cell(reference)
+    return write_report(report, "Partitioned closure report (reference: exact minimal entropy closure):",
+                        file_name)
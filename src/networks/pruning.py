@@ -0,0 +1,166 @@
+"""
+brief: Structured (neuron) pruning of ICNN closures (MK11, MK13). The pruned model is a narrower model of the same
+       type, i.e. it is stored, loaded and evaluated like any other model.
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+
+import numpy as np
+import tensorflow as tf
+
+from src import utils
+from src.networks.basenetwork import BaseNetwork
+from src.networks.configmodel import load_neural_closure
+from src.networks.mk11 import MK11Network
+from src.networks.mk13 import MK13Network
+from src.networks.reports import relative_error, write_report
+
+
+def get_consumer_names(depth: int) -> list:
+    """
+    brief: names of the nn_component layers, i.e. the layers that consume the hidden neurons of the ICNN.
+           Consumer l reads the output of hidden layer l-1 (hidden layer -1 is the input layer).
+    input: depth = number of convex layers
+    returns: list of layer names, length depth+1
+    """
+    return ["layer_" + str(idx) + "nn_component" for idx in range(depth)] + [
+        "layer_" + str(depth + 2) + "nn_component"]
+
+
+def compute_neuron_importance(closure: BaseNetwork, x_sample: np.ndarray = None) -> list:
+    """
+    brief: importance of each hidden neuron = L1 norm of its outgoing (non-negative) weights, multiplied by the mean
+           absolute activation of the neuron on x_sample, if given.
+    input: closure = MK11 or MK13 closure
+           x_sample = network inputs (normalized moments without u_0), dim = (nS x input_dim)
+    returns: [importance, mean_activation], lists with one entry (dim = width) per hidden layer
+    """
+    core_model = closure.model.core_model
+    consumers = [core_model.get_layer(name) for name in get_consumer_names(closure.model_depth)]
+    if x_sample is not None:
+        activation_model = tf.keras.Model(inputs=core_model.inputs, outputs=[layer.input for layer in consumers])
+        activations = activation_model(x_sample)
+        mean_activation = [np.mean(z.numpy(), axis=0) for z in activations]
+        mean_abs_activation = [np.mean(np.abs(z.numpy()), axis=0) for z in activations]
+    else:
+        mean_activation = [np.zeros(closure.model_width) for layer in consumers]
+        mean_abs_activation = [np.ones(closure.model_width) for layer in consumers]
+    importance = [m * np.sum(np.abs(layer.get_weights()[0]), axis=1) for m, layer in
+                  zip(mean_abs_activation, consumers)]
+    return [importance, mean_activation]
+
+
+def select_neurons(closure: BaseNetwork, importance: list, width: int) -> list:
+    """
+    brief: selects the neurons that are kept in each hidden layer. MK13 uses one index set for all layers,
+           since its residual connections add the hidden layers neuron by neuron.
+    input: closure = MK11 or MK13 closure
+           importance = neuron importance per hidden layer
+           width = width of the pruned model
+    returns: list of sorted index arrays (one per hidden layer)
+    """
+    if isinstance(closure, MK13Network):
+        keep = np.sort(np.argsort(np.sum(importance, axis=0))[::-1][:width])
+        return [keep for i in importance]
+    return [np.sort(np.argsort(imp)[::-1][:width]) for imp in importance]
+
+
+def prune_closure(closure: BaseNetwork, prune_ratio: float, target_folder: str, x_sample: np.ndarray = None,
+                  bias_correction: bool = True) -> BaseNetwork:
+    """
+    brief: removes the least important neurons of each hidden layer of a trained MK11 or MK13 closure and creates the
+           narrower model with the remaining weights. Kernels of the nn_components are sub-matrices of non-negative
+           kernels, so the pruned model is input convex as well. If bias_correction is active, the mean contribution
+           of the removed neurons (on x_sample) is added to the bias of the consuming layer.
+           The pruned model (weights, scaling data and config file) is saved to models/<target_folder>.
+    input: closure = trained MK11 or MK13 closure (created or loaded)
+           prune_ratio = fraction of removed neurons per hidden layer, in [0,1)
+           target_folder = folder of the pruned model (relative to models/)
+           x_sample = network inputs used for the neuron importance and bias correction (e.g. training data)
+           bias_correction = if true, the mean contribution of removed neurons is kept in the biases
+    returns: the pruned closure
+    """
+    if type(closure) not in (MK11Network, MK13Network):
+        raise ValueError("Pruning is only supported for MK11 and MK13 (MK14 normalizes its convex layers)")
+    if not 0.0 <= prune_ratio < 1.0:
+        raise ValueError("Prune ratio must be in [0,1)")
+    width = max(1, int(round((1.0 - prune_ratio) * closure.model_width)))
+    print("Prune closure from width " + str(closure.model_width) + " to width " + str(width))
+
+    [importance, mean_activation] = compute_neuron_importance(closure, x_sample)
+    keep = select_neurons(closure, importance, width)
+    if not bias_correction:
+        mean_activation = [np.zeros(closure.model_width) for k in keep]
+
+    # pruned model with the same configuration and scaling
+    pruned = load_neural_closure(closure.folder_name[len("models/"):], load_weights=False)
+    pruned.folder_name = "models/" + target_folder
+    pruned.model_width = width
+    pruned.set_precision_policy(policy=closure.precision_policy, reconstruction_dtype=closure.reconstruction_dtype)
+    pruned.set_quadrature_schedule(coarse_order=closure.coarse_quadrature_order,
+                                   fine_epochs=closure.fine_quadrature_epochs)
+    for attribute in ("scaler_min", "scaler_max", "mean_u", "cov_u", "cov_ev"):
+        setattr(pruned, attribute, getattr(closure, attribute))
+    pruned.create_model()
+
+    source_core = closure.model.core_model
+    target_core = pruned.model.core_model
+    # input layer: keep the columns of the selected neurons
+    [kernel, bias] = source_core.get_layer("layer_-1_input").get_weights()
+    target_core.get_layer("layer_-1_input").set_weights([kernel[:, keep[0]], bias[keep[0]]])
+    # convex layers and output layer
+    layer_indices = list(range(closure.model_depth)) + [closure.model_depth + 2]
+    for l, layer_idx in enumerate(layer_indices):
+        nn_name = "layer_" + str(layer_idx) + "nn_component"
+        dense_name = "layer_" + str(layer_idx) + "dense_component"
+        [kernel_nn, bias_nn] = source_core.get_layer(nn_name).get_weights()
+        [kernel_dense] = source_core.get_layer(dense_name).get_weights()
+        removed = np.setdiff1d(np.arange(closure.model_width), keep[l])
+        bias_nn = bias_nn + mean_activation[l][removed] @ kernel_nn[removed, :]
+        columns = keep[l + 1] if l + 1 < len(keep) else np.arange(kernel_nn.shape[1])
+        target_core.get_layer(nn_name).set_weights([kernel_nn[keep[l]][:, columns], bias_nn[columns]])
+        target_core.get_layer(dense_name).set_weights([kernel_dense[:, columns]])
+    # non trainable weights (mean shift and decorrelation)
+    for source_layer, target_layer in zip(source_core.layers, target_core.layers):
+        if not source_layer.trainable_weights and source_layer.weights:
+            target_layer.set_weights(source_layer.get_weights())
+
+    utils.copy_config_file(closure.folder_name, pruned.folder_name,
+                           {"folder": target_folder, "network width": width, "prune_ratio": prune_ratio})
+    pruned.save_scaling_data()
+    pruned.model(tf.zeros(shape=(2, pruned.input_dim)))  # define the input shape before saving
+    pruned.save_model()
+    print("Pruned model saved to " + pruned.folder_name)
+    return pruned
+
+
+def pruning_report(closure: BaseNetwork, pruned: BaseNetwork, u_test: np.ndarray, name: str = "prune_report") -> dict:
+    """
+    brief: compares the pruned model to the original model (relative errors of call_scaled_64 w.r.t. the whole test
+           set) and counts the multiply-adds per cell of the core networks.
+           Results are written to pruned.folder_name/<name>.csv
+    input: closure, pruned = original and pruned closure
+           u_test = non normalized moments, dim = (nS x N)
+           name = file name of the report
+    returns: dict with errors and operation counts
+    """
+
+    def count_multiply_adds(model: BaseNetwork) -> int:
+        return int(sum(np.prod(w.shape) for w in model.model.core_model.trainable_weights if len(w.shape) == 2))
+
+    [u_ref, alpha_ref, h_ref] = [r.numpy() for r in closure.call_scaled_64(u_test)]
+    [u_pruned, alpha_pruned, h_pruned] = [r.numpy() for r in pruned.call_scaled_64(u_test)]
+    report = {
+        "width": closure.model_width,
+        "pruned_width": pruned.model_width,
+        "multiply_adds": count_multiply_adds(closure),
+        "pruned_multiply_adds": count_multiply_adds(pruned),
+        "rel_err_u": relative_error(u_ref, u_pruned),
+        "rel_err_alpha": relative_error(alpha_ref, alpha_pruned),
+        "rel_err_h": relative_error(h_ref, h_pruned),
+        "min_nn_weight": float(min(np.min(w.numpy()) for w in pruned.model.core_model.trainable_weights if
+                                   "nn_component" in w.name and len(w.shape) == 2)),
+    }
+    return write_report(report, "Pruning report (reference: unpruned model):",
+                        pruned.folder_name + "/" + name + ".csv")
@@ -0,0 +1,171 @@
+"""
+brief: Post-training reduced precision export (float16 and int8 weights) of neural closures with error report.
+       The variants are simulated quantization: the stored weights are dequantized to float32 on load and the
+       closure computes in float32, i.e. the export reduces the storage size, not the execution time.
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+from os import path, makedirs
+
+import numpy as np
+import tensorflow as tf
+
+from src.networks.basenetwork import BaseNetwork
+from src.networks.distillation import sample_alpha, compute_exact_labels
+from src.networks.entropymodels import SobolevModel
+from src.networks.reports import relative_error, write_report
+
+export_precisions: tuple = ("float16", "int8")
+
+
+def quantize_weights(closure: BaseNetwork, precision: str) -> dict:
+    """
+    brief: quantizes the weights of the core network.
+           float16: all variables are stored in float16.
+           int8: trainable kernels (2D) are stored as int8 with a symmetric scale per output neuron
+                 (w = q * scale, |q| <= 127). Biases and non trainable variables (e.g. decorrelation) stay float32.
+                 Non-negative kernels stay non-negative, i.e. ICNNs stay input convex.
+    input: closure = trained neural closure
+           precision = "float16" or "int8"
+    returns: dict of numpy arrays, that can be stored with np.savez
+    """
+    if precision not in export_precisions:
+        raise ValueError("Export precision >" + str(precision) + "< not supported. Choose from " + str(
+            export_precisions))
+    core_model = closure.model.core_model
+    trainable = [v.ref() for v in core_model.trainable_weights]
+    quantized = {"precision": np.array(precision), "names": np.array([v.name for v in core_model.weights])}
+    for idx, variable in enumerate(core_model.weights):
+        weight = variable.numpy()
+        if precision == "float16":
+            quantized["w_" + str(idx)] = weight.astype(np.float16)
+        elif weight.ndim == 2 and variable.ref() in trainable:
+            scale = np.max(np.abs(weight), axis=0) / 127.0
+            scale[scale == 0.0] = 1.0
+            quantized["w_" + str(idx)] = np.round(weight / scale).astype(np.int8)
+            quantized["scale_" + str(idx)] = scale.astype(np.float32)
+        else:
+            quantized["w_" + str(idx)] = weight.astype(np.float32)
+    return quantized
+
+
+def dequantize_weights(quantized: dict) -> list:
+    """
+    brief: converts quantized weights (see quantize_weights) back to float32 arrays
+    input: quantized = dict (or npz file) of quantized weights
+    returns: list of weights in the order of core_model.weights
+    """
+    weights = []
+    for idx in range(len(quantized["names"])):
+        weight = quantized["w_" + str(idx)].astype(np.float32)
+        if "scale_" + str(idx) in quantized:
+            weight = weight * quantized["scale_" + str(idx)]
+        weights.append(weight)
+    return weights
+
+
+def load_reduced_precision(closure: BaseNetwork, file_name: str) -> bool:
+    """
+    brief: loads reduced precision weights (written by export_reduced_precision) into a created closure of the same
+           configuration
+    input: closure = neural closure (model created)
+           file_name = path to the .npz file
+    returns: True, if successful
+    """
+    with np.load(file_name) as quantized:
+        closure.model.core_model.set_weights(dequantize_weights(quantized))
+        print("Reduced precision (" + str(quantized["precision"]) + ") weights loaded from " + file_name)
+    return True
+
+
+def convexity_violations(closure: BaseNetwork, u_normalized: np.ndarray, n_pairs: int = 10000,
+                         seed: int = 0) -> list:
+    """
+    brief: tests midpoint convexity h((u_a+u_b)/2) <= (h(u_a)+h(u_b))/2 of the core network on random pairs of
+           realizable normalized moments (the realizable set is convex, so all midpoints are realizable)
+    input: closure = neural closure whose core network approximates h (SobolevModel wrapper)
+           u_normalized = network inputs (normalized moments without u_0), dim = (nS x input_dim)
+           n_pairs = number of tested pairs
+           seed = seed of the pair selection
+    returns: [max_violation, violation_fraction], violations are relative to the range of h on the sample
+    """
+    rng = np.random.default_rng(seed)
+    idx_a = rng.integers(0, u_normalized.shape[0], size=n_pairs)
+    idx_b = rng.integers(0, u_normalized.shape[0], size=n_pairs)
+    u_a = tf.constant(u_normalized[idx_a], dtype=tf.float32)
+    u_b = tf.constant(u_normalized[idx_b], dtype=tf.float32)
+    h_a = tf.cast(closure.model.core_model(u_a), tf.float64).numpy()
+    h_b = tf.cast(closure.model.core_model(u_b), tf.float64).numpy()
+    h_mid = tf.cast(closure.model.core_model(0.5 * (u_a + u_b)), tf.float64).numpy()
+    h_range = max(float(np.max(np.concatenate([h_a, h_b])) - np.min(np.concatenate([h_a, h_b]))), 1e-12)
+    violation = np.maximum(h_mid - 0.5 * (h_a + h_b), 0.0) / h_range
+    return [float(np.max(violation)), float(np.mean(violation > 0.0))]
+
+
+def export_reduced_precision(closure: BaseNetwork, precision: str, n_test: int = 10000, max_alpha_norm: float = 20,
+                             convexity_tolerance: float = 1e-4, seed: int = 1) -> dict:
+    """
+    brief: exports the float16 or int8 weight variant of a trained closure to
+           folder_name/reduced_precision/<precision>_weights.npz and writes an error report
+           (folder_name/reduced_precision/<precision>_report.csv).
+           The test set are realizable moments with random u_0 in [0.1,10], sampled via their Lagrange multipliers.
+           Errors are relative errors (w.r.t. the whole test set) of call_scaled_64 with the dequantized reduced
+           precision weights (simulated quantization, float32 compute) and the original weights. The convexity
+           check compares the midpoint convexity violations of both variants (only for closures whose core network
+           approximates h). The closure keeps its original weights.
+    input: closure = trained neural closure
+           precision = "float16" or "int8"
+           n_test = number of test moments
+           max_alpha_norm = radius of the sampling ball of alpha
+           convexity_tolerance = maximal accepted (relative) convexity violation of the reduced precision variant
+           seed = seed of the test set
+    returns: dict with errors, convexity check and file sizes
+    """
+    rng = np.random.default_rng(seed)
+    alpha = sample_alpha(n_test, closure.model.input_dim - 1, max_alpha_norm, rng=rng)
+    [u_normalized, _, _] = compute_exact_labels(closure.model, alpha)
+    u_test = u_normalized * rng.uniform(low=0.1, high=10.0, size=(n_test, 1))
+
+    quantized = quantize_weights(closure, precision)
+    export_folder = closure.folder_name + "/reduced_precision"
+    if not path.exists(export_folder):
+        makedirs(export_folder)
+    file_name = export_folder + "/" + precision + "_weights.npz"
+    np.savez(file_name, **quantized)
+
+    check_convexity = isinstance(closure.model, SobolevModel)
+    original_weights = closure.model.core_model.get_weights()
+    [u_ref, alpha_ref, h_ref] = [r.numpy() for r in closure.call_scaled_64(u_test)]
+    if check_convexity:
+        [max_violation_ref, violation_fraction_ref] = convexity_violations(closure, u_normalized[:, 1:])
+    closure.model.core_model.set_weights(dequantize_weights(quantized))
+    [u_red, alpha_red, h_red] = [r.numpy() for r in closure.call_scaled_64(u_test)]
+    if check_convexity:
+        [max_violation, violation_fraction] = convexity_violations(closure, u_normalized[:, 1:])
+    else:
+        print("Core network does not approximate h. Convexity check skipped.")
+        [max_violation, violation_fraction, max_violation_ref, violation_fraction_ref] = [np.nan] * 4
+    closure.model.core_model.set_weights(original_weights)
+
+    report = {
+        "precision": precision,
+        "execution": "simulated (weights dequantized to float32)",
+        "n_test": n_test,
+        "rel_err_u": relative_error(u_ref, u_red),
+        "rel_err_alpha": relative_error(alpha_ref, alpha_red),
+        "rel_err_h": relative_error(h_ref, h_red),
+        "max_convexity_violation": max_violation,
+        "convexity_violation_fraction": violation_fraction,
+        "max_convexity_violation_float32": max_violation_ref,
+        "convexity_violation_fraction_float32": violation_fraction_ref,
+        "convexity_check_passed": not check_convexity or max_violation <= convexity_tolerance,
+        "weight_bytes_float32": int(sum(w.nbytes for w in original_weights)),
+        "weight_bytes_" + precision: int(sum(v.nbytes for k, v in quantized.items() if k.startswith(("w_", "scale_")))),
+    }
+    write_report(report, "Reduced precision report (simulated quantization, reference: float32 weights, "
+                         "call_scaled_64):", export_folder + "/" + precision + "_report.csv")
+    if not report["convexity_check_passed"]:
+        print("Warning: convexity violations of the " + precision + " variant exceed the tolerance " + str(
+            convexity_tolerance))
+    return report
@@ -0,0 +1,351 @@
+"""
+brief: Model registry of trained neural closures. Each model folder holds one self-describing artifact
+       <folder>/closure_artifact.npz with the architecture config, the output scaling, the decorrelation statistics
+       and all weights of the entropy model. Loading an artifact builds the model and sets the weights directly,
+       i.e. without reading the SavedModel in <folder>/best_model.
+       Loaded models can be kept in an in-process cache (use_cache, default of ModelRegistry.load and opt-in for
+       load_model), s.t. repeated inference loads of the same model (e.g. several solvers) reuse the built model.
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+import json
+import os
+import re
+from os import path
+
+import numpy as np
+import pandas as pd
+
+artifact_name = "closure_artifact.npz"
+artifact_version = 1
+# keys of init_neural_closure stored in the artifact config
+config_keys = ("network_mk", "poly_degree", "spatial_dim", "loss_combination", "nw_width", "nw_depth", "normalized",
+               "input_decorrelation", "scale_active", "gamma_lvl", "basis", "rotated")
+closure_cache: dict = {}  # cache key -> loaded closure (see cache_key)
+# non trainable training state of the entropy model, that is not part of the network and not stored in artifacts
+training_state_names = ("coarse_quadrature_active",)
+
+
+def is_training_state(weight_name: str) -> bool:
+    """
+    returns: True, if the weight (name as in model.weights, e.g. "coarse_quadrature_active:0") is training state
+    """
+    return weight_name.split(":")[0].split("/")[-1] in training_state_names
+
+
+def network_weights(model) -> list:
+    """
+    returns: weights (tf.Variables) of the entropy model without the training state (see training_state_names),
+             i.e. the weights that are equal for closures with the same config
+    """
+    return [weight for weight in model.weights if not is_training_state(weight.name)]
+
+
+def weight_keys(weight_names: list) -> list:
+    """
+    brief: keys to match the weights of two models with the same config by name. The key is the weight name without
+           the ":0" suffix, where a generated keras layer name (e.g. "batch_normalization_4") is replaced by its
+           position among the generated names of the model with the same prefix ("batch_normalization#0"), since the
+           counter of generated names depends on the models created before in the process.
+    input: weight_names = names of the weights of one model (in the order of model.weights)
+    returns: list of keys
+    """
+    layer_index = {}
+    keys = []
+    for name in weight_names:
+        [layer_name, _, weight_name] = name.split(":")[0].rpartition("/")
+        generated = re.fullmatch(r"([a-z]+(?:_[a-z]+)*)(?:_\d+)?", layer_name)
+        if generated:
+            prefix = generated.group(1)
+            if layer_name not in layer_index:
+                layer_index[layer_name] = prefix + "#" + str(sum(key.startswith(prefix + "#")
+                                                                 for key in layer_index.values()))
+            layer_name = layer_index[layer_name]
+        keys.append(layer_name + "/" + weight_name)
+    return keys
+
+
+def closure_config(closure) -> dict:
+    """
+    brief: architecture config of a closure, i.e. the arguments of init_neural_closure (without the folder)
+    input: closure = neural closure (BaseNetwork)
+    returns: dict with the keys config_keys
+    """
+    loss_combination = [key for key, weights in closure.loss_comp_dict.items()
+                        if list(weights) == list(closure.loss_weights)][0]
+    if closure.regularization_gamma == 0.0:
+        gamma_lvl = 0
+    else:
+        gamma_lvl = int(round(-np.log10(closure.regularization_gamma)))
+    return {
+        "network_mk": int(type(closure).__name__[2:-len("Network")]),
+        "poly_degree": int(closure.poly_degree),
+        "spatial_dim": int(closure.spatial_dim),
+        "loss_combination": int(loss_combination),
+        "nw_width": int(closure.model_width),
+        "nw_depth": int(closure.model_depth),
+        "normalized": bool(closure.normalized),
+        "input_decorrelation": bool(closure.input_decorrelation),
+        "scale_active": bool(closure.scale_active),
+        "gamma_lvl": gamma_lvl,
+        "basis": closure.basis,
+        "rotated": bool(closure.rotated),
+    }
+
+
+def export_artifact(closure, file_name: str = None) -> str:
+    """
+    brief: writes the artifact of a created (or loaded) closure. The file is replaced atomically.
+    input: closure = neural closure with a created model
+           file_name = target file (default: <closure folder>/closure_artifact.npz)
+    returns: the file name
+    """
+    if file_name is None:
+        file_name = closure.folder_name + "/" + artifact_name
+    config = closure_config(closure)
+    config["precision_policy"] = closure.precision_policy  # informative, the weights are stored in float32
+    weights = network_weights(closure.model)
+    arrays = {
+        "version": np.array(artifact_version),
+        "config": np.array(json.dumps(config)),
+        "scaler": np.array([closure.scaler_min, closure.scaler_max], dtype=np.float64),
+        "mean_u": np.asarray(closure.mean_u, dtype=np.float64),
+        "cov_u": np.asarray(closure.cov_u, dtype=np.float64),
+        "cov_ev": np.asarray(closure.cov_ev, dtype=np.float64),
+        "weight_names": np.array(json.dumps([w.name for w in weights])),
+    }
+    for i, weight in enumerate(weights):
+        arrays["weight_" + str(i).zfill(3)] = np.asarray(weight.numpy(), dtype=np.float32)
+    os.makedirs(path.dirname(file_name) or ".", exist_ok=True)
+    tmp_file = file_name + ".tmp"
+    with open(tmp_file, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_file, file_name)
+    print("Closure artifact saved to " + file_name)
+    return file_name
+
+
+def read_artifact(file_name: str, load_weights: bool = True) -> dict:
+    """
+    brief: reads an artifact
+    input: file_name = artifact file
+           load_weights = if false, only the config and the statistics are read
+    returns: dict with "version", "config" (dict), "scaler_min", "scaler_max", "mean_u", "cov_u", "cov_ev",
+             "weight_names" and "weights" (list of arrays, empty if load_weights is false)
+    """
+    with np.load(file_name, allow_pickle=False) as data:
+        artifact = {
+            "version": int(data["version"]),
+            "config": json.loads(str(data["config"])),
+            "scaler_min": float(data["scaler"][0]),
+            "scaler_max": float(data["scaler"][1]),
+            "mean_u": data["mean_u"],
+            "cov_u": data["cov_u"],
+            "cov_ev": data["cov_ev"],
+            "weight_names": json.loads(str(data["weight_names"])),
+            "weights": [],
+        }
+        if load_weights:
+            artifact["weights"] = [data["weight_" + str(i).zfill(3)] for i in range(len(artifact["weight_names"]))]
+    return artifact
+
+
+def artifact_network_weights(artifact: dict) -> list:
+    """
+    returns: weights of an artifact without the training state (contained in artifacts of older versions)
+    """
+    return [weight for name, weight in zip(artifact["weight_names"], artifact["weights"])
+            if not is_training_state(name)]
+
+
+def is_current_artifact(folder_name: str) -> bool:
+    """
+    returns: True, if the folder has an artifact that is not older than the SavedModel in <folder>/best_model
+    """
+    artifact_file = folder_name + "/" + artifact_name
+    if not path.exists(artifact_file):
+        return False
+    saved_model = folder_name + "/best_model/saved_model.pb"
+    return not path.exists(saved_model) or path.getmtime(artifact_file) >= path.getmtime(saved_model)
+
+
+def cache_key(closure, folder_name: str) -> tuple:
+    """
+    returns: key of the model cache. Contains the config, the precision of the closure and the modification time of
+             the loaded files, s.t. a re-trained or re-exported model is not served from the cache.
+    """
+    if is_current_artifact(folder_name):
+        source = folder_name + "/" + artifact_name
+    else:
+        source = folder_name + "/best_model/saved_model.pb"
+    mtime = path.getmtime(source) if path.exists(source) else 0.0
+    config = closure_config(closure)
+    return (path.abspath(folder_name), mtime, closure.precision_policy, closure.reconstruction_dtype,
+            closure.coarse_quadrature_order) + tuple(config[key] for key in config_keys)
+
+
+def load_artifact(closure, file_name: str) -> bool:
+    """
+    brief: builds the model of a closure and sets the scaling, the statistics and the weights from an artifact
+    input: closure = neural closure (created with init_neural_closure) with the config of the artifact
+           file_name = artifact file
+    returns: True, if successful
+    """
+    artifact = read_artifact(file_name)
+    if artifact["version"] > artifact_version:
+        raise ValueError("Artifact version " + str(artifact["version"]) + " of " + file_name + " is not supported")
+    config = closure_config(closure)
+    mismatch = [key for key in config_keys if config[key] != artifact["config"][key]]
+    if mismatch:
+        raise ValueError("Config of the closure does not match the artifact " + file_name + " in: " + str(mismatch))
+    closure.scaler_min = artifact["scaler_min"]
+    closure.scaler_max = artifact["scaler_max"]
+    closure.mean_u = artifact["mean_u"]
+    closure.cov_u = artifact["cov_u"]
+    closure.cov_ev = artifact["cov_ev"]
+    closure.create_model()
+    targets = network_weights(closure.model)
+    weights = dict(zip(weight_keys([name for name in artifact["weight_names"] if not is_training_state(name)]),
+                       artifact_network_weights(artifact)))
+    target_keys = weight_keys([target.name for target in targets])
+    missing = [key for key in target_keys if key not in weights]
+    if missing or len(weights) != len(targets):
+        raise ValueError("Weights of the artifact " + file_name + " do not match the closure. Missing in the artifact: "
+                         + str(missing) + ", weights of the artifact: " + str(len(weights)) + ", of the closure: " +
+                         str(len(targets)))
+    for key, target in zip(target_keys, targets):
+        if tuple(target.shape) != weights[key].shape:
+            raise ValueError("Weight " + key + " of the artifact " + file_name + " has shape " + str(
+                weights[key].shape) + ", the closure " + str(tuple(target.shape)))
+        target.assign(weights[key])
+    return True
+
+
+def load_closure_weights(closure, folder_name: str, use_cache: bool = False) -> bool:
+    """
+    brief: loads the model of a closure from its folder. Uses the artifact if it is current, else the SavedModel in
+           <folder>/best_model. With use_cache, a closure with the same config that was loaded before shares its
+           built model (the model must then not be trained).
+    input: closure = neural closure (created with init_neural_closure)
+           folder_name = model folder
+           use_cache = look up and store the loaded model in the in-process cache
+    returns: True, if successful
+    """
+    key = cache_key(closure, folder_name) if use_cache else None
+    if key in closure_cache:
+        cached = closure_cache[key]
+        closure.scaler_min = cached.scaler_min
+        closure.scaler_max = cached.scaler_max
+        closure.mean_u = cached.mean_u
+        closure.cov_u = cached.cov_u
+        closure.cov_ev = cached.cov_ev
+        closure.model = cached.model
+        print("Model loaded from cache")
+        return True
+    if is_current_artifact(folder_name):
+        load_artifact(closure, folder_name + "/" + artifact_name)
+        print("Model loaded from artifact " + folder_name + "/" + artifact_name)
+    else:
+        closure.load_saved_model(folder_name)
+    if use_cache:
+        closure_cache[key] = closure
+    return True
+
+
+def clear_cache() -> None:
+    """
+    brief: removes all models from the in-process cache
+    """
+    closure_cache.clear()
+
+
+class ModelRegistry:
+    """
+    Registry of the model folders below a root folder (default: models/). Lists and validates the artifacts and loads
+    models lazily, i.e. on the first request, through the in-process cache.
+    """
+    root: str  # folder that contains the model folders
+
+    def __init__(self, root: str = "models"):
+        self.root = root
+
+    def list_models(self) -> pd.DataFrame:
+        """
+        brief: lists all model folders with an artifact or a config file (legacy models). Reads only the configs.
+        returns: DataFrame with one row per model (name, artifact status and config)
+        """
+        rows = []
+        for folder, dirs, files in os.walk(self.root):
+            name = path.relpath(folder, self.root)
+            if artifact_name in files:
+                artifact = read_artifact(folder + "/" + artifact_name, load_weights=False)
+                rows.append(dict(name=name, artifact=True, current=is_current_artifact(folder),
+                                 **{key: artifact["config"][key] for key in config_keys}))
+                dirs.clear()
+            elif any(f.startswith("config_") and f.endswith("_.csv") for f in files) and "best_model" in dirs:
+                rows.append(dict(name=name, artifact=False, current=False))
+                dirs.clear()
+        models = pd.DataFrame(rows)
+        return models.sort_values("name", ignore_index=True) if rows else models
+
+    def validate(self, name: str, check_weights: bool = True) -> list:
+        """
+        brief: checks the artifact of a model
+        input: name = model folder (relative to the root)
+               check_weights = if true, a closure with the config of the artifact (default options, e.g. without coarse
+                            quadrature) is built and loaded from the artifact (round trip)
+        returns: list of found problems (empty, if the artifact is valid)
+        """
+        folder_name = self.root + "/" + name
+        file_name = folder_name + "/" + artifact_name
+        if not path.exists(file_name):
+            return ["Artifact is missing: " + file_name]
+        try:
+            artifact = read_artifact(file_name, load_weights=check_weights)
+        except (OSError, KeyError, ValueError) as error:
+            return ["Artifact is not readable: " + str(error)]
+        problems = []
+        if artifact["version"] > artifact_version:
+            problems.append("Artifact version " + str(artifact["version"]) + " is not supported")
+        missing = [key for key in config_keys if key not in artifact["config"]]
+        if missing:
+            problems.append("Config entries are missing: " + str(missing))
+        if not is_current_artifact(folder_name):
+            problems.append("Artifact is older than " + folder_name + "/best_model")
+        if check_weights and not missing:
+            closure = self.create(name, artifact["config"])
+            try:
+                load_artifact(closure, file_name)  # also checks the names and shapes of the weights
+            except ValueError as error:
+                problems.append("Artifact does not load into a closure with its config: " + str(error))
+        return problems
+
+    def create(self, name: str, config: dict):
+        """
+        returns: closure (not loaded) with the given config in the model folder name
+        """
+        from src.networks.configmodel import init_neural_closure  # avoid circular import
+
+        closure = init_neural_closure(folder_name=name, **{key: config[key] for key in config_keys})
+        closure.folder_name = self.root + "/" + name
+        return closure
+
+    def load(self, name: str, use_cache: bool = True):
+        """
+        brief: loads a model from its artifact (or from its SavedModel, if no current artifact exists)
+        input: name = model folder (relative to the root)
+               use_cache = reuse a model that was loaded before in this process (inference only, the shared model
+                           must not be trained or modified)
+        returns: the loaded closure. Raises FileNotFoundError, if a model outside of models/ has no artifact
+        """
+        folder_name = self.root + "/" + name
+        if not path.exists(folder_name + "/" + artifact_name):
+            if self.root != "models":
+                raise FileNotFoundError("Artifact is missing. Expected in: " + folder_name + "/" + artifact_name)
+            from src.networks.configmodel import load_neural_closure  # avoid circular import
+
+            return load_neural_closure(name, use_cache=use_cache)  # legacy model, config from the config file
+        closure = self.create(name, read_artifact(folder_name + "/" + artifact_name, load_weights=False)["config"])
+        load_closure_weights(closure, folder_name, use_cache=use_cache)
+        return closure
@@ -0,0 +1,39 @@
+"""
+brief: Shared helpers of the accuracy and speed reports of the closure variants.
+       Only depends on numpy at import time, pandas is loaded when a report is written.
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+from os import path, makedirs
+
+import numpy as np
+
+
+def relative_error(ref: np.ndarray, pred: np.ndarray) -> float:
+    """
+    returns: relative error |ref - pred| / |ref| in the Frobenius norm (w.r.t. the whole test set)
+    """
+    return float(np.linalg.norm(ref - pred) / np.linalg.norm(ref))
+
+
+def write_report(report: dict, title: str, file_name: str = None) -> dict:
+    """
+    brief: prints a report and writes it as "key;value" lines to a csv file
+    input: report = dict of the reported quantities
+           title = headline of the printed report
+           file_name = csv file (its folder is created). None = only print
+    returns: the report
+    """
+    print(title)
+    for key, value in report.items():
+        print(key + ": " + str(value))
+    if file_name is not None:
+        import pandas as pd
+
+        folder_name = path.dirname(file_name)
+        if folder_name and not path.exists(folder_name):
+            makedirs(folder_name)
+        pd.DataFrame.from_dict(data={k: [v] for k, v in report.items()}, orient="index").to_csv(
+            file_name, header=False, sep=";")
+    return report
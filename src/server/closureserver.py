@@ -0,0 +1,263 @@
+"""
+brief: Long lived local closure server. Loads neural closures once and evaluates batches of moments for external
+       solver processes (e.g. KiT-RT) through POSIX shared memory.
+
+Protocol (one JSON object per line over a Unix stream socket, one JSON reply per request):
+    {"cmd": "models"}                                         -> {"status": "ok", "models": {name: n_moments}}
+    {"cmd": "closure", "model": name, "shm": shm_name, "n": n_cells}
+                                                              -> {"status": "ok"} or {"status": "error", "msg": ...}
+    {"cmd": "release", "shm": shm_name}                       -> {"status": "ok"}
+    {"cmd": "ping"}                                           -> {"status": "ok"}
+The shared memory block (created by the caller, e.g. with shm_open, name without leading "/") holds four row major
+float64 arrays of max_cells rows: u_in (max_cells x N), u (max_cells x N), alpha (max_cells x N), h (max_cells x 1).
+The server reads the first n_cells rows of u_in (non normalized moments) and writes the first n_cells rows of
+u, alpha and h = call_scaled_64(u_in) directly into the block. No moment data is sent through the socket.
+Attached blocks belong to the connection: they are closed by "release" or when the connection ends (also if the
+client crashes), and a block that was unlinked and created again under the same name is attached again.
+The client side (ClosureClient) does not import tensorflow.
+Author: Steffen Schotthöfer
+Version: 0.0
+Date 19.10.2026
+"""
+import json
+import os
+import socket
+import socketserver
+import threading
+from os import path
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from src.networks.batching import BatchingClosure
+
+
+def get_buffer_views(buffer, n_moments: int, max_cells: int) -> list:
+    """
+    brief: creates numpy views of the four arrays in a shared memory block (see module docstring)
+    input: buffer = buffer of the shared memory block
+           n_moments = size of the moment basis N
+           max_cells = number of rows of each array
+    returns: [u_in, u, alpha, h], dims = (max_cells x N), (max_cells x N), (max_cells x N), (max_cells x 1)
+    """
+    shapes = [(max_cells, n_moments), (max_cells, n_moments), (max_cells, n_moments), (max_cells, 1)]
+    views = []
+    offset = 0
+    for shape in shapes:
+        views.append(np.ndarray(shape=shape, dtype=np.float64, buffer=buffer, offset=offset))
+        offset += shape[0] * shape[1] * 8
+    return views
+
+
+def is_same_segment(segment: SharedMemory, shm_name: str) -> bool:
+    """
+    returns: False, if the name shm_name refers to another block than the attached segment (the block was unlinked
+             and possibly created again). True, if this can not be checked (no /dev/shm)
+    """
+    shm_path = "/dev/shm/" + shm_name.lstrip("/")
+    if not path.isdir("/dev/shm"):
+        return True
+    try:
+        return os.stat(shm_path).st_ino == os.fstat(segment._fd).st_ino
+    except OSError:
+        return False
+
+
+def get_buffer_size(n_moments: int, max_cells: int) -> int:
+    """
+    returns: size of a shared memory block in bytes for the given moment basis size and number of cells
+    """
+    return 8 * max_cells * (3 * n_moments + 1)
+
+
+class ClosureServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Unix socket server that evaluates loaded neural closures on shared memory blocks of its clients.
+    Each connection is handled in its own thread. Evaluations of the same model are serialized or, if batching is
+    enabled, concurrent requests for the same model are coalesced into one evaluation (BatchingClosure).
+    """
+    daemon_threads = True
+    closures: dict  # name -> neural closure
+    locks: dict  # name -> lock of the model
+    batchers: dict  # name -> BatchingClosure of the model (empty, if batching is disabled)
+
+    def __init__(self, socket_path: str, closures: dict, max_batch_size: int = 0, max_latency: float = 0.002):
+        """
+        input: socket_path = path of the Unix socket (an existing file is replaced)
+               closures = dict name -> created and loaded neural closure (BaseNetwork)
+               max_batch_size = maximal number of cells of coalesced requests. 0 = no batching
+               max_latency = maximal waiting time (seconds) for further requests of a batch
+        """
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.closures = closures
+        self.locks = {name: threading.Lock() for name in closures.keys()}
+        for name, closure in closures.items():
+            # trace the model once, s.t. the first request is not slowed down
+            closure.call_scaled_64(np.ones(shape=(2, closure.model.input_dim)))
+            print("Closure server: model " + name + " ready")
+        self.batchers = {}
+        if max_batch_size > 0:
+            self.batchers = {name: BatchingClosure(closure, max_batch_size=max_batch_size, max_latency=max_latency)
+                             for name, closure in closures.items()}
+        super(ClosureServer, self).__init__(socket_path, ClosureRequestHandler)
+
+    def evaluate(self, model_name: str, segment: SharedMemory, n_cells: int) -> None:
+        """
+        brief: evaluates the closure model_name on the first n_cells rows of the attached block segment and writes
+               the results into the block. The views of the block are released before returning.
+        """
+        closure = self.closures[model_name]
+        n_moments = closure.model.input_dim
+        max_cells = segment.size // get_buffer_size(n_moments, 1)
+        if n_cells > max_cells:
+            raise ValueError("Shared memory block " + segment.name + " holds only " + str(max_cells) + " cells")
+        [u_in, u_out, alpha_out, h_out] = get_buffer_views(segment.buf, n_moments, max_cells)
+        if model_name in self.batchers:
+            [u, alpha, h] = self.batchers[model_name].call(u_in[:n_cells])
+        else:
+            with self.locks[model_name]:
+                [u, alpha, h] = [r.numpy() for r in closure.call_scaled_64(u_in[:n_cells])]
+        np.copyto(u_out[:n_cells], u)
+        np.copyto(alpha_out[:n_cells], alpha)
+        np.copyto(h_out[:n_cells], h)
+
+    def server_close(self):
+        for batcher in self.batchers.values():
+            batcher.close()
+        super(ClosureServer, self).server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class ClosureRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles the JSON requests of one client connection (until the client closes the connection).
+    The requests of a connection are processed sequentially, i.e. no view of an attached block of the connection is
+    alive, while the block is closed.
+    """
+    segments: dict  # shared memory name -> SharedMemory attached by this connection
+
+    def setup(self):
+        super(ClosureRequestHandler, self).setup()
+        self.segments = {}
+
+    def finish(self):
+        for shm_name in list(self.segments.keys()):
+            self.release(shm_name)
+        super(ClosureRequestHandler, self).finish()
+
+    def attach(self, shm_name: str) -> SharedMemory:
+        """
+        brief: attaches to the shared memory block of the client (once per connection). The block is owned by the
+               client, i.e. the server never unlinks it. A block that was re-created under the same name (different
+               file of the name) is attached again.
+        """
+        segment = self.segments.get(shm_name)
+        if segment is not None and not is_same_segment(segment, shm_name):
+            self.release(shm_name)
+            segment = None
+        if segment is None:
+            segment = SharedMemory(name=shm_name)
+            # the resource tracker of this process would unlink the block at shutdown
+            resource_tracker.unregister(segment._name, "shared_memory")
+            self.segments[shm_name] = segment
+        return segment
+
+    def release(self, shm_name: str) -> None:
+        segment = self.segments.pop(shm_name, None)
+        if segment is not None:
+            segment.close()
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                reply = self.dispatch(request)
+            except Exception as error:
+                reply = {"status": "error", "msg": str(error)}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+    def dispatch(self, request: dict) -> dict:
+        command = request.get("cmd")
+        if command == "closure":
+            if request["model"] not in self.server.closures:
+                raise ValueError("Model " + str(request["model"]) + " is not loaded")
+            self.server.evaluate(request["model"], self.attach(request["shm"]), int(request["n"]))
+            return {"status": "ok"}
+        elif command == "models":
+            return {"status": "ok",
+                    "models": {name: c.model.input_dim for name, c in self.server.closures.items()}}
+        elif command == "release":
+            self.release(request["shm"])
+            return {"status": "ok"}
+        elif command == "ping":
+            return {"status": "ok"}
+        raise ValueError("Unknown command " + str(command))
+
+
+class ClosureClient:
+    """
+    Python client of the closure server. Owns a shared memory block for up to max_cells cells.
+    The solver can write its moments directly into u_in (zero copy) and call evaluate(n_cells), or use call(u).
+    """
+    model_name: str
+    n_moments: int
+    max_cells: int
+    u_in: np.ndarray  # input buffer, dim = (max_cells x N)
+    u: np.ndarray  # output buffers, see module docstring
+    alpha: np.ndarray
+    h: np.ndarray
+
+    def __init__(self, socket_path: str, model_name: str, max_cells: int):
+        """
+        input: socket_path = path of the server socket
+               model_name = name of the model (folder name given to the server)
+               max_cells = maximal number of cells per call
+        """
+        self.model_name = model_name
+        self.max_cells = max_cells
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+        self.reader = self.socket.makefile("r")
+        models = self.request({"cmd": "models"})["models"]
+        if model_name not in models:
+            raise ValueError("Model " + model_name + " is not loaded by the server. Available: " + str(list(models)))
+        self.n_moments = models[model_name]
+        self.shared_memory = SharedMemory(create=True, size=get_buffer_size(self.n_moments, max_cells))
+        [self.u_in, self.u, self.alpha, self.h] = get_buffer_views(self.shared_memory.buf, self.n_moments, max_cells)
+
+    def request(self, request: dict) -> dict:
+        self.socket.sendall((json.dumps(request) + "\n").encode())
+        reply = json.loads(self.reader.readline())
+        if reply["status"] != "ok":
+            raise RuntimeError("Closure server error: " + reply.get("msg", ""))
+        return reply
+
+    def evaluate(self, n_cells: int) -> list:
+        """
+        brief: evaluates the closure on the first n_cells rows of u_in
+        returns: [u, alpha, h], views into the shared memory (valid until the next call)
+        """
+        self.request({"cmd": "closure", "model": self.model_name, "shm": self.shared_memory.name, "n": n_cells})
+        return [self.u[:n_cells], self.alpha[:n_cells], self.h[:n_cells]]
+
+    def call(self, u_non_normal: np.ndarray) -> list:
+        """
+        brief: same interface as call_scaled_64, i.e. input non normalized moments, dim = (nS x N)
+        returns: [u, alpha, h], views into the shared memory (valid until the next call)
+        """
+        n_cells = u_non_normal.shape[0]
+        if n_cells > self.max_cells:
+            raise ValueError("Batch of " + str(n_cells) + " cells exceeds the buffer size " + str(self.max_cells))
+        np.copyto(self.u_in[:n_cells], u_non_normal)
+        return self.evaluate(n_cells)
+
+    def close(self):
+        self.request({"cmd": "release", "shm": self.shared_memory.name})
+        self.reader.close()
+        self.socket.close()
+        del self.u_in, self.u, self.alpha, self.h
+        self.shared_memory.close()
+        self.shared_memory.unlink()
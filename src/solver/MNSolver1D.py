@@ -18,6 +18,9 @@ import pandas as pd
 # inpackage imports
 from src import math
 from src.networks.configmodel import init_neural_closure
+from src.networks.registry import ModelRegistry, is_current_artifact
+from src.solver.closuretools import ClosureCache, ExpansionClosure, TemporalExtrapolation, hybrid_closure, \
+    routed_closure
 
 num_cores = multiprocessing.cpu_count()
 
@@ -33,7 +36,9 @@ def main():
 
 class MNSolver1D:
 
-    def __init__(self, traditional=False, polyDegree=3, model_mk=11):
+    def __init__(self, traditional=False, polyDegree=3, model_mk=11, cache_resolution=0.0, cache_size=100000,
+                 newton_refinement=0, newton_tol=1e-10, routing_tol=0.0, extrapolation_tol=0.0,
+                 expansion_tol=0.0):
 
         # Prototype for  spatialDim=1, polyDegree=2
         self.model_mk = model_mk
@@ -45,6 +50,31 @@ class MNSolver1D:
         self.nq = self.quadWeights.size
         self.mBasis = math.computeMonomialBasis1D(self.quadPts, self.polyDegree)  # dims = (N x nq)
         self.inputDim = self.mBasis.shape[0]  # = self.nSystem
+        # closure caches of the Newton and the neural closure (cache_resolution = 0 closes every cell in every step)
+        self.newton_cache = None
+        self.ml_cache = None
+        if cache_resolution > 0:
+            self.newton_cache = ClosureCache(resolution=cache_resolution, max_size=cache_size,
+                                             m_0=self.mBasis[0, 0], dual_objective=True)
+            self.ml_cache = ClosureCache(resolution=cache_resolution, max_size=cache_size, m_0=self.mBasis[0, 0])
+        # hybrid closure: number of Newton steps that refine the network prediction (0 = pure network closure)
+        self.newton_refinement = newton_refinement
+        self.newton_tol = newton_tol
+        # routed closure: cells with network reconstruction residual above routing_tol are closed by Newton (0 = off)
+        self.routing_tol = routing_tol
+        # temporal extrapolation of the neural closure: cells with relative moment drift below extrapolation_tol since
+        # their last closure evaluation are predicted with the inverse Hessian (0 = evaluate every cell)
+        self.ml_extrapolation = None
+        if extrapolation_tol > 0:
+            self.ml_extrapolation = TemporalExtrapolation(self.mBasis, self.quadWeights, drift_tol=extrapolation_tol)
+        # near-equilibrium fast path: cells with error bound of the expansion closure below expansion_tol are closed by
+        # the expansion around the isotropic Maxwellian (0 = off). The Newton closure uses it with the closure cache
+        self.ml_expansion = None
+        self.newton_expansion = None
+        if expansion_tol > 0:
+            self.ml_expansion = ExpansionClosure(self.mBasis, self.quadWeights, tol=expansion_tol)
+            self.newton_expansion = ExpansionClosure(self.mBasis, self.quadWeights, tol=expansion_tol,
+                                                     dual_objective=True)
 
         # generate geometry
         self.x0 = 0
@@ -94,27 +124,35 @@ class MNSolver1D:
         if not self.traditional:
             if self.model_mk == 11:
                 if self.polyDegree == 1:
-                    self.neuralClosure = init_neural_closure(network_mk=11, poly_degree=1, spatial_dim=1,
-                                                             folder_name="tmp",
-                                                             loss_combination=2,
-                                                             nw_width=10, nw_depth=7, normalized=True)
-                    self.neuralClosure.create_model()
-                    ### Need to load this model as legacy code
-                    print("Load model in legacy mode. Model was created using tf 2.2.0")
-                    self.legacy_model = True
-                    imported = tf.keras.models.load_model("models/_simulation/mk11_M1_1D/best_model")
-                    self.neuralClosure.model_legacy = imported
+                    if is_current_artifact("models/_simulation/mk11_M1_1D"):
+                        # legacy model converted to an MK11 artifact with callConvertLegacyModels.py
+                        self.neuralClosure = ModelRegistry().load("_simulation/mk11_M1_1D")
+                    else:
+                        self.neuralClosure = init_neural_closure(network_mk=11, poly_degree=1, spatial_dim=1,
+                                                                 folder_name="tmp",
+                                                                 loss_combination=2,
+                                                                 nw_width=10, nw_depth=7, normalized=True)
+                        self.neuralClosure.create_model()
+                        ### Need to load this model as legacy code
+                        print("Load model in legacy mode. Model was created using tf 2.2.0")
+                        self.legacy_model = True
+                        imported = tf.keras.models.load_model("models/_simulation/mk11_M1_1D/best_model")
+                        self.neuralClosure.model_legacy = imported
                 elif self.polyDegree == 2:
-                    self.neuralClosure = init_neural_closure(network_mk=11, poly_degree=2, spatial_dim=1,
-                                                             folder_name="tmp",
-                                                             loss_combination=2,
-                                                             nw_width=15, nw_depth=7, normalized=True)
-                    self.neuralClosure.create_model()
-                    ### Need to load this model as legacy code
-                    print("Load model in legacy mode. Model was created using tf 2.2.0")
-                    self.legacy_model = True
-                    imported = tf.keras.models.load_model("models/_simulation/mk11_M2_1D/best_model")
-                    self.neuralClosure.model_legacy = imported
+                    if is_current_artifact("models/_simulation/mk11_M2_1D"):
+                        # legacy model converted to an MK11 artifact with callConvertLegacyModels.py
+                        self.neuralClosure = ModelRegistry().load("_simulation/mk11_M2_1D")
+                    else:
+                        self.neuralClosure = init_neural_closure(network_mk=11, poly_degree=2, spatial_dim=1,
+                                                                 folder_name="tmp",
+                                                                 loss_combination=2,
+                                                                 nw_width=15, nw_depth=7, normalized=True)
+                        self.neuralClosure.create_model()
+                        ### Need to load this model as legacy code
+                        print("Load model in legacy mode. Model was created using tf 2.2.0")
+                        self.legacy_model = True
+                        imported = tf.keras.models.load_model("models/_simulation/mk11_M2_1D/best_model")
+                        self.neuralClosure.model_legacy = imported
 
                 elif self.polyDegree == 3:
                     self.neuralClosure = init_neural_closure(network_mk=13, poly_degree=3, spatial_dim=1,
@@ -128,14 +166,14 @@ class MNSolver1D:
                                                              loss_combination=2, nw_width=30, nw_depth=2,
                                                              normalized=True, input_decorrelation=True,
                                                              scale_active=True)
-                    self.neuralClosure.load_model()
+                    self.neuralClosure.load_model(use_cache=True)
                 if self.polyDegree == 2:
                     self.neuralClosure = init_neural_closure(network_mk=self.model_mk, poly_degree=2, spatial_dim=1,
                                                              folder_name="_simulation/mk15_M2_1D",
                                                              loss_combination=2, nw_width=50, nw_depth=2,
                                                              normalized=True, input_decorrelation=True,
                                                              scale_active=True)
-                    self.neuralClosure.load_model()
+                    self.neuralClosure.load_model(use_cache=True)
                 elif self.polyDegree == 3:
                     self.neuralClosure = init_neural_closure(network_mk=13, poly_degree=3, spatial_dim=1,
                                                              folder_name="_simulation/mk15_M3_1D", loss_combination=2,
@@ -315,6 +353,19 @@ class MNSolver1D:
             self.solve_iter_newton(idx_time)
             self.solver_iter_ml(idx_time)
             print("Iteration: " + str(idx_time) + ". Time " + str(idx_time * self.dt) + " of " + str(t_end))
+            if self.newton_cache is not None:
+                print("Closed cells: Newton " + str(self.newton_cache.n_closed_last) + ", neural " + str(
+                    self.ml_cache.n_closed_last) + " of " + str(self.nx))
+            if self.ml_extrapolation is not None:
+                print("Extrapolated cells of the neural closure: " + str(
+                    self.nx - self.ml_extrapolation.n_evaluated_last) + " of " + str(self.nx))
+            if self.ml_expansion is not None:
+                print("Expanded cells: Newton " + str(self.newton_expansion.n_expanded_last) + ", neural " + str(
+                    self.ml_expansion.n_expanded_last) + " of " + str(self.nx))
+            if self.newton_refinement > 0:
+                print("Newton steps of the hybrid closure: mean " + str(
+                    np.mean(self.newton_iterations)) + ", max " + str(np.max(self.newton_iterations)) +
+                      ". Not converged: " + str(np.sum(~self.newton_converged)) + " of " + str(self.nx) + " cells")
             self.error_analysis(idx_time * self.dt)
             # print iteration results
             # self.show_solution(idx_time)
@@ -324,6 +375,26 @@ class MNSolver1D:
 
         return self.u
 
+    def solve_hybrid(self, maxIter=100, t_end=1.0):
+        """
+        brief: time loop with the neural closure only (u2, alpha2). With routing_tol > 0, the cells with large
+               reconstruction residual are closed by the Newton solver. The fraction of routed cells and the Newton
+               steps per time step are written to figures/solvers/routing_<solution_file>
+        returns: u2
+        """
+        with open('figures/solvers/routing_' + self.solution_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["t", "routed_fraction", "newton_steps"])
+            idx_time = 0
+            while idx_time < maxIter and idx_time * self.dt < t_end:
+                self.solver_iter_ml(idx_time)
+                routed_fraction = float(np.mean(self.routed))
+                print("Iteration: " + str(idx_time) + ". Time " + str(idx_time * self.dt) + " of " + str(t_end) +
+                      ". Routed to Newton: " + str(np.sum(self.routed)) + " of " + str(self.routed.size) + " cells")
+                writer.writerow([idx_time * self.dt, routed_fraction, int(np.sum(self.newton_iterations))])
+                idx_time += 1
+        return self.u2
+
     def solve_animation_iter_error(self, maxIter=100):
         fps = 1 / self.dt
 
@@ -421,11 +492,44 @@ class MNSolver1D:
         return 0
 
     def entropy_closure_newton(self):
+        if self.newton_cache is not None:
+            if self.newton_expansion is not None:
+                [alpha, h] = self.newton_expansion.close(np.transpose(self.u), lambda u_rest, rest_idx: (
+                    self.newton_cache.close(u_rest, lambda u_normalized, idx: self.close_normalized_newton(
+                        u_normalized, rest_idx[idx]))))
+            else:
+                [alpha, h] = self.newton_cache.close(np.transpose(self.u), self.close_normalized_newton)
+            self.alpha = np.transpose(alpha)
+            self.h = h[:, 0]
+            return 0
         # if (self.traditional): # NEWTON
         for i in range(self.nx):
             self.entropy_closure_single_row(i)
         return 0
 
+    def close_normalized_newton(self, u_normalized, cell_idx):
+        """
+        brief: Newton closure of normalized moments (closure function of the closure cache).
+               Starts from the Lagrange multipliers of the cells in the last time step.
+        input: u_normalized, dims = (nM x N)
+               cell_idx = cells of the moments, dims = nM
+        returns: [alpha, h] with h = dual objective, dims = (nM x N), (nM x 1)
+        """
+        alpha = np.zeros(u_normalized.shape)
+        h = np.zeros((u_normalized.shape[0], 1))
+        for k, i in enumerate(cell_idx):
+            alpha_init = np.copy(self.alpha[:, i])
+            alpha_init[0] -= np.log(self.u[0, i]) / self.mBasis[0, 0]  # multipliers of the normalized moment
+            opt_result = opt.minimize(fun=self.create_opti_entropy(u_normalized[k]), x0=alpha_init,
+                                      jac=self.create_opti_entropy_prime(u_normalized[k]),
+                                      tol=1e-6)
+            if not opt_result.success:
+                print("Optimization unsuccessfull! u=" + str(self.u[:, i]))
+                exit(ValueError)
+            alpha[k] = opt_result.x
+            h[k] = opt_result.fun
+        return [alpha, h]
+
     def entropy_closure_single_row(self, i):
         rowRes = 0
 
@@ -614,7 +718,13 @@ class MNSolver1D:
         for i in range(self.nx):
             if tmp[i, 0] < 0.0001:
                 tmp[i, 0] = 0.0001
-        [u_pred, alpha_pred, h] = self.neuralClosure.call_scaled_64(np.asarray(tmp), legacy_mode=self.legacy_model)
+        self.newton_iterations = np.zeros(self.nx, dtype=int)  # Newton steps per cell of the hybrid closure
+        self.routed = np.zeros(self.nx, dtype=bool)  # cells closed by Newton in the routed closure
+        self.newton_converged = np.ones(self.nx, dtype=bool)  # cells with converged Newton steps
+        if self.ml_extrapolation is not None:
+            [alpha_pred, h] = self.ml_extrapolation.close(tmp, self.close_ml_cells)
+        else:
+            [alpha_pred, h] = self.close_ml_cells(tmp, np.arange(self.nx))
 
         for i in range(self.nx):
             self.alpha2[:, i] = alpha_pred[i, :]
@@ -622,6 +732,65 @@ class MNSolver1D:
 
         return 0
 
+    def close_ml_cells(self, u_cells, cell_idx):
+        """
+        brief: neural closure of the given cells, through the expansion fast path and the closure cache (if active)
+        input: u_cells = moments, dims = (nM x N)
+               cell_idx = cells of the moments, dims = nM
+        returns: [alpha, h], dims = (nM x N), (nM x 1)
+        """
+        def close_network(u_rest, rest_idx):
+            if self.ml_cache is not None:
+                return self.ml_cache.close(u_rest, lambda u_normalized, idx: self.close_ml(u_normalized, rest_idx[idx]))
+            return self.close_ml(u_rest, rest_idx)
+
+        if self.ml_expansion is not None:
+            return self.ml_expansion.close(u_cells, lambda u_rest, idx: close_network(u_rest, cell_idx[idx]))
+        return close_network(u_cells, cell_idx)
+
+    def close_ml(self, u_cells, cell_idx):
+        """
+        brief: neural closure (closure function of the closure cache). With newton_refinement > 0, the network
+               prediction is refined by Newton steps (hybrid closure). With routing_tol > 0, only cells with large
+               reconstruction residual are closed by Newton (routed closure, stored in routed).
+               Newton steps are stored in newton_iterations, converged cells in newton_converged.
+        input: u_cells = moments, dims = (nM x N)
+               cell_idx = cells of the moments, dims = nM
+        returns: [alpha, h], dims = (nM x N), (nM x 1)
+        """
+        if self.routing_tol > 0:
+            [alpha_pred, h, routed, n_iter, converged] = routed_closure(self.neuralClosure, u_cells, self.mBasis,
+                                                                        self.quadWeights, routing_tol=self.routing_tol,
+                                                                        newton_tol=self.newton_tol,
+                                                                        legacy_mode=self.legacy_model)
+            self.routed[cell_idx] = routed
+            self.newton_iterations[cell_idx] = n_iter
+            self.newton_converged[cell_idx] = converged
+            self.check_newton_closure(u_cells, alpha_pred)
+            return [alpha_pred, h]
+        if self.newton_refinement > 0:
+            [alpha_pred, h, n_iter, converged] = hybrid_closure(self.neuralClosure, u_cells, self.mBasis,
+                                                                self.quadWeights, max_iter=self.newton_refinement,
+                                                                tol=self.newton_tol, legacy_mode=self.legacy_model)
+            self.newton_iterations[cell_idx] = n_iter
+            self.newton_converged[cell_idx] = converged
+            self.check_newton_closure(u_cells, alpha_pred)
+            return [alpha_pred, h]
+        [u_pred, alpha_pred, h] = self.neuralClosure.call_scaled_64(u_cells, legacy_mode=self.legacy_model)
+        return [np.asarray(alpha_pred), np.asarray(h)]
+
+    def check_newton_closure(self, u_cells, alpha):
+        """
+        brief: stops the simulation, if the Newton steps of the hybrid or routed closure (including the restart at
+               the isotropic density) left non finite Lagrange multipliers
+        input: u_cells = moments, dims = (nM x N)
+               alpha = Lagrange multipliers, dims = (nM x N)
+        """
+        failed = ~np.all(np.isfinite(alpha), axis=1)
+        if np.any(failed):
+            print("Newton closure failed for " + str(np.sum(failed)) + " cells, e.g. u=" + str(u_cells[failed][0]))
+            exit(1)
+
     def compute_flux_ml(self):
         """
         for periodic boundaries and inflow boundaries, upwinding.
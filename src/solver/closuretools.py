@@ -0,0 +1,410 @@
+"""
+brief: Tools for the entropy closure in the time loops of the moment solvers
+Author: Steffen Schotthöfer
+Date: 19.10.2026
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from src.math import equilibrium_expansion, expansion_closure, newton_refine_closure
+
+
+class ClosureCache:
+    """
+    Memoization of the entropy closure for solver time loops. The closure is computed for normalized moments
+    u/u_0, quantized on a grid with spacing resolution. Cells with the same quantized moments (e.g. vacuum regions,
+    isotropic far fields or plateaus, within one time step or over many time steps) are closed once.
+    The stored Lagrange multipliers and entropies of the normalized moments are rescaled by u_0:
+    alpha_0(u) = alpha_0(u/u_0) + ln(u_0)/m_0, h(u) = u_0 h(u/u_0) + u_0 ln(u_0)/m_0 for h = alpha*u - <exp(alpha*m)>
+    (with opposite sign of the ln term for the dual objective <exp(alpha*m)> - alpha*u).
+    Least recently used entries are evicted, if the cache is full.
+    """
+    resolution: float  # grid spacing of the quantized normalized moments
+    max_size: int  # maximal number of stored closures
+    m_0: float  # (constant) zeroth basis function
+    dual_objective: bool  # h is the dual objective <exp(alpha*m)> - alpha*u instead of the entropy
+    n_hits: int  # number of cells served from the cache
+    n_misses: int  # number of cells that were closed
+    n_closed_last: int  # number of closures of the last call
+
+    def __init__(self, resolution: float = 1e-6, max_size: int = 100000, m_0: float = 1.0,
+                 dual_objective: bool = False):
+        """
+        input: resolution = grid spacing of the quantized normalized moments
+               max_size = maximal number of stored closures
+               m_0 = value of the zeroth basis function
+               dual_objective = h of the closure is the dual objective (Newton solvers) instead of the entropy
+        """
+        if resolution <= 0.0 or max_size < 1:
+            raise ValueError("Resolution and size of the closure cache must be positive")
+        self.resolution = resolution
+        self.max_size = max_size
+        self.m_0 = m_0
+        self.dual_objective = dual_objective
+        self.entries = OrderedDict()  # key -> (alpha, h) of the normalized moments
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_closed_last = 0
+
+    def get_keys(self, u_normalized: np.ndarray) -> list:
+        """
+        returns: cache keys (bytes) of the quantized moments u_1/u_0,...,u_N/u_0
+        """
+        quantized = np.ascontiguousarray(np.rint(u_normalized[:, 1:] / self.resolution).astype(np.int64))
+        return [row.tobytes() for row in quantized]
+
+    def close(self, u_non_normal: np.ndarray, closure_function) -> list:
+        """
+        brief: closes all cells. Cells with a cached closure are not passed to closure_function, cells with the same
+               quantized moments are closed once.
+        input: u_non_normal = moments with u_0 > 0, dims = (nS x N)
+               closure_function = callable (u_normalized, cell_idx) -> [alpha, h] that closes the normalized moments
+                                  u_normalized (dims = (nM x N), u_0 = 1) of the cells cell_idx (indices of
+                                  u_non_normal, dims = nM). alpha, dims = (nM x N), h, dims = (nM x 1)
+        returns: [alpha, h] of u_non_normal, dims = (nS x N), (nS x 1)
+        """
+        u_non_normal = np.asarray(u_non_normal, dtype=np.float64)
+        u_0 = u_non_normal[:, :1]
+        u_normalized = u_non_normal / u_0
+        keys = self.get_keys(u_normalized)
+        # first cell of each missing key
+        missing = OrderedDict()
+        for idx, key in enumerate(keys):
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            elif key not in missing:
+                missing[key] = idx
+        if missing:
+            cell_idx = np.fromiter(missing.values(), dtype=np.int64, count=len(missing))
+            [alpha_new, h_new] = closure_function(u_normalized[cell_idx], cell_idx)
+            alpha_new = np.asarray(alpha_new, dtype=np.float64)
+            h_new = np.asarray(h_new, dtype=np.float64).reshape((-1, 1))
+            for i, key in enumerate(missing):
+                self.entries[key] = (alpha_new[i], h_new[i])
+        alpha = np.empty(u_non_normal.shape)
+        h = np.empty((u_non_normal.shape[0], 1))
+        for idx, key in enumerate(keys):
+            [alpha[idx], h[idx]] = self.entries[key]
+        while len(self.entries) > self.max_size:  # evict after the lookup, s.t. all keys of this call are present
+            self.entries.popitem(last=False)
+        self.n_closed_last = len(missing)
+        self.n_misses += len(missing)
+        self.n_hits += len(keys) - len(missing)
+        # rescaling by u_0
+        log_u_0 = np.log(u_0) / self.m_0
+        alpha[:, :1] += log_u_0
+        if self.dual_objective:
+            h = u_0 * h - u_0 * log_u_0
+        else:
+            h = u_0 * h + u_0 * log_u_0
+        return [alpha, h]
+
+    def stats(self) -> dict:
+        """
+        returns: dict with the number of hits, misses, closures of the last call and stored entries
+        """
+        n_total = self.n_hits + self.n_misses
+        return {"hits": self.n_hits, "misses": self.n_misses, "hit_rate": self.n_hits / max(n_total, 1),
+                "closed_last": self.n_closed_last, "size": len(self.entries)}
+
+    def clear(self) -> None:
+        """
+        brief: removes all entries and resets the statistics
+        """
+        self.entries.clear()
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_closed_last = 0
+
+
+def isotropic_multipliers(u_non_normal: np.ndarray, m: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """
+    brief: Lagrange multipliers of the isotropic density with the same u_0, i.e. <exp(alpha_0 m_0)> = u_0.
+           Start of the Newton solver for cells without (finite) network prediction.
+    input: u_non_normal = moments, dims = (nS x N)
+           m = moment basis, dims = (N x nq)
+           w = quadrature weights, dims = nq
+    returns: alpha, dims = (nS x N)
+    """
+    alpha = np.zeros(u_non_normal.shape)
+    alpha[:, 0] = np.log(u_non_normal[:, 0] / np.sum(w)) / m[0, 0]
+    return alpha
+
+
+def hybrid_closure(closure, u_non_normal: np.ndarray, m: np.ndarray, w: np.ndarray, max_iter: int = 2,
+                   tol: float = 1e-10, fallback_max_iter: int = 20, legacy_mode: bool = False) -> list:
+    """
+    brief: network initialized Newton closure. The Lagrange multipliers of call_scaled_64 of the neural closure
+           seed a vectorized Newton iteration (see math.newton_refine_closure), h is recomputed from the refined
+           multipliers. Cells with non finite multipliers after the refinement (e.g. non finite network
+           predictions) are solved by Newton started at the isotropic density (see isotropic_multipliers).
+    input: closure = neural closure (BaseNetwork)
+           u_non_normal = moments, dims = (nS x N)
+           m = moment basis, dims = (N x nq)
+           w = quadrature weights, dims = nq
+           max_iter = maximal number of Newton steps per cell
+           tol = relative tolerance of the gradient norm of the dual problem
+           fallback_max_iter = maximal number of Newton steps of the cells restarted at the isotropic density
+           legacy_mode = use the legacy model of the closure
+    returns: [alpha, h, n_iter, converged], dims = (nS x N), (nS x 1), nS, nS. h = alpha*u - <exp(alpha*m)>,
+             converged = cells with relative gradient norm <= tol. alpha of failed fallbacks is not finite.
+    """
+    u_non_normal = np.asarray(u_non_normal, dtype=np.float64)
+    if legacy_mode:
+        [_, alpha, _] = closure.call_scaled_64(u_non_normal, legacy_mode=True)
+    else:
+        [_, alpha, _] = closure.call_scaled_64(u_non_normal)
+    [alpha, n_iter, grad_norm] = newton_refine_closure(u_non_normal, np.asarray(alpha), m, w, max_iter=max_iter,
+                                                       tol=tol)
+    restart = ~np.isfinite(grad_norm)
+    if np.any(restart):
+        [alpha[restart], n_restart, grad_norm[restart]] = newton_refine_closure(
+            u_non_normal[restart], isotropic_multipliers(u_non_normal[restart], m, w), m, w,
+            max_iter=fallback_max_iter, tol=tol)
+        n_iter[restart] += n_restart
+    with np.errstate(over="ignore", invalid="ignore"):
+        h = np.sum(alpha * u_non_normal, axis=1, keepdims=True) - np.exp(alpha @ m) @ np.reshape(w, (-1, 1))
+    return [alpha, h, n_iter, grad_norm <= tol]
+
+
+def reconstruction_residual(u_non_normal: np.ndarray, alpha: np.ndarray, m: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """
+    brief: a-posteriori error indicator of a closure: relative moment reconstruction residual |u - <m exp(alpha*m)>|/u_0
+           (the gradient of the dual problem). Not finite for non finite alpha.
+    input: u_non_normal = moments, dims = (nS x N)
+           alpha = Lagrange multipliers, dims = (nS x N)
+           m = moment basis, dims = (N x nq)
+           w = quadrature weights, dims = nq
+    returns: residual, dims = nS
+    """
+    u_theta = (np.exp(alpha @ m) * np.reshape(w, (1, -1))) @ m.T
+    return np.linalg.norm(u_non_normal - u_theta, axis=1) / u_non_normal[:, 0]
+
+
+def routed_closure(closure, u_non_normal: np.ndarray, m: np.ndarray, w: np.ndarray, routing_tol: float = 1e-3,
+                   newton_max_iter: int = 20, newton_tol: float = 1e-10, legacy_mode: bool = False) -> list:
+    """
+    brief: closure with per cell routing between the neural closure and the Newton solver. The network closes all
+           cells (one batch), cells with reconstruction residual (see reconstruction_residual) above routing_tol or
+           non finite multipliers are closed by the vectorized Newton solver (one batch, started at the network
+           prediction or at the isotropic density for non finite predictions).
+    input: closure = neural closure (BaseNetwork)
+           u_non_normal = moments, dims = (nS x N)
+           m = moment basis, dims = (N x nq)
+           w = quadrature weights, dims = nq
+           routing_tol = maximal relative reconstruction residual of the network closure
+           newton_max_iter = maximal number of Newton steps of the routed cells
+           newton_tol = relative tolerance of the gradient norm of the Newton solver
+           legacy_mode = use the legacy model of the closure
+    returns: [alpha, h, routed, n_iter, converged], dims = (nS x N), (nS x 1), nS, nS, nS.
+             h = alpha*u - <exp(alpha*m)>, routed = cells closed by the Newton solver, n_iter = Newton steps per
+             cell, converged = cells of the network or routed cells with relative gradient norm <= newton_tol.
+             alpha of failed Newton solves is not finite.
+    """
+    u_non_normal = np.asarray(u_non_normal, dtype=np.float64)
+    if legacy_mode:
+        [_, alpha, _] = closure.call_scaled_64(u_non_normal, legacy_mode=True)
+    else:
+        [_, alpha, _] = closure.call_scaled_64(u_non_normal)
+    alpha = np.array(alpha, dtype=np.float64)
+    with np.errstate(over="ignore", invalid="ignore"):
+        residual = reconstruction_residual(u_non_normal, alpha, m, w)
+    routed = ~(residual <= routing_tol)  # includes non finite residuals
+    n_iter = np.zeros(u_non_normal.shape[0], dtype=int)
+    converged = np.ones(u_non_normal.shape[0], dtype=bool)
+    if np.any(routed):
+        alpha_start = alpha[routed]
+        invalid = ~np.all(np.isfinite(alpha_start), axis=1) | ~np.isfinite(residual[routed])
+        alpha_start[invalid] = isotropic_multipliers(u_non_normal[routed][invalid], m, w)
+        [alpha[routed], n_iter[routed], grad_norm] = newton_refine_closure(u_non_normal[routed], alpha_start, m, w,
+                                                                           max_iter=newton_max_iter, tol=newton_tol)
+        converged[routed] = grad_norm <= newton_tol
+    with np.errstate(over="ignore", invalid="ignore"):
+        h = np.sum(alpha * u_non_normal, axis=1, keepdims=True) - np.exp(alpha @ m) @ np.reshape(w, (-1, 1))
+    return [alpha, h, routed, n_iter, converged]
+
+
+class TemporalExtrapolation:
+    """
+    First order temporal extrapolation of a closure for time loops with small time steps. For each cell, the moments
+    u_ref, the multipliers alpha_ref and the Jacobian dalpha/du = H^-1(alpha_ref) of the last closure evaluation are
+    kept, where H(alpha) = <m m^T exp(alpha*m)> is the Hessian of the dual problem (du = H dalpha).
+    The multipliers of new moments are predicted by alpha = alpha_ref + H^-1(alpha_ref) (u - u_ref). The closure is
+    only evaluated for cells with drift |u - u_ref|/u_0 above drift_tol, or with a reconstruction residual of the
+    prediction (see reconstruction_residual) that exceeds the residual at u_ref by more than residual_tol.
+    Since u_ref is only updated at evaluations, the prediction error does not accumulate over the time steps.
+    """
+    drift_tol: float  # maximal relative drift |u - u_ref|/u_0 of a predicted cell
+    residual_tol: float  # maximal growth of the reconstruction residual of a predicted cell (0 = no check)
+    dual_objective: bool  # h is the dual objective <exp(alpha*m)> - alpha*u instead of the entropy
+    n_evaluated_last: int  # number of evaluated cells of the last call
+    n_evaluated: int  # number of evaluated cells of all calls
+    n_predicted: int  # number of predicted cells of all calls
+
+    def __init__(self, m: np.ndarray, w: np.ndarray, drift_tol: float = 1e-3, residual_tol: float = 1e-4,
+                 dual_objective: bool = False):
+        """
+        input: m = moment basis, dims = (N x nq)
+               w = quadrature weights, dims = nq
+               drift_tol = maximal relative drift |u - u_ref|/u_0 of a predicted cell
+               residual_tol = maximal growth of the reconstruction residual of a predicted cell (0 = no check)
+               dual_objective = h of the closure is the dual objective (Newton solvers) instead of the entropy
+        """
+        if drift_tol <= 0.0 or residual_tol < 0.0:
+            raise ValueError("Drift tolerance of the extrapolation must be positive, residual tolerance non negative")
+        self.m = m
+        self.w = np.reshape(w, (1, -1))
+        self.drift_tol = drift_tol
+        self.residual_tol = residual_tol
+        self.dual_objective = dual_objective
+        self.u_ref = None  # dims = (nS x N)
+        self.alpha_ref = None  # dims = (nS x N)
+        self.jacobian = None  # dalpha/du, dims = (nS x N x N)
+        self.residual_ref = None  # reconstruction residual at u_ref, dims = nS
+        self.n_evaluated_last = 0
+        self.n_evaluated = 0
+        self.n_predicted = 0
+
+    def density(self, alpha: np.ndarray) -> np.ndarray:
+        """
+        returns: exp(alpha*m) * w, dims = (nS x nq)
+        """
+        with np.errstate(over="ignore", invalid="ignore"):
+            return np.exp(alpha @ self.m) * self.w
+
+    def update_reference(self, u_cells: np.ndarray, alpha: np.ndarray, cell_idx: np.ndarray) -> None:
+        """
+        brief: stores u, alpha, the inverse Hessian and the residual of evaluated cells. Cells with non finite
+               alpha or Hessian get a non finite Jacobian, i.e. they are evaluated again in the next call.
+        """
+        f_weighted = self.density(alpha)
+        hessian = np.einsum("iq,jq,sq->sij", self.m, self.m, f_weighted)
+        valid = np.all(np.isfinite(hessian), axis=(1, 2)) & np.all(np.isfinite(alpha), axis=1)
+        jacobian = np.full(hessian.shape, np.nan)
+        jacobian[valid] = np.linalg.inv(hessian[valid])
+        self.u_ref[cell_idx] = u_cells
+        self.alpha_ref[cell_idx] = alpha
+        self.jacobian[cell_idx] = jacobian
+        self.residual_ref[cell_idx] = np.linalg.norm(u_cells - f_weighted @ self.m.T, axis=1) / u_cells[:, 0]
+
+    def close(self, u_non_normal: np.ndarray, closure_function) -> list:
+        """
+        brief: closes all cells, evaluates closure_function only for the cells, whose prediction is not accurate
+        input: u_non_normal = moments with u_0 > 0, dims = (nS x N). The cells must be the same in all calls
+               closure_function = callable (u_cells, cell_idx) -> [alpha, h] that closes the moments u_cells of the
+                                  cells cell_idx (indices of u_non_normal), dims = (nM x N), nM.
+                                  alpha, dims = (nM x N), h, dims = (nM x 1)
+        returns: [alpha, h] of u_non_normal, dims = (nS x N), (nS x 1)
+        """
+        u_non_normal = np.asarray(u_non_normal, dtype=np.float64)
+        n_cells = u_non_normal.shape[0]
+        if self.u_ref is None or self.u_ref.shape != u_non_normal.shape:
+            self.u_ref = np.zeros(u_non_normal.shape)
+            self.alpha_ref = np.zeros(u_non_normal.shape)
+            self.jacobian = np.full((n_cells, u_non_normal.shape[1], u_non_normal.shape[1]), np.nan)
+            self.residual_ref = np.zeros(n_cells)
+        # prediction
+        du = u_non_normal - self.u_ref
+        alpha = self.alpha_ref + np.einsum("sij,sj->si", self.jacobian, du)
+        f_weighted = self.density(alpha)
+        evaluate = ~(np.linalg.norm(du, axis=1) / u_non_normal[:, 0] <= self.drift_tol)  # includes non finite
+        evaluate |= ~np.all(np.isfinite(alpha), axis=1)  # cells without valid Jacobian
+        if self.residual_tol > 0.0:
+            residual = np.linalg.norm(u_non_normal - f_weighted @ self.m.T, axis=1) / u_non_normal[:, 0]
+            evaluate |= ~(residual - self.residual_ref <= self.residual_tol)
+        integral = np.sum(f_weighted, axis=1, keepdims=True)
+        h = np.sum(alpha * u_non_normal, axis=1, keepdims=True) - integral
+        if self.dual_objective:
+            h = -h
+        # evaluation
+        cell_idx = np.flatnonzero(evaluate)
+        if cell_idx.size > 0:
+            [alpha_new, h_new] = closure_function(u_non_normal[cell_idx], cell_idx)
+            alpha[cell_idx] = np.asarray(alpha_new, dtype=np.float64)
+            h[cell_idx] = np.asarray(h_new, dtype=np.float64).reshape((-1, 1))
+            self.update_reference(u_non_normal[cell_idx], alpha[cell_idx], cell_idx)
+        self.n_evaluated_last = cell_idx.size
+        self.n_evaluated += cell_idx.size
+        self.n_predicted += n_cells - cell_idx.size
+        return [alpha, h]
+
+    def stats(self) -> dict:
+        """
+        returns: dict with the number of evaluated and predicted cells and the evaluations of the last call
+        """
+        n_total = self.n_evaluated + self.n_predicted
+        return {"evaluated": self.n_evaluated, "predicted": self.n_predicted,
+                "evaluated_fraction": self.n_evaluated / max(n_total, 1), "evaluated_last": self.n_evaluated_last}
+
+    def reset(self) -> None:
+        """
+        brief: removes the stored closures (all cells are evaluated in the next call) and resets the statistics
+        """
+        self.u_ref = None
+        self.n_evaluated_last = 0
+        self.n_evaluated = 0
+        self.n_predicted = 0
+
+
+class ExpansionClosure:
+    """
+    Near-equilibrium fast path of a closure. Cells, whose rigorous error bound of the expansion closure (see
+    src.math.expansion_closure) is below tol, are closed by the second order expansion of the dual problem around
+    the isotropic Maxwellian (two small matrix-vector products per cell). All other cells are closed by the given
+    closure function (network or Newton closure).
+    """
+    tol: float  # maximal error bound |alpha - alpha_exact| of an expanded cell
+    dual_objective: bool  # h is the dual objective <exp(alpha*m)> - alpha*u instead of the entropy
+    n_expanded_last: int  # number of expanded cells of the last call
+    n_expanded: int  # number of expanded cells of all calls
+    n_evaluated: int  # number of cells closed by the closure function of all calls
+
+    def __init__(self, m: np.ndarray, w: np.ndarray, tol: float = 1e-6, dual_objective: bool = False):
+        """
+        input: m = moment basis with constant m_0, dims = (N x nq)
+               w = quadrature weights, dims = nq
+               tol = maximal error bound |alpha - alpha_exact| of an expanded cell
+               dual_objective = h of the closure is the dual objective (Newton solvers) instead of the entropy
+        """
+        if tol <= 0.0:
+            raise ValueError("Tolerance of the expansion closure must be positive")
+        self.expansion = equilibrium_expansion(m, w)
+        self.tol = tol
+        self.dual_objective = dual_objective
+        self.n_expanded_last = 0
+        self.n_expanded = 0
+        self.n_evaluated = 0
+
+    def close(self, u_non_normal: np.ndarray, closure_function) -> list:
+        """
+        brief: closes all cells, evaluates closure_function only for the cells outside of the trust region
+        input: u_non_normal = moments with u_0 > 0, dims = (nS x N)
+               closure_function = callable (u_cells, cell_idx) -> [alpha, h] that closes the moments u_cells of the
+                                  cells cell_idx (indices of u_non_normal), dims = (nM x N), nM.
+                                  alpha, dims = (nM x N), h, dims = (nM x 1)
+        returns: [alpha, h] of u_non_normal, dims = (nS x N), (nS x 1)
+        """
+        u_non_normal = np.asarray(u_non_normal, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            [alpha, h, bound] = expansion_closure(u_non_normal, self.expansion)
+        h = h.reshape((-1, 1))
+        if self.dual_objective:
+            h = -h
+        cell_idx = np.flatnonzero(~(bound <= self.tol))
+        if cell_idx.size > 0:
+            [alpha_new, h_new] = closure_function(u_non_normal[cell_idx], cell_idx)
+            alpha[cell_idx] = np.asarray(alpha_new, dtype=np.float64)
+            h[cell_idx] = np.asarray(h_new, dtype=np.float64).reshape((-1, 1))
+        self.n_expanded_last = u_non_normal.shape[0] - cell_idx.size
+        self.n_expanded += self.n_expanded_last
+        self.n_evaluated += cell_idx.size
+        return [alpha, h]
+
+    def stats(self) -> dict:
+        """
+        returns: dict with the number of expanded and evaluated cells and the expanded cells of the last call
+        """
+        n_total = self.n_expanded + self.n_evaluated
+        return {"expanded": self.n_expanded, "evaluated": self.n_evaluated,
+                "expanded_fraction": self.n_expanded / max(n_total, 1), "expanded_last": self.n_expanded_last}
@@ -406,6 +406,20 @@ def write_config_file(options, neural_closure_model):
     runScript = runScript + "--basis=" + str(options.basis) + " \\\n"
     runScript = runScript + "--rotated=" + str(int(options.rotated)) + " \\\n"
     runScript = runScript + "--max_alpha_norm=" + str(float(options.max_alpha_norm)) + " \\\n"
+    runScript = runScript + "--lbfgs=" + str(options.lbfgs) + " \\\n"
+    runScript = runScript + "--lbfgs_batch=" + str(options.lbfgs_batch) + " \\\n"
+    runScript = runScript + "--precision=" + str(options.precision) + " \\\n"
+    runScript = runScript + "--recons_precision=" + str(options.recons_precision) + " \\\n"
+    runScript = runScript + "--coarse_quad=" + str(options.coarse_quad) + " \\\n"
+    runScript = runScript + "--fine_quad_epochs=" + str(options.fine_quad_epochs) + " \\\n"
+    runScript = runScript + "--transfer=" + str(options.transfer) + " \\\n"
+    runScript = runScript + "--teacher=" + str(options.teacher) + " \\\n"
+    runScript = runScript + "--distill_samples=" + str(options.distill_samples) + " \\\n"
+    runScript = runScript + "--prune_ratio=" + str(options.prune_ratio) + " \\\n"
+    runScript = runScript + "--export_precision=" + str(options.export_precision) + " \\\n"
+    runScript = runScript + "--jit=" + str(int(options.jit)) + " \\\n"
+    runScript = runScript + "--partition_edges=" + ",".join(str(e) for e in options.partition_edges) + " \\\n"
+    runScript = runScript + "--expert_widths=" + ",".join(str(w) for w in options.expert_widths) + " \\\n"
 
     # Getting filename
     rsFile = neural_closure_model.folder_name + '/runScript_001_'
@@ -453,6 +467,21 @@ def write_config_file(options, neural_closure_model):
          'basis': [options.basis],
          'rotated': [options.rotated],
          'max_alpha_norm': [options.max_alpha_norm],
+         'gamma_level': [options.gamma_level],
+         'lbfgs': [options.lbfgs],
+         'lbfgs_batch': [options.lbfgs_batch],
+         'precision': [options.precision],
+         'recons_precision': [options.recons_precision],
+         'coarse_quad': [options.coarse_quad],
+         'fine_quad_epochs': [options.fine_quad_epochs],
+         'transfer': [options.transfer],
+         'teacher': [options.teacher],
+         'distill_samples': [options.distill_samples],
+         'prune_ratio': [options.prune_ratio],
+         'export_precision': [options.export_precision],
+         'jit': [options.jit],
+         'partition_edges': [options.partition_edges],
+         'expert_widths': [options.expert_widths],
          }
 
     count = 0
@@ -466,6 +495,44 @@ def write_config_file(options, neural_closure_model):
     return True
 
 
+def read_config_file(folder_name: str) -> dict:
+    """
+    brief: reads the most recent config file (written by write_config_file) of a model folder
+    input: folder_name = path to the model folder, e.g. models/<folder>
+    returns: dict with option names and values (as strings)
+    """
+    cfg_files = sorted([f for f in os.listdir(folder_name) if f.startswith('config_') and f.endswith('_.csv')])
+    if not cfg_files:
+        print("Config file is missing. Expected in: " + folder_name)
+        exit(1)
+    df = pd.read_csv(folder_name + '/' + cfg_files[-1], sep=';', header=None, index_col=0, dtype=str,
+                     keep_default_na=False)
+    return {key: df.loc[key].iloc[0] for key in df.index}
+
+
+def copy_config_file(source_folder: str, target_folder: str, changes: dict) -> bool:
+    """
+    brief: writes the most recent config file of a model folder to another model folder, with some changed entries.
+           Used for models that are derived from a trained model (e.g. pruned models), s.t. they can be loaded with
+           configmodel.load_neural_closure
+    input: source_folder, target_folder = paths to the model folders, e.g. models/<folder>
+           changes = dict with option names and new values
+    returns: True, if successful
+    """
+    config = read_config_file(source_folder)
+    config.update({key: str(value) for key, value in changes.items()})
+    make_directory(target_folder)
+    count = 0
+    cfg_file = target_folder + '/config_001_'
+    while os.path.isfile(cfg_file + '.csv'):
+        count += 1
+        cfg_file = target_folder + '/config_' + str(count).zfill(3) + '_'
+    cfg_file = cfg_file + '.csv'
+    pd.DataFrame.from_dict(data={key: [value] for key, value in config.items()}, orient='index').to_csv(
+        cfg_file, header=False, sep=';')
+    return True
+
+
 def make_directory(path_to_directory):
     if not os.path.exists(path_to_directory):
         p = Path(path_to_directory)